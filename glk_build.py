@@ -13,14 +13,17 @@ with open('src/glk_comm.c') as f:
     ffibuilder.cdef(r"""
         struct sock_names {
             char* sock_name;
+            int sock_fd;
             ...;
         };
         """)
 
     ffibuilder.cdef(r"""
         int init_glulx(struct sock_names* names);
-        const char* communicate(struct sock_names* names, const char* msg);
-        const char* get_output_nosend(struct sock_names* names);
+        int send_message(struct sock_names* names, const char* msg);
+        const char* communicate(struct sock_names* names, const char* msg, uint32_t* size);
+        const char* get_output_nosend(struct sock_names* names, uint32_t* size);
+        int fork_glulx(struct sock_names* names, struct sock_names* child);
         void cleanup_glulx(struct sock_names* names);
         void free(void* ptr);
         """)
@@ -33,6 +33,10 @@ def parse_args():
                         help="Number of quests to sample. Default: %(default)s")
     parser.add_argument("--seed", type=int,
                         help="Seed for random generator. Default: always different.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes used to search for quests. Default: %(default)s")
+    parser.add_argument("--unordered", action="store_true",
+                        help="With multiple workers, don't wait for earlier parts of the search before returning quests.")
     parser.add_argument("-v", "--verbose", action="store_true",
                         help="Print more information.")
 
@@ -71,6 +75,8 @@ def main():
     options.rules_per_depth = {}
     options.create_variables = False
     options.rng = np.random.RandomState(args.seed)
+    options.nb_workers = args.workers
+    options.ordered = not args.unordered
 
     # Sample quests.
     chains = []
@@ -152,7 +152,11 @@ static int glk_connect(struct sock_names* names) { /* arg mutable for connection
     return 0;
 }
 
-const char* get_output_nosend(struct sock_names* names) {
+/**
+ * Receive the next message. Its size is stored in `size`, if not NULL:
+ * game outputs are framed (see agent.c) and can contain null bytes.
+ */
+const char* get_output_nosend(struct sock_names* names, uint32_t* size) {
     if (glk_connect(names) != 0) {
         return NULL;
     }
@@ -169,6 +173,13 @@ const char* get_output_nosend(struct sock_names* names) {
     if (!msg_buf) {
         return NULL;
     }
+    if (size != NULL) {
+        *size = 0;
+    }
+    if (buf_size == 0) {
+        return msg_buf; /* recv() would wait for data. */
+    }
+
     amt = robust_recv(names->sock_fd, msg_buf, buf_size, MSG_WAITALL);
     if (amt < 0) {
         perror("glk_comm.c: Could not read msg");
@@ -178,13 +189,20 @@ const char* get_output_nosend(struct sock_names* names) {
     if (amt == 0 && buf_size != 0) {
         fprintf(stderr, "glk_comm.c: Expected %d but only got %zd!\n", buf_size, amt);
     }
+    if (size != NULL) {
+        *size = amt;
+    }
 
     return msg_buf;
 }
 
-const char* communicate(struct sock_names* names, const char* message) {
+/**
+ * Send a message without waiting for the reply, which can then be received
+ * with get_output_nosend(). Returns 0 on success, -1 otherwise.
+ */
+int send_message(struct sock_names* names, const char* message) {
     if (glk_connect(names) != 0) {
-        return NULL;
+        return -1;
     }
 
     int msg_len = strlen(message);
@@ -193,16 +211,57 @@ const char* communicate(struct sock_names* names, const char* message) {
     int result = send(names->sock_fd, &net_msg_len, sizeof(net_msg_len), 0);
     if (result == -1) {
         perror("glk_comm.c: Could not send msg size");
-        return NULL;
+        return -1;
     }
 
     result = send(names->sock_fd, message, msg_len, 0);
     if (result == -1) {
         perror("glk_comm.c: Could not send msg");
+        return -1;
+    }
+
+    return 0;
+}
+
+const char* communicate(struct sock_names* names, const char* message, uint32_t* size) {
+    if (send_message(names, message) != 0) {
         return NULL;
     }
 
-    return get_output_nosend(names);
+    return get_output_nosend(names, size);
+}
+
+/**
+ * Fork the game played through `names`, in its current state. The copy is
+ * reachable through `child`, which gets initialized like by init_glulx().
+ * Returns the pid of the copy, or -1 on failure.
+ */
+int fork_glulx(struct sock_names* names, struct sock_names* child) {
+    if (init_mq(child) != 0) {
+        return -1;
+    }
+
+    char message[PATH_MAX + 16];
+    snprintf(message, sizeof(message), "\x10+++FORK %s", child->sock_name);
+    const char* reply = communicate(names, message, NULL);
+    if (reply == NULL) {
+        return -1;
+    }
+
+    int pid = atoi(reply);
+    free((void*)reply);
+    if (pid <= 0) {
+        fprintf(stderr, "glk_comm.c: Could not fork the game\n");
+        return -1;
+    }
+
+    const char* ready = get_output_nosend(child, NULL);
+    if (ready == NULL) {
+        return -1;
+    }
+
+    free((void*)ready);
+    return pid;
 }
 
 /* ensure we're allowed as many open files as we want */
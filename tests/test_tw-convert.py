@@ -0,0 +1,27 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+import os
+from os.path import join as pjoin
+from subprocess import check_call
+
+from textworld.utils import make_temp_directory
+from textworld.generator import Game
+from textworld.generator.compact import is_compact
+from textworld.generator.tests.test_compact import _make_game
+
+
+def test_converting_games():
+    game = _make_game()
+    with make_temp_directory(prefix="test_tw-convert") as tmpdir:
+        env = dict(os.environ, TEXTWORLD_KB_REGISTRY=pjoin(tmpdir, "kb"))
+        game_file = pjoin(tmpdir, "game.ulx")
+        game.save(pjoin(tmpdir, "game.json"))
+
+        check_call(["tw-convert", game_file], env=env)
+        assert is_compact(pjoin(tmpdir, "game.json"))
+
+        check_call(["tw-convert", "--to", "json", game_file, "--output", pjoin(tmpdir, "out")], env=env)
+        assert is_compact(pjoin(tmpdir, "game.json"))
+        assert not is_compact(pjoin(tmpdir, "out", "game.json"))
+        assert Game.load(pjoin(tmpdir, "out", "game.json")) == game
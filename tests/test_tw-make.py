@@ -3,6 +3,7 @@
 
 import os
 import glob
+import json
 from subprocess import check_call, CalledProcessError
 from os.path import join as pjoin
 import textwrap
@@ -85,6 +86,68 @@ def test_making_challenge_game():
             textworld.play(game_file, agent=agent, silent=True)
 
 
+def test_making_a_corpus():
+    with make_temp_directory(prefix="test_tw-make_corpus") as tmpdir:
+        output_folder = pjoin(tmpdir, "gen_games")
+        manifest = pjoin(output_folder, "manifest.jsonl")
+        command = ["tw-make", "tw-coin_collector", "--level", "5", "--seed", "1234", "--output", output_folder,
+                   "--workers", "2", "--silent"]
+        assert check_call(command + ["--count", "4"]) == 0
+
+        with open(manifest) as f:
+            entries = [json.loads(line) for line in f]
+
+        assert sorted(entry["seed"] for entry in entries) == [1234, 1235, 1236, 1237]
+        compiled = [entry for entry in entries if entry["status"] == "compiled"]
+        assert len(compiled) > 0
+        assert len(set(entry["uuid"] for entry in compiled)) == len(compiled)
+        for entry in compiled:
+            assert os.path.isfile(entry["game_file"])
+
+        # Resuming only makes the games of the new seeds.
+        assert check_call(command + ["--count", "6"]) == 0
+        with open(manifest) as f:
+            entries = [json.loads(line) for line in f]
+
+        assert sorted(entry["seed"] for entry in entries) == [1234, 1235, 1236, 1237, 1238, 1239]
+
+
+def test_making_a_corpus_with_failures():
+    with make_temp_directory(prefix="test_tw-make_corpus_failures") as tmpdir:
+        challenge_py = pjoin(tmpdir, "failing_challenge.py")
+        with open(challenge_py, "w") as f:
+            f.write(textwrap.dedent("""\
+            import argparse
+
+            from textworld.challenges import register
+
+
+            def make_game(settings, options=None):
+                raise ValueError("Cannot make this game.")
+
+
+            register(name="failing-challenge",
+                     desc="Fail to generate any game",
+                     make=make_game,
+                     add_arguments=lambda parser=None: parser or argparse.ArgumentParser())
+            """))
+
+        output_folder = pjoin(tmpdir, "gen_games")
+        manifest = pjoin(output_folder, "manifest.jsonl")
+        command = ["tw-make", "--third-party", challenge_py, "failing-challenge", "--seed", "1234",
+                   "--output", output_folder, "--count", "3", "--workers", "2", "--silent"]
+        assert check_call(command) == 0
+
+        # Errors are recorded per seed instead of aborting the corpus.
+        with open(manifest) as f:
+            entries = [json.loads(line) for line in f]
+
+        assert sorted(entry["seed"] for entry in entries) == [1234, 1235, 1236]
+        for entry in entries:
+            assert entry["status"] == "failed"
+            assert "Cannot make this game." in entry["error"]
+
+
 def test_making_a_game_using_basic_theme():
     for i in range(10):  # Try a few different games.
         with make_temp_directory(prefix="test_tw-make") as tmpdir:
@@ -220,7 +220,7 @@ def make_game(mode: str, options: GameOptions) -> textworld.Game:
             chain = textworld.generator.sample_quest(world.state, options.chaining)
             break
         except QuestGenerationError:
-            world.state.remove_fact(player_fact)  # We'll try another starting location.
+            world.remove_fact(player_fact)  # We'll try another starting location.
 
     if chain is None:
         msg = ("Current map configuration doesn't permit quest of length: {}."
@@ -209,6 +209,25 @@ class Environment:
         """
         raise NotImplementedError()
 
+    def save_state(self) -> Any:
+        """ Saves the current state of the game.
+
+        Returns:
+            Snapshot of the game, to restore with :py:meth:`load_state`.
+        """
+        raise NotImplementedError()
+
+    def load_state(self, snapshot: Any) -> GameState:
+        """ Restores a state of the game saved with :py:meth:`save_state`.
+
+        Arguments:
+            snapshot: Snapshot of the game to restore.
+
+        Returns:
+            The game state at the moment the snapshot was taken.
+        """
+        raise NotImplementedError()
+
     def seed(self, seed: Optional[int] = None) -> None:
         """ Sets the seed for the random number generator. """
         return []
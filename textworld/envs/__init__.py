@@ -6,6 +6,7 @@ from textworld.envs.glulx.git_glulx import GitGlulxEnv
 from textworld.envs.zmachine.jericho import JerichoEnv
 from textworld.envs.wrappers.tw_inform7 import TWInform7
 from textworld.envs.pddl import PddlEnv
+from textworld.envs.tw import TextWorldEnv
 
 
 def _guess_backend(path):
@@ -16,6 +17,8 @@ def _guess_backend(path):
         return JerichoEnv
     elif path.endswith(".tw-pddl"):
         return PddlEnv
+    elif path.endswith(".json"):
+        return TextWorldEnv  # Simulate the game without an interpreter.
 
     msg = "Unsupported game format: {}".format(path)
     raise ValueError(msg)
@@ -6,13 +6,14 @@ except ImportError:
     Iterable = (tuple, list)
 
 from textworld.envs.batch.batch_env import AsyncBatchEnv
+from textworld.envs.batch.batch_env import HostedBatchEnv
 from textworld.envs.batch.batch_env import SyncBatchEnv
 
 
 __all__ = ['make']
 
 
-def make(game_files, asynchronous=True, wrappers=None, **kwargs):
+def make(game_files, asynchronous=True, wrappers=None, nb_hosts=None, **kwargs):
     """Create a batch environment from a list of game files.
 
     Parameters
@@ -26,6 +27,10 @@ def make(game_files, asynchronous=True, wrappers=None, **kwargs):
     wrappers : Callable or Iterable of Callables (default: `None`)
         If not `None`, then apply the wrappers to each internal
         environment during creation.
+    nb_hosts : int (default: `None`)
+        If not `None` and `asynchronous` is `True`, plays the games with
+        that many processes, each hosting a share of them, in a
+        `HostedBatchEnv`. Recommended for large batches of Glulx games.
 
     Returns
     -------
@@ -47,4 +52,10 @@ def make(game_files, asynchronous=True, wrappers=None, **kwargs):
         return env
 
     env_fns = [partial(_make_env, game_file=game_file) for game_file in game_files]
-    return AsyncBatchEnv(env_fns) if asynchronous else SyncBatchEnv(env_fns)
+    if not asynchronous:
+        return SyncBatchEnv(env_fns)
+
+    if nb_hosts is not None:
+        return HostedBatchEnv(env_fns, nb_hosts=nb_hosts)
+
+    return AsyncBatchEnv(env_fns)
@@ -1,6 +1,9 @@
 
+import os
+import selectors
 import multiprocessing as mp
-from typing import Tuple, List, Dict
+from functools import partial
+from typing import Tuple, List, Dict, Optional
 
 import numpy as np
 
@@ -188,6 +191,185 @@ class AsyncBatchEnv(Environment):
             env.result()
 
 
+def _submit(env, command: str) -> Optional[int]:
+    """ Send the command ahead to the env's interpreter, if it supports it (see `GitGlulxEnv._submit`). """
+    submit = getattr(getattr(env, "unwrapped", env), "_submit", None)
+    if submit is None:
+        return None
+
+    return submit(command)
+
+
+def _drain(env) -> None:
+    """ Drop the output of the command sent ahead with :py:func:`_submit`, if any. """
+    drain = getattr(getattr(env, "unwrapped", env), "_drain", None)
+    if drain is not None:
+        drain()
+
+
+class _Host:
+    """
+    Plays many games from a single process.
+
+    Commands are first sent to all the Glulx interpreters, which play them
+    concurrently. Their outputs are then processed as they arrive, through
+    a select loop. Other games are stepped in the meantime.
+    """
+    def __init__(self, env_fns: List[callable], auto_reset: bool = False):
+        self.envs = [env_fn() for env_fn in env_fns]
+        self.auto_reset = auto_reset
+        self.last = [None] * len(self.envs)
+        self._selector = selectors.DefaultSelector()
+
+    def load(self, game_files: List[str]) -> None:
+        for env, game_file in zip(self.envs, game_files):
+            env.load(game_file)
+
+    def seed(self, seeds: List[int]) -> None:
+        for env, seed in zip(self.envs, seeds):
+            env.seed(seed)
+
+    def reset(self) -> List[Tuple[str, Dict]]:
+        self.last = [None] * len(self.envs)
+        return [env.reset() for env in self.envs]
+
+    def step(self, actions: List[str]) -> List[Tuple[str, int, bool, Dict]]:
+        results = [None] * len(self.envs)
+        others = []
+        try:
+            for i, (env, action) in enumerate(zip(self.envs, actions)):
+                if self.last[i] is not None and self.last[i][2]:  # Game has ended on the last step.
+                    obs, reward, done, infos = self.last[i]  # Copy last state over.
+
+                    if self.auto_reset:
+                        reward, done = 0., False
+                        obs, infos = env.reset()
+
+                    results[i] = (obs, reward, done, infos)
+                    continue
+
+                fd = _submit(env, action)
+                if fd is None:
+                    others.append(i)
+                else:
+                    self._selector.register(fd, selectors.EVENT_READ, i)
+
+            for i in others:
+                results[i] = self.envs[i].step(actions[i])
+
+            while self._selector.get_map():
+                for key, _ in self._selector.select():
+                    self._selector.unregister(key.fileobj)
+                    results[key.data] = self.envs[key.data].step(actions[key.data])
+
+        finally:
+            # If a step failed, the other games sent ahead are left unstepped.
+            for key in list(self._selector.get_map().values()):
+                self._selector.unregister(key.fileobj)
+                _drain(self.envs[key.data])
+
+        self.last = results
+        return results
+
+    def render(self, mode: str = "human") -> List:
+        return [env.render(mode=mode) for env in self.envs]
+
+    def close(self) -> None:
+        for env in self.envs:
+            env.close()
+
+        self._selector.close()
+
+
+class HostedBatchEnv(Environment):
+    """ Environment to run many games in parallel with a few host processes.
+
+    Each host process plays a share of the games, concurrently: commands are
+    sent to all of its Glulx interpreters at once, then their outputs are
+    processed as they complete. A batch of N Glulx games thus needs N
+    interpreters but only `nb_hosts` Python processes, where
+    :py:class:`AsyncBatchEnv` would start N of them.
+    """
+
+    def __init__(self, env_fns: List[callable], auto_reset: bool = False, nb_hosts: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        env_fns : iterable of callable
+            Functions that create the environments.
+        nb_hosts : int, optional
+            Number of host processes. Default: one per CPU, at most one per environment.
+        """
+        self.env_fns = env_fns
+        self.auto_reset = auto_reset
+        self.batch_size = len(self.env_fns)
+        self.nb_hosts = min(nb_hosts or os.cpu_count() or 1, self.batch_size)
+
+        # Contiguous shares, so results come back in order.
+        bounds = np.linspace(0, self.batch_size, self.nb_hosts + 1).astype(int)
+        self._shares = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+        self.hosts = []
+        for share in self._shares:
+            self.hosts.append(_ChildEnv(partial(_Host, self.env_fns[share], auto_reset)))
+
+    def _call(self, method: str, values: Optional[List] = None) -> List:
+        """ Call a method on every host, with its share of `values`, and gather the results. """
+        for host, share in zip(self.hosts, self._shares):
+            host.call(method, *([] if values is None else [values[share]]))
+
+        results = []
+        for host in self.hosts:
+            results += host.result() or []
+
+        return results
+
+    def load(self, game_files: List[str]) -> None:
+        assert len(game_files) == self.batch_size
+        self._call("load", list(game_files))
+
+    def seed(self, seed=None):
+        # Use a different seed for each env to decorrelate batch examples.
+        rng = np.random.RandomState(seed)
+        seeds = list(rng.randint(65635, size=self.batch_size))
+        self._call("seed", seeds)
+        return seeds
+
+    def reset(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        """
+        Reset all environments of the batch.
+
+        Returns:
+            obs: Text observations, i.e. command's feedback.
+            infos: Information requested when creating the environments.
+        """
+        obs, infos = zip(*self._call("reset"))
+        infos = _list_of_dicts_to_dict_of_lists(infos)
+        return obs, infos
+
+    def step(self, actions: List[str]) -> Tuple[List[str], int, bool, Dict[str, List[str]]]:
+        """
+        Perform one action per environment of the batch.
+
+        Returns:
+            obs: Text observations, i.e. command's feedback.
+            reward: Current game score.
+            done: Whether the game is over or not.
+            infos: Information requested when creating the environments.
+        """
+        obs, rewards, dones, infos = zip(*self._call("step", list(actions)))
+        infos = _list_of_dicts_to_dict_of_lists(infos)
+        return obs, rewards, dones, infos
+
+    def render(self, mode='human'):
+        for host in self.hosts:
+            host.call("render", mode)
+
+        return [result for host in self.hosts for result in host.result()]
+
+    def close(self):
+        self._call("close")
+
+
 class SyncBatchEnv(Environment):
     """ Environment to run multiple games independently synchronously. """
 
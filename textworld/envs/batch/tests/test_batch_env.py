@@ -0,0 +1,98 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import shutil
+import tempfile
+import unittest
+from functools import partial
+from unittest import mock
+
+import numpy.testing as npt
+
+import textworld
+from textworld import g_rng
+from textworld import testing
+from textworld import EnvInfos
+
+from textworld.envs.batch import HostedBatchEnv, SyncBatchEnv
+from textworld.envs.batch.batch_env import _Host
+from textworld.envs.wrappers import Filter, GenericEnvironment
+
+
+def _make_env(infos):
+    return Filter(GenericEnvironment(infos))
+
+
+class TestHostedBatchEnv(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        g_rng.set_seed(201809)
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.options = textworld.GameOptions()
+        cls.options.path = cls.tmpdir
+        cls.options.file_ext = ".ulx"
+        cls.game, cls.game_file = testing.build_and_compile_game(cls.options)
+        cls.infos = EnvInfos(score=True, moves=True, won=True, admissible_commands=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_same_as_sync(self):
+        batch_size = 5
+        env_fns = [partial(_make_env, self.infos) for _ in range(batch_size)]
+        envs = [SyncBatchEnv(env_fns), HostedBatchEnv(env_fns, nb_hosts=2)]
+        assert len(envs[1].hosts) == 2
+
+        commands = self.game.walkthrough
+        for env in envs:
+            env.load([self.game_file] * batch_size)
+
+        assert envs[0].reset() == envs[1].reset()
+        for i in range(len(commands) + 1):
+            # Each game plays the walkthrough with a different delay, then looks around.
+            actions = [(["look"] * j + commands + ["look"] * batch_size)[i] for j in range(batch_size)]
+            results = [env.step(actions) for env in envs]
+            assert results[0] == results[1]
+
+        obs, scores, dones, infos = results[1]
+        assert dones[0] and not dones[-1]
+        assert infos["won"][0]
+
+        for env in envs:
+            env.close()
+
+    def test_auto_reset(self):
+        env = HostedBatchEnv([partial(_make_env, self.infos)] * 2, auto_reset=True, nb_hosts=1)
+        env.load([self.game_file] * 2)
+        obs, infos = env.reset()
+
+        commands = self.game.walkthrough
+        for command in commands:
+            _, _, dones, _ = env.step([command, "look"])
+
+        assert dones == (True, False)
+
+        # The finished game is reset on the next step.
+        obs_, scores, dones, infos = env.step(["look", "look"])
+        assert obs_[0] == obs[0]
+        assert scores[0] == 0 and not dones[0]
+        assert not dones[1]
+
+        env.close()
+
+    def test_failed_step(self):
+        host = _Host([partial(_make_env, self.infos)] * 3)
+        host.load([self.game_file] * 3)
+        host.reset()
+
+        with mock.patch.object(host.envs[1], "step", side_effect=RuntimeError):
+            npt.assert_raises(RuntimeError, host.step, ["look"] * 3)
+
+        # Games sent ahead were drained, the host can keep playing.
+        assert not host._selector.get_map()
+        results = host.step(["look"] * 3)
+        assert results[0][0] == results[1][0] == results[2][0]
+        host.close()
@@ -3,12 +3,19 @@
 
 
 # -*- coding: utf-8 -*-
+import os
 import sys
+import struct
+import weakref
 import textwrap
+import threading
 import subprocess
+from functools import partial
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pkg_resources import Requirement, resource_filename
 
-from typing import Union
+from typing import Callable, List, Optional, Tuple, Union
 
 from glk import ffi, lib
 from io import StringIO
@@ -19,6 +26,19 @@ from textworld.core import GameNotRunningError
 
 GLULX_PATH = resource_filename(Requirement.parse('textworld'), 'textworld/thirdparty/glulx/Git-Glulx')
 
+#: Default number of interpreters kept ready by each environment. Set `TEXTWORLD_GLULX_POOL_SIZE` to change it.
+DEFAULT_POOL_SIZE = 1
+
+#: Kinds of the fields framing the output of the interpreter (see `agent.c`).
+TEXT, DEBUG_TAG, SECTION_START, SECTION_END = "t", "d", "s", "e"
+
+_FIELD_HEADER = struct.Struct(">BI")  # Kind, then size of the text.
+
+
+def _single_line(command: str) -> str:
+    """ Join the lines of a command, since the interpreter plays each line as its own turn. """
+    return " ".join(line.strip() for line in command.splitlines()).strip()
+
 
 def _strip_input_prompt_symbol(text: str) -> str:
     if text.endswith("\n>"):
@@ -27,6 +47,195 @@ def _strip_input_prompt_symbol(text: str) -> str:
     return text
 
 
+def _parse_fields(data: bytes) -> List[Tuple[str, str]]:
+    """ Split a framed output into its (kind, text) fields.
+
+    Concatenating the texts gives back the output as printed by the game,
+    where sections (e.g. `<score>...</score>`) and Inform7 debug tags
+    (e.g. `[looking]`) were delimited by the interpreter.
+    """
+    fields = []
+    offset = 0
+    while offset < len(data):
+        kind, size = _FIELD_HEADER.unpack_from(data, offset)
+        offset += _FIELD_HEADER.size
+        fields.append((chr(kind), data[offset:offset + size].decode('utf-8')))
+        offset += size
+
+    return fields
+
+
+def _strip_input_prompt_field(fields: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    if fields and fields[-1][0] == TEXT:
+        return fields[:-1] + [(TEXT, _strip_input_prompt_symbol(fields[-1][1]))]
+
+    return fields
+
+
+def _sections(fields: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """ Only keep the fields making up sections. """
+    kept = []
+    inside = False
+    for kind, text in fields:
+        inside = inside or kind == SECTION_START
+        if inside:
+            kept.append((kind, text))
+
+        inside = inside and kind != SECTION_END
+
+    return kept
+
+
+class _Interpreter:
+    """ A git-glulx-ml process waiting for a command. """
+
+    def __init__(self, gamefile: Optional[str] = None, parent: Optional["_Interpreter"] = None) -> None:
+        """
+        Arguments:
+            gamefile: Game to start in a new process.
+            parent: Interpreter to fork instead. The copy continues from the
+                    current state of the game, VM memory included.
+        """
+        self.process = None
+        self.pid = None
+        self.intro = None
+        self.names = ffi.new('struct sock_names*')
+        self._lock = threading.Lock()  # One request at a time on the socket.
+        if parent is not None:
+            with parent._lock:
+                pid = lib.fork_glulx(parent.names, self.names)
+
+            if pid == -1:
+                self.close()
+                raise GameNotRunningError()
+
+            self.pid = pid
+            return
+
+        lib.init_glulx(self.names)
+        sock_name = ffi.string(self.names.sock_name).decode('utf-8')
+        self.process = subprocess.Popen(["%s/git-glulx-ml" % (GLULX_PATH,), gamefile, '-g', sock_name, '-q'])
+        self.pid = self.process.pid
+        self.intro = self._receive(lib.get_output_nosend, self.names)
+        if self.intro is None:
+            self.close()
+            raise ValueError("Game failed to start properly: {}.".format(gamefile))
+
+    def communicate(self, message: str) -> Optional[List[Tuple[str, str]]]:
+        """ Send commands, one per line, in a single round trip.
+
+        Returns:
+            The fields framing the output of all the commands, or None if
+            the game is not running anymore.
+        """
+        c_message = ffi.new('char[]', message.encode('utf-8'))
+        return self._receive(lib.communicate, self.names, c_message)
+
+    def send(self, message: str) -> bool:
+        """ Send commands, one per line, without waiting for their output (see :py:meth:`receive`). """
+        return lib.send_message(self.names, ffi.new('char[]', message.encode('utf-8'))) == 0
+
+    def receive(self) -> Optional[List[Tuple[str, str]]]:
+        """ Wait for the output of the commands sent last. """
+        return self._receive(lib.get_output_nosend, self.names)
+
+    def fileno(self) -> int:
+        """ Socket becoming readable once the output is available. """
+        return self.names.sock_fd
+
+    @staticmethod
+    def _receive(function, *args) -> Optional[List[Tuple[str, str]]]:
+        size = ffi.new('uint32_t*')
+        c_output = function(*args, size)
+        if c_output == ffi.NULL:
+            return None
+
+        c_output = ffi.gc(c_output, lib.free)
+        return _parse_fields(ffi.buffer(c_output, size[0])[:])
+
+    @property
+    def running(self) -> bool:
+        if self.process is not None:
+            return self.process.poll() is None
+
+        if self.pid is None:
+            return False
+
+        try:
+            os.kill(self.pid, 0)  # Forked copies are not our children, but they are reaped by their parent.
+        except ProcessLookupError:
+            return False
+
+        return True
+
+    def close(self) -> None:
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+        # Forked copies exit by themselves once their socket is closed.
+        self.pid = None
+        lib.cleanup_glulx(self.names)
+
+    def __del__(self):
+        self.close()
+
+
+class _Snapshot:
+    """ State of a game saved by :py:meth:`GitGlulxEnv.save_state`.
+
+    The game is kept in a frozen copy of the interpreter, which is forked
+    again each time the snapshot is loaded. The copy exits when the snapshot
+    is garbage collected.
+    """
+
+    def __init__(self, interpreter: _Interpreter, state: GameState) -> None:
+        self.interpreter = _Interpreter(parent=interpreter)
+        self.state = GameState(state)
+
+
+class _InterpreterPool:
+    """ Interpreters booted in the background, ready to play a game.
+
+    Each interpreter handed over is replaced by a new one booting in the
+    background. Interpreters that were not handed over are terminated, and
+    their socket removed, when the pool is closed or garbage collected.
+    """
+
+    def __init__(self, boot: Callable[[], _Interpreter], size: int) -> None:
+        """
+        Arguments:
+            boot: Function returning a new interpreter.
+            size: Number of interpreters to keep ready.
+        """
+        self._boot = boot
+        self._executor = ThreadPoolExecutor(max_workers=size)
+        self._pending = deque(self._executor.submit(boot) for _ in range(size))
+        self._finalizer = weakref.finalize(self, self._shutdown, self._executor, self._pending)
+
+    def get(self) -> _Interpreter:
+        """ Hand over a ready interpreter, waiting for it if it is still booting. """
+        interpreter = self._pending.popleft().result()
+        if not interpreter.running:  # Terminated while waiting in the pool.
+            interpreter.close()
+            interpreter = self._boot()
+
+        self._pending.append(self._executor.submit(self._boot))
+        return interpreter
+
+    def close(self) -> None:
+        self._finalizer()
+
+    @staticmethod
+    def _shutdown(executor, pending) -> None:
+        executor.shutdown(wait=True)
+        while pending:
+            future = pending.popleft()
+            if future.exception() is None:
+                future.result().close()
+
+
 class GitGlulxEnv(textworld.Environment):
     """ Environment to support playing Glulx games.
 
@@ -37,26 +246,60 @@ class GitGlulxEnv(textworld.Environment):
     comes handy when we want to generate large world with a lot of objects
     in it.
 
+    The game is only started once: :py:meth:`reset` restores a snapshot
+    taken right after the introduction (see :py:meth:`save_state`). To make
+    it even faster, copies of that snapshot are prepared in advance by a
+    pool, which replaces each copy handed over in the background. Commands
+    configuring the game, like `tw-extra-infos score`, can be added to
+    :py:attr:`setup_commands`: they are played once, before taking the
+    snapshot, so resetting the game doesn't need any round trip.
+
+    The interpreter frames its output: sections (e.g. `<score>...</score>`)
+    and Inform7 debug tags (e.g. `[looking]`) are delimited as it is printed,
+    and are found in `state["_fields"]` as (kind, text) pairs next to the
+    feedback. The sections printed by the setup commands are added to the
+    fields of the introduction.
+
     We use a customized version of `git-glulx <https://github.com/DavidKinder/Git>`_
     as the glulx interpreter. That way we don't rely on stdin/stdout to
     communicate with the interpreter but instead use UNIX sockets.
 
     """
 
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, pool_size: Optional[int] = None, **kwargs) -> None:
+        """
+        Arguments:
+            pool_size: Number of interpreters to keep ready for the next resets.
+                       Use 0 to prepare them on demand.
+                       Default: `TEXTWORLD_GLULX_POOL_SIZE` or :py:data:`DEFAULT_POOL_SIZE`.
+        """
         super().__init__(*args, **kwargs)
-        self._process = None
+        if pool_size is None:
+            pool_size = int(os.environ.get("TEXTWORLD_GLULX_POOL_SIZE", DEFAULT_POOL_SIZE))
+
+        self.pool_size = pool_size
+        self.setup_commands = []
+        self._pool = None
+        self._intro = None
+        self._intro_setup_commands = None
+        self._interpreter = None
+        self._submitted = None
+
+    def _stop(self) -> None:
+        """ Terminate the running game, if any. """
+        if self._interpreter is not None:
+            self._interpreter.close()
+            self._interpreter = None
+
+        self._submitted = None
 
     def close(self) -> None:
-        if self.game_running:
-            self._process.kill()
-            self._process.wait()
-            self._process = None
+        self._stop()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
 
-        try:
-            lib.cleanup_glulx(self._names_struct)
-        except AttributeError:
-            pass  # Attempted to kill before reset
+        self._intro = None
 
     def __del__(self):
         self.close()
@@ -69,27 +312,33 @@ class GitGlulxEnv(textworld.Environment):
     @property
     def game_running(self) -> bool:
         """ Determines if the game is still running. """
-        return self._process is not None and self._process.poll() is None
+        return self._interpreter is not None and self._interpreter.running
 
     def step(self, command: str) -> str:
         if not self.game_running:
             raise GameNotRunningError()
 
         self.state = GameState()
-        self.state.last_command = command.strip()
-        self.state.raw = self._send(self.state.last_command)
-        if self.state.raw is None:
+        self.state.last_command = _single_line(command)  # One step, one turn.
+        fields = self._communicate(self.state.last_command)
+        if fields is None:
             raise GameNotRunningError()
 
+        self.state.raw = "".join(text for _, text in fields)
         self.state.feedback = _strip_input_prompt_symbol(self.state.raw)
+        self.state["_fields"] = _strip_input_prompt_field(fields)
         self.state.score = 0  # Default value.
         self.state.done = False  # Default value.
         return self.state, self.state.score, self.state.done
 
-    def _send(self, command: str) -> Union[str, None]:
-        """ Send a command directly to the interpreter.
+    def _communicate(self, command: str) -> Optional[List[Tuple[str, str]]]:
+        """ Send commands, one per line, directly to the interpreter.
 
         This method will not affect the internal state variable.
+
+        Returns:
+            The fields framing the output of the commands (see `agent.c`),
+            or None if the game is not running anymore.
         """
         if not self.game_running:
             return None
@@ -97,32 +346,120 @@ class GitGlulxEnv(textworld.Environment):
         if len(command) == 0:
             command = " "
 
-        c_command = ffi.new('char[]', command.encode('utf-8'))
-        result = lib.communicate(self._names_struct, c_command)
-        if result == ffi.NULL:
-            self.close()
+        submitted, self._submitted = self._submitted, None
+        if submitted is None:
+            fields = self._interpreter.communicate(command)
+        else:
+            fields = self._interpreter.receive()
+            if fields is not None and submitted != command:
+                fields = self._interpreter.communicate(command)  # The output of `submitted` is dropped.
+
+        if fields is None:
+            self._stop()
+
+        return fields
+
+    def _submit(self, command: str) -> Optional[int]:
+        """ Send the command of the next step ahead, without waiting for its output.
+
+        That way, many games can be played concurrently from one process
+        (see :py:class:`textworld.envs.batch.HostedBatchEnv`): the output is
+        picked up by the next :py:meth:`step` with that command. The command
+        is played no matter what, so don't send anything else in between.
+
+        Returns:
+            The file descriptor becoming readable once the output is available,
+            or None if the game is not running.
+        """
+        if not self.game_running or self._submitted is not None:
             return None
 
-        result = ffi.gc(result, lib.free)
-        return ffi.string(result).decode('utf-8')
+        command = _single_line(command) or " "
+        if not self._interpreter.send(command):
+            self._stop()
+            return None
+
+        self._submitted = command
+        return self._interpreter.fileno()
+
+    def _drain(self) -> None:
+        """ Wait for the output of the command sent ahead with :py:meth:`_submit`, if any, and drop it.
+
+        The command was played nonetheless, this only keeps the socket in sync.
+        """
+        submitted, self._submitted = self._submitted, None
+        if submitted is not None and self._interpreter.receive() is None:
+            self._stop()
+
+    def _send(self, command: str) -> Union[str, None]:
+        """ Send a command directly to the interpreter.
+
+        This method will not affect the internal state variable.
+        """
+        fields = self._communicate(command)
+        if fields is None:
+            return None
+
+        return "".join(text for _, text in fields)
 
     def reset(self) -> str:
-        self.close()  # Terminate existing process if needed.
+        self._stop()  # Terminate existing process if needed.
+
+        setup_commands = list(self.setup_commands)
+        if self._intro is not None and self._intro_setup_commands != setup_commands:
+            self.close()  # The snapshot was taken with different setup commands.
+
+        if self._intro is None:
+            # Start the game, then take a snapshot right after its introduction.
+            self._interpreter = _Interpreter(self._gamefile)
+            fields = _strip_input_prompt_field(self._interpreter.intro)
+            feedback = "".join(text for _, text in fields)
+            if setup_commands:
+                setup = self._communicate("\n".join(setup_commands))
+                if setup is None:
+                    raise GameNotRunningError()
+
+                fields += _sections(setup)
+
+            state = GameState(feedback=feedback, raw=feedback, _fields=fields)
+            self._intro = _Snapshot(self._interpreter, state)
+            self._intro_setup_commands = setup_commands
+            if self.pool_size > 0:
+                self._pool = _InterpreterPool(partial(_Interpreter, parent=self._intro.interpreter), self.pool_size)
+
+        elif self._pool is not None:
+            self._interpreter = self._pool.get()
+        else:
+            self._interpreter = _Interpreter(parent=self._intro.interpreter)
+
+        self.state = GameState(self._intro.state)
+        return self.state
 
-        self._names_struct = ffi.new('struct sock_names*')
+    def save_state(self) -> _Snapshot:
+        """ Saves the current state of the game.
 
-        lib.init_glulx(self._names_struct)
-        sock_name = ffi.string(self._names_struct.sock_name).decode('utf-8')
-        self._process = subprocess.Popen(["%s/git-glulx-ml" % (GLULX_PATH,), self._gamefile, '-g', sock_name, '-q'])
-        c_feedback = lib.get_output_nosend(self._names_struct)
-        if c_feedback == ffi.NULL:
-            self.close()
-            raise ValueError("Game failed to start properly: {}.".format(self._gamefile))
-        c_feedback = ffi.gc(c_feedback, lib.free)
+        Saving is cheap: the interpreter process is forked, and the copy
+        waits until the snapshot is loaded.
+
+        Returns:
+            Snapshot to restore with :py:meth:`load_state`.
+        """
+        if not self.game_running:
+            raise GameNotRunningError()
+
+        return _Snapshot(self._interpreter, self.state)
 
-        feedback = ffi.string(c_feedback).decode('utf-8')
-        feedback = _strip_input_prompt_symbol(feedback)
-        self.state = GameState(feedback=feedback, raw=feedback)
+    def load_state(self, snapshot: _Snapshot) -> GameState:
+        """ Restores a state of the game saved with :py:meth:`save_state`.
+
+        The same snapshot can be loaded any number of times.
+
+        Returns:
+            The game state at the moment the snapshot was taken.
+        """
+        self._stop()
+        self._interpreter = _Interpreter(parent=snapshot.interpreter)
+        self.state = GameState(snapshot.state)
         return self.state
 
     def render(self, mode: str = "human") -> None:
@@ -15,6 +15,7 @@ from textworld import testing
 from textworld.core import GameNotRunningError
 
 from textworld.envs.glulx.git_glulx import GitGlulxEnv
+from textworld.envs.glulx.git_glulx import DEBUG_TAG, SECTION_START, SECTION_END
 
 
 class TestGitGlulxEnv(unittest.TestCase):
@@ -78,7 +79,93 @@ class TestGitGlulxEnv(unittest.TestCase):
         self.env.reset()
         self.env.step("")
 
+        # A command spanning several lines is played as a single turn.
+        self.env.reset()
+        game_state, _, _ = self.env.step("look\ninventory")
+        assert game_state.last_command == "look inventory"
+        assert "\n>" not in game_state.feedback
+
     def test_quit_no(self):
         self.env.step("quit")
         self.env.step("no")
         self.env.step("look")
+
+    def test_interpreter_pool(self):
+        env = GitGlulxEnv(pool_size=2)
+        env.load(self.game_file)
+        game_state = env.reset()
+        assert game_state.feedback == self.env.reset().feedback
+
+        # Each reset hands over a new interpreter.
+        interpreter = env._interpreter
+        game_state = env.reset()
+        assert not interpreter.running
+        assert env._interpreter is not interpreter
+        assert game_state.feedback == self.env.state.feedback
+        pending = [future.result() for future in env._pool._pending]
+        assert len(pending) == 2
+        assert all(interpreter.running for interpreter in pending)
+
+        game_state, _, _ = env.step("look")
+        assert game_state.feedback.strip()
+
+        # Closing the environment terminates all the interpreters.
+        env.close()
+        assert not env.game_running
+        assert all(not interpreter.running for interpreter in pending)
+
+        # Interpreters can also be prepared on demand.
+        env = GitGlulxEnv(pool_size=0)
+        env.load(self.game_file)
+        env.reset()
+        env.reset()
+        assert env._pool is None
+        env.close()
+
+    def test_save_and_load_state(self):
+        self.env.reset()
+        self.env.step("inventory")
+        snapshot = self.env.save_state()
+        game_state, _, _ = self.env.step("look")
+
+        # Snapshots can be loaded many times, even after the game is over.
+        for _ in range(2):
+            assert self.env.load_state(snapshot).feedback == self.env.step("inventory")[0].feedback
+            assert self.env.step("look")[0].feedback == game_state.feedback
+            self.env.step("quit")
+            self.env.step("yes")
+            npt.assert_raises(GameNotRunningError, self.env.step, "look")
+
+        npt.assert_raises(GameNotRunningError, self.env.save_state)
+
+    def test_setup_commands(self):
+        env = GitGlulxEnv(pool_size=0)
+        env.load(self.game_file)
+        env.setup_commands = ["tw-extra-infos score", "tw-trace-actions"]
+        game_state = env.reset()
+        assert game_state.feedback == self.env.reset().feedback
+
+        # Only the sections printed by the setup commands are kept.
+        fields = game_state["_fields"]
+        assert (SECTION_START, "<score>\n") in fields
+        assert "".join(text for _, text in fields).startswith(game_state.feedback)
+
+        # The output is framed by the interpreter.
+        game_state, _, _ = env.step("look")
+        fields = game_state["_fields"]
+        assert "".join(text for _, text in fields) == game_state.feedback
+        assert (DEBUG_TAG, "[looking - succeeded]\n") in fields
+        assert (SECTION_START, "<score>\n") in fields
+        assert (SECTION_END, "</score>") in fields
+
+        # Changing the setup commands takes a new snapshot.
+        env.setup_commands = []
+        game_state = env.reset()
+        assert game_state["_fields"][-1][0] not in (SECTION_START, SECTION_END)
+        game_state, _, _ = env.step("look")
+        assert all(kind not in (DEBUG_TAG, SECTION_START) for kind, _ in game_state["_fields"])
+
+        # Commands can be sent together, one per line.
+        env.reset()
+        assert env._send("look\nlook").count(self.env.step("look")[0].feedback) == 2
+        env.close()
@@ -0,0 +1,123 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import unittest
+from os.path import join as pjoin
+
+import textworld
+from textworld import testing
+from textworld.utils import make_temp_directory
+from textworld.logic import Proposition, Variable
+from textworld.generator import World
+from textworld.generator.game import Game, GameProgression, Quest, Event
+from textworld.envs import TextWorldEnv
+
+
+def _make_game():
+    P, I = Variable("P", "P"), Variable("I", "I")
+    room, chest, carrot = Variable("r_0", "r"), Variable("c_0", "c"), Variable("f_0", "f")
+    facts = [Proposition("at", [P, room]), Proposition("at", [chest, room]), Proposition("open", [chest]),
+             Proposition("in", [carrot, I])]
+    world = World.from_facts(facts)
+    actions = [action for action in GameProgression(Game(world)).valid_actions if action.name == "insert"]
+    eating_carrot = Event(conditions={Proposition("eaten", [carrot])})
+    game = Game(world, quests=[Quest(win_events=[Event(actions)], fail_events=[eating_carrot], reward=2)])
+    for var, name in [(room, "kitchen"), (chest, "chest"), (carrot, "carrot")]:
+        game.infos[var.name].name = name
+
+    game.objective = "Put the carrot in the chest."
+    game.metadata["walkthrough"] = ["insert carrot into chest"]
+    return game
+
+
+class TestTextWorldEnv(unittest.TestCase):
+
+    def setUp(self):
+        self.game = _make_game()
+        self.infos = textworld.EnvInfos(facts=True, admissible_commands=True, description=True, inventory=True,
+                                        won=True, lost=True, moves=True, policy_commands=True,
+                                        last_action=True)
+        self.env = TextWorldEnv(self.infos)
+        self.env.load(game=self.game)
+
+    def test_reset(self):
+        state = self.env.reset()
+        assert state.feedback.startswith(self.game.objective)
+        assert state.raw == state.feedback
+        assert state["score"] == 0 and not state["done"]
+        assert state["max_score"] == 2
+        assert state["moves"] == 0
+        assert state["policy_commands"] == ["insert carrot into chest"]
+        assert "insert carrot into chest" in state["admissible_commands"]
+        assert "eat carrot" in state["admissible_commands"]
+        assert "kitchen" in state["description"]
+        assert "carrot" in state["inventory"]
+
+    def test_indefinite_articles(self):
+        # Entities without an indefinite article fall back to "a" or "an", like Inform7.
+        assert self.game.infos["f_0"].indefinite is None
+        state = self.env.reset()
+        assert "a carrot" in state["inventory"]
+
+        self.game.infos["f_0"].name = "onion"
+        state = self.env.reset()
+        assert "an onion" in state["inventory"]
+
+        self.game.infos["f_0"].indefinite = "some"
+        state = self.env.reset()
+        assert "some onion" in state["inventory"]
+
+    def test_step(self):
+        self.env.reset()
+        state, score, done = self.env.step("look at the ceiling")
+        assert state.feedback == "Nothing happens."
+        assert state["moves"] == 0 and score == 0 and not done
+
+        state, score, done = self.env.step("Insert carrot into chest")
+        assert score == 2 and done
+        assert state["won"] and not state["lost"]
+        assert state.feedback.endswith("*** The End ***")
+        assert Proposition("in", [Variable("f_0", "f"), Variable("c_0", "c")]) in state["_facts"]
+        assert state["last_action"].name == "insert"
+
+        # The game is over.
+        state, score, done = self.env.step("take carrot from chest")
+        assert state.feedback == "Nothing happens."
+        assert score == 2 and done
+
+    def test_losing(self):
+        self.env.reset()
+        state, score, done = self.env.step("eat carrot")
+        assert done and state["lost"] and not state["won"]
+        assert state.feedback.endswith("*** You lost! ***")
+
+    def test_copy(self):
+        self.env.reset()
+        env = self.env.copy()
+        state, _, _ = env.step("eat carrot")
+        assert state["lost"]
+
+        state, _, _ = self.env.step("insert carrot into chest")
+        assert state["won"]
+
+    def test_start(self):
+        with make_temp_directory() as tmpdir:
+            gamefile = pjoin(tmpdir, "game.json")
+            self.game.save(gamefile)
+            env = textworld.start(gamefile, self.infos)
+            assert isinstance(env, TextWorldEnv)
+
+            state = env.reset()
+            assert state["admissible_commands"] == self.env.reset()["admissible_commands"]
+            env.close()
+
+
+class TestParityWithInform7(unittest.TestCase):
+
+    def test_parity(self):
+        with make_temp_directory() as tmpdir:
+            options = textworld.GameOptions()
+            options.path = pjoin(tmpdir, "tw-game.ulx")
+            _, gamefile = testing.build_and_compile_game(options)
+            testing.check_backends_parity(gamefile, nb_rollouts=5, max_steps=20)
@@ -4,35 +4,125 @@
 
 # -*- coding: utf-8 -*-
 import os
-import re
-import sys
+import glob
+import json
 import textwrap
-
-from typing import Mapping, Union, Tuple, List
-
-import numpy as np
-
-from io import StringIO
+from os.path import join as pjoin
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import textworld
 from textworld.core import GameState
 from textworld.core import GameNotRunningError
+from textworld.logic import Action
+from textworld.logic.model import GameLogicModelBuilderSemantics, ActionTypeNode, ActionGrammarNode
+from textworld.logic.parser import GameLogicParser
+from textworld.textgen import TextGrammar
+from textworld.generator.data import LOGIC_DATA_PATH
 from textworld.generator.game import Game, GameProgression
 from textworld.generator.inform7 import Inform7Game
 
 
+_FEEDBACK_GRAMMARS = {}
+
+# The feedback grammar names some variables after the parameters of the PDDL actions.
+_MOVE_VARIABLES = {"r": "src", "r'": "dest"}
+_FEEDBACK_VARIABLES = {
+    "go/north": _MOVE_VARIABLES, "go/south": _MOVE_VARIABLES, "go/east": _MOVE_VARIABLES, "go/west": _MOVE_VARIABLES,
+    "examine/c": {"c": "t"},
+    "examine/s": {"s": "t"},
+}
+
+
+def load_feedback_grammar(paths: Optional[Iterable[str]] = None) -> TextGrammar:
+    """ Load the text grammar describing the outcome of each action.
+
+    Args:
+        paths: Logic files (.twl2) containing the grammar.
+               Default: the ones of the built-in knowledge base.
+
+    Returns:
+        A grammar having a `<rule>.feedback` symbol for each rule of the
+        knowledge base, and a `look.feedback` symbol describing the
+        player's surroundings.
+    """
+    paths = tuple(sorted(glob.glob(pjoin(LOGIC_DATA_PATH, "*.twl2")) if paths is None else paths))
+    if paths not in _FEEDBACK_GRAMMARS:
+        parser = GameLogicParser(semantics=GameLogicModelBuilderSemantics(), parseinfo=True)
+        data = {}
+        for path in paths:
+            with open(path) as f:
+                document = parser.parse(f.read(), rule_name="pddlStart")
+
+            for part in document.parts:
+                if isinstance(part, ActionTypeNode) and part.grammar:
+                    code = textwrap.dedent(part.grammar.code[3:-3])
+                    data.update(json.loads("\n".join(l for l in code.split("\n") if not l.lstrip().startswith("#"))))
+                elif isinstance(part, ActionGrammarNode):
+                    data.update(json.loads(textwrap.dedent(part.code[3:-3])))
+
+        _FEEDBACK_GRAMMARS[paths] = TextGrammar.parse(json.dumps(data))
+
+    return _FEEDBACK_GRAMMARS[paths]
+
 
 class TextWorldEnv(textworld.Environment):
     """
-    Environment for playing games by TextWorld.
+    Environment simulating games generated by TextWorld without an interpreter.
+
+    The game is played directly from its .json file: commands are matched
+    against the actions admissible in the current state, which are applied
+    to the game's logic, and the feedback is generated from the text
+    grammar of the knowledge base (see :py:func:`load_feedback_grammar`).
+    It provides the same information as playing the compiled game with
+    :py:class:`TWInform7 <textworld.envs.wrappers.tw_inform7.TWInform7>`,
+    at the speed of the logic engine. Only the narrative differs.
     """
 
-    def load(self, gamefile: str = "", game:textworld.Game = None) -> None:
-        #self._gamefile = gamefile
-        #self._game = textworld.Game.load(self._gamefile)
-        self._game = game
+    def __init__(self, infos: Optional[textworld.EnvInfos] = None) -> None:
+        super().__init__(infos)
+        self._game = None
+        self._game_progression = None
+
+    def load(self, gamefile: str = "", game: Optional[Game] = None) -> None:
+        """ Loads a game generated by TextWorld.
+
+        Arguments:
+            gamefile: Path to the game's .json file, or to a compiled version of the game next to it.
+            game: The game to play. Default: the one saved in `gamefile`.
+        """
+        self._gamefile = os.path.splitext(gamefile)[0] + ".json" if gamefile else None
+        self._game = game or Game.load(self._gamefile)
+        self._inform7 = Inform7Game(self._game)
+        self._grammar = load_feedback_grammar()
         self._game_progression = None
-        #self._inform7 = Inform7Game(self._game)
+
+    def _context(self, action=None) -> Dict:
+        mapping = dict(self._game.kb.types.constants_mapping)
+        variables = {}
+        if action is not None:
+            mapping.update(action.mapping)
+            variables = {ph.name: self._game.infos[var.name] for ph, var in action.mapping.items()}
+            aliases = _FEEDBACK_VARIABLES.get(action.name, {})
+            variables.update({alias: variables[name] for name, alias in aliases.items()})
+
+        return {
+            "state": self._game_progression.state,
+            "facts": self._game_progression.state.facts,
+            "variables": variables,
+            "mapping": mapping,
+            "entity_infos": self._game.infos,
+        }
+
+    def _describe(self, rule: str, action=None) -> str:
+        return self._grammar.derive("#{}#".format(rule), self._context(action))
+
+    def _admissible(self) -> List[Tuple[str, Action]]:
+        """ Admissible commands along with their action, for the current state. """
+        if self._admissible_cache is None:
+            actions = self._game_progression.valid_actions
+            self._admissible_cache = list(zip(self._inform7.gen_commands_from_actions(actions), actions))
+
+        return self._admissible_cache
 
     def _gather_infos(self):
         self.state["game"] = self._game
@@ -42,20 +132,22 @@ class TextWorldEnv(textworld.Environment):
         self.state["objective"] = self._game.objective
         self.state["max_score"] = self._game.max_score
 
-        # for k, v in self._game.extras.items():
-        #     self.state["extra.{}".format(k)] = v
+        for k, v in self._game.metadata.items():
+            self.state["extra.{}".format(k)] = v
 
         self.state["_game_progression"] = self._game_progression
         self.state["_facts"] = list(self._game_progression.state.facts)
 
-        self.state["won"] = '*** The End ***' in self.state["feedback"]
-        self.state["lost"] = '*** You lost! ***' in self.state["feedback"]
+        self.state["won"] = self._game_progression.completed
+        self.state["lost"] = self._game_progression.failed
+        self.state["score"] = self._game_progression.score
+        self.state["done"] = self.state["won"] or self.state["lost"]
 
         self.state["_winning_policy"] = self._current_winning_policy
-        # if self.infos.policy_commands:
-        #     self.state["policy_commands"] = []
-        #     if self._game_progression.winning_policy is not None:
-        #         self.state["policy_commands"] = self._inform7.gen_commands_from_actions(self._current_winning_policy)
+        if self.infos.policy_commands:
+            self.state["policy_commands"] = []
+            if self._current_winning_policy is not None:
+                self.state["policy_commands"] = self._inform7.gen_commands_from_actions(self._current_winning_policy)
 
         if self.infos.intermediate_reward:
             self.state["intermediate_reward"] = 0
@@ -74,124 +166,105 @@ class TextWorldEnv(textworld.Environment):
                 diff = len(self._previous_winning_policy) - len(self._current_winning_policy)
                 self.state["intermediate_reward"] = int(diff > 0) - int(diff < 0)  # Sign function.
 
-        # if self.infos.facts:
-        #     self.state["facts"] = list(map(self._inform7.get_human_readable_fact, self.state["_facts"]))
+        if self.infos.facts:
+            self.state["facts"] = list(map(self._inform7.get_human_readable_fact, self.state["_facts"]))
 
-        self.state["last_action"] = None
         self.state["_last_action"] = self._last_action
-        # if self.infos.last_action and self._last_action is not None:
-        #     self.state["last_action"] = self._inform7.get_human_readable_action(self._last_action)
+        if self.infos.last_action and self._last_action is not None:
+            self.state["last_action"] = self._inform7.get_human_readable_action(self._last_action)
 
         self.state["_valid_actions"] = self._game_progression.valid_actions
+        if self.infos.admissible_commands:
+            # To guarantee the order from one execution to another, we sort the commands.
+            # Remove any potential duplicate commands (they would lead to the same result anyway).
+            self.state["admissible_commands"] = sorted(set(command for command, _ in self._admissible()))
 
-        mapping = {k: info.name for k, info in self._game._infos.items()}
-        self.state["_valid_commands"] = [a.format_command(mapping) for a in self._game_progression.valid_actions]
-        # To guarantee the order from one execution to another, we sort the commands.
-        # Remove any potential duplicate commands (they would lead to the same result anyway).
-        self.state["admissible_commands"] = sorted(set(self.state["_valid_commands"]))
+        if self.infos.description:
+            self.state["description"] = self._describe("look.feedback")
+
+        if self.infos.inventory:
+            self.state["inventory"] = self._describe("inventory.feedback")
 
         if self.infos.moves:
             self.state["moves"] = self._moves
 
-    def reset(self):
+    def reset(self) -> GameState:
+        if self._game is None:
+            raise GameNotRunningError()
+
         self.prev_state = None
         self.state = GameState()
-        track_quests = (self.infos.intermediate_reward or self.infos.policy_commands)
-        self._game_progression = GameProgression(self._game, track_quests=track_quests)
+        self._game_progression = GameProgression(self._game)
+        self._admissible_cache = None
         self._last_action = None
         self._previous_winning_policy = None
         self._current_winning_policy = self._game_progression.winning_policy
         self._moves = 0
 
-        context = {
-            "state": self._game.world.state,
-            "facts": list(self._game.world.state.facts),
-            "variables": {},
-            "mapping": dict(self._game.kb.types.constants_mapping),
-            "entity_infos": self._game.infos,
-        }
+        self.state.feedback = self._describe("look.feedback")
+        if self._game.objective:
+            self.state.feedback = self._game.objective + "\n\n" + self.state.feedback
 
-        self.state.raw = "" # TODO
-        self.state.feedback = self._game.grammar.derive("#look.feedback#", context)
+        self.state.raw = self.state.feedback
         self._gather_infos()
         return self.state
 
-    def step(self, command: str):
+    def step(self, command: str) -> Tuple[GameState, float, bool]:
+        if self._game_progression is None:
+            raise GameNotRunningError()
+
         command = command.strip()
         self.prev_state = self.state
 
         self.state = GameState()
         self.state.last_command = command
-        self.state.raw = "" # TODO
-        self.state.feedback = ""  # TODO
         self._previous_winning_policy = self._current_winning_policy
 
         self._last_action = None
-        try:
-            # Find the action corresponding to the command.
-            idx = self.prev_state["_valid_commands"].index(command)
-            self._last_action = self._game_progression.valid_actions[idx]
+        if not self.prev_state["done"]:
+            # Ambiguous commands are mapped to the first matching action.
+            actions = (action for command_, action in self._admissible() if command_.lower() == command.lower())
+            self._last_action = next(actions, None)
+
+        if self._last_action is None:
+            self.state.feedback = "Nothing happens."  # We assume nothing happened in the game.
+        else:
             # An action that affects the state of the game.
             self._game_progression.update(self._last_action)
+            self._admissible_cache = None
             self._current_winning_policy = self._game_progression.winning_policy
+            self._moves += 1
 
-            context = {
-                "state": self._game_progression.state,
-                "facts": list(self._game_progression.state.facts),
-                "variables": {ph.name: self._game.infos[var.name] for ph, var in self._last_action.mapping.items()},
-                "mapping": {**self._game.kb.types.constants_mapping, **self._last_action.mapping},
-                "entity_infos": self._game.infos,
-            }
+            feedback_rule = self._last_action.feedback_rule or self._last_action.name + ".feedback"
+            self.state.feedback = self._describe(feedback_rule, self._last_action)
 
-            self.state.feedback = self._game.grammar.derive("#{}#".format(self._last_action.feedback_rule), context)
-            self._moves += 1
-        except ValueError:
-            self.state.feedback = "Nothing happens."
-            # print("Unknown command: {}".format(command))
-            pass  # We assume nothing happened in the game.
+            if self._game_progression.completed:
+                self.state.feedback += "\n\n*** The End ***"
+            elif self._game_progression.failed:
+                self.state.feedback += "\n\n*** You lost! ***"
 
+        self.state.raw = self.state.feedback
         self._gather_infos()
-        self.state["score"] = self._game_progression
-        self.state["done"] = self.state["won"] or self.state["lost"]
         return self.state, self.state["score"], self.state["done"]
 
     def copy(self) -> "TextWorldEnv":
-        """ Return a soft copy. """
-        env = TextWorldEnv()
+        """ Return a copy of this environment, which can be stepped independently. The game is shared. """
+        env = TextWorldEnv(self.infos)
 
         env.state = self.state
-        env.infos = self.infos
-
         env._gamefile = self._gamefile
         env._game = self._game
         env._inform7 = self._inform7
+        env._grammar = self._grammar
 
         env.prev_state = self.prev_state
         env._last_action = self._last_action
         env._previous_winning_policy = self._previous_winning_policy
         env._current_winning_policy = self._current_winning_policy
         env._moves = self._moves
-        env._game_progression = self._game_progression.copy()
-        return env
-
-    def render(self, mode: str = "human") -> None:
-        outfile = StringIO() if mode in ['ansi', "text"] else sys.stdout
-
-        msg = self.state.feedback.rstrip() + "\n"
-        if self.display_command_during_render and self.state.last_command is not None:
-            msg = '> ' + self.state.last_command + "\n" + msg
+        env._game_progression = None
+        if self._game_progression is not None:
+            env._game_progression = self._game_progression.copy()
+            env._admissible_cache = self._admissible_cache
 
-        # Wrap each paragraph.
-        if mode == "human":
-            paragraphs = msg.split("\n")
-            paragraphs = ["\n".join(textwrap.wrap(paragraph, width=80)) for paragraph in paragraphs]
-            msg = "\n".join(paragraphs)
-
-        outfile.write(msg + "\n")
-
-        if mode == "text":
-            outfile.seek(0)
-            return outfile.read()
-
-        if mode == 'ansi':
-            return outfile
+        return env
@@ -19,10 +19,41 @@ from textworld.envs.wrappers.tw_inform7 import TWInform7
 from textworld.envs.wrappers.tw_inform7 import GameData, Inform7Data
 from textworld.envs.wrappers.tw_inform7 import StateTracking
 from textworld.envs.wrappers.tw_inform7 import MissingGameInfosError
+from textworld.envs.wrappers.tw_inform7 import _detect_extra_infos, _detect_i7_events_debug_tags
+from textworld.envs.wrappers.tw_inform7 import _split_extra_infos, _split_i7_events
+from textworld.envs.glulx.git_glulx import TEXT, DEBUG_TAG, SECTION_START, SECTION_END
 
 from textworld.utils import make_temp_directory
 
 
+def test_framed_output_matches_raw_output():
+    fields = [(TEXT, "You open the box.\n"),
+              (DEBUG_TAG, "[opening the box - succeeded]\n"),
+              (DEBUG_TAG, "[(some subrule) - succeeded]\n"),
+              (SECTION_START, "<description>\n"),
+              (DEBUG_TAG, "[looking]\n"),
+              (TEXT, "-= Room =-\n"),
+              (DEBUG_TAG, "[looking - succeeded]\n"),
+              (SECTION_END, "</description>"),
+              (SECTION_START, "<score>\n"),
+              (TEXT, "1\n"),
+              (SECTION_END, "</score>"),
+              (TEXT, "\nYour score has just gone up by one point.")]
+    tracked_infos = ["description", "moves", "score"]
+
+    # Same results as when detecting them in the raw text.
+    raw = "".join(text for _, text in fields)
+    extra_infos, fields = _split_extra_infos(fields, tracked_infos)
+    assert extra_infos == {"description": "-= Room =-", "moves": None, "score": "1"}
+    text = "".join(text for _, text in fields)
+    assert (extra_infos, text) == _detect_extra_infos(raw, tracked_infos)
+
+    i7_events, fields = _split_i7_events(fields)
+    assert i7_events == ["opening the box"]
+    assert "".join(text for _, text in fields) == "You open the box.\n\nYour score has just gone up by one point."
+    assert (i7_events, "".join(text for _, text in fields)) == _detect_i7_events_debug_tags(text)
+
+
 class TestInform7Data(unittest.TestCase):
 
     @classmethod
@@ -175,6 +206,39 @@ class TestTWInform7(unittest.TestCase):
                 assert not done
                 assert not game_state.game_ended
 
+    def test_save_and_load_state(self):
+        with make_temp_directory(prefix="tw-snapshot") as tmpdir:
+            options = textworld.GameOptions()
+            options.path = pjoin(tmpdir, "tw-game.ulx")
+            game, gamefile = testing.build_and_compile_game(options)
+            infos = EnvInfos(facts=True, policy_commands=True, admissible_commands=True, intermediate_reward=True,
+                             inventory=True, description=True, score=True, moves=True, won=True)
+
+            env = TWInform7(GitGlulxEnv(infos))
+            env.load(gamefile)
+            env.reset()
+            game_state, _, _ = env.step("go east")
+            snapshot = env.save_state()
+
+            for _ in range(2):
+                for command in ["insert carrot into chest", "close chest"]:
+                    env.step(command)
+
+                assert env.state.won
+
+                # Both the game and its tracked state go back to the snapshot.
+                restored = env.load_state(snapshot)
+                for info in ["score", "moves", "inventory", "description", "policy_commands",
+                             "admissible_commands", "feedback"]:
+                    assert restored[info] == game_state[info]
+
+                assert set(restored["_facts"]) == set(game_state["_facts"])
+
+            game_state, _, _ = env.step("insert carrot into chest")
+            assert game_state.score == 2
+            assert game_state.intermediate_reward == 1
+            env.close()
+
 
 class TestGameData(unittest.TestCase):
 
@@ -12,6 +12,7 @@ import textworld
 from textworld.utils import str2bool
 from textworld.generator.game import Game, GameProgression
 from textworld.generator.inform7 import Inform7Game
+from textworld.envs.glulx.git_glulx import TEXT, DEBUG_TAG, SECTION_START, SECTION_END
 
 
 AVAILABLE_INFORM7_EXTRA_INFOS = ["description", "inventory", "score", "moves"]
@@ -30,6 +31,10 @@ class MissingGameInfosError(NameError):
         super().__init__(msg.format(env.__class__.__name__))
 
 
+_EXTRA_INFOS_REGEX = re.compile(r"<({})>\n(.*?)</\1>".format("|".join(AVAILABLE_INFORM7_EXTRA_INFOS)), re.DOTALL)
+_I7_DEBUG_TAG_REGEX = re.compile(r"\[[^]]+\]\n?")
+
+
 def _detect_extra_infos(text: str, tracked_infos: Optional[List[str]] = None) -> Mapping[str, str]:
     """ Detect extra information printed out at every turn.
 
@@ -45,23 +50,40 @@ def _detect_extra_infos(text: str, tracked_infos: Optional[List[str]] = None) ->
         values are the extra information displayed between tags.
     """
     tracked_infos = tracked_infos or AVAILABLE_INFORM7_EXTRA_INFOS
-    matches = {}
     for tag in tracked_infos:
         if tag not in AVAILABLE_INFORM7_EXTRA_INFOS:
             raise ValueError("TW game doesn't support tag: {}".format(tag))
 
-        regex = re.compile(r"<{tag}>\n(.*)</{tag}>".format(tag=tag), re.DOTALL)
-        match = re.search(regex, text)
-        if match:
-            _, cleaned_text = _detect_i7_events_debug_tags(match.group(1))
-            matches[tag] = cleaned_text.strip()
-            text = re.sub(regex, "", text)
-        else:
-            matches[tag] = None
+    matches = dict.fromkeys(tracked_infos)
+
+    def _extract(match):
+        if match.group(1) not in matches:
+            return match.group(0)  # Not tracked, leave it in the text.
+
+        _, cleaned_text = _detect_i7_events_debug_tags(match.group(2))
+        matches[match.group(1)] = cleaned_text.strip()
+        return ""
 
+    text = _EXTRA_INFOS_REGEX.sub(_extract, text)
     return matches, text
 
 
+def _i7_event(debug_tag: str) -> Optional[str]:
+    """ Get the Inform7 event reported by a debug tag, if it reports one. """
+    tag_name = debug_tag.strip()[1:-1]  # Strip starting '[' and trailing ']'.
+    if " - succeeded" not in tag_name:
+        return None
+
+    tag_name = tag_name[:tag_name.index(" - succeeded")]
+
+    # If it's got either a '(' or ')' in it, it's a subrule,
+    # so it doesn't count.
+    if "(" in tag_name or ")" in tag_name:
+        return None
+
+    return tag_name
+
+
 def _detect_i7_events_debug_tags(text: str) -> Tuple[List[str], str]:
     """ Detect all Inform7 events debug tags.
 
@@ -75,21 +97,81 @@ def _detect_i7_events_debug_tags(text: str) -> Tuple[List[str], str]:
         in the text, and a cleaned text without Inform 7 debug infos.
     """
     matches = []
-    for match in re.findall(r"\[[^]]+\]\n?", text):
-        text = text.replace(match, "")  # Remove i7 debug tags.
-        tag_name = match.strip()[1:-1]  # Strip starting '[' and trailing ']'.
 
-        if " - succeeded" in tag_name:
-            tag_name = tag_name[:tag_name.index(" - succeeded")]
-            matches.append(tag_name)
+    def _extract(match):
+        event = _i7_event(match.group(0))
+        if event is not None:
+            matches.append(event)
 
-    # If it's got either a '(' or ')' in it, it's a subrule,
-    # so it doesn't count.
-    matches = [m for m in matches if "(" not in m and ")" not in m]
+        return ""  # Remove i7 debug tags.
 
+    text = _I7_DEBUG_TAG_REGEX.sub(_extract, text)
     return matches, text
 
 
+def _split_extra_infos(fields: List[Tuple[str, str]],
+                       tracked_infos: List[str]) -> Tuple[Mapping[str, str], List[Tuple[str, str]]]:
+    """ Same as :py:func:`_detect_extra_infos` but for the fields framing the output of git-glulx.
+
+    Returns:
+        The extra information, and the fields left once tracked sections are removed.
+    """
+    matches = dict.fromkeys(tracked_infos)
+    remaining = []
+    section = None
+    section_text = []
+    for kind, text in fields:
+        if section is not None:
+            if kind == SECTION_END:
+                matches[section] = "".join(section_text).strip()
+                section = None
+            elif kind == TEXT:
+                section_text.append(text)  # Debug tags are dropped.
+
+        elif kind == SECTION_START and text.strip()[1:-1] in matches:
+            section = text.strip()[1:-1]
+            section_text = []
+
+        else:
+            remaining.append((kind, text))
+
+    return matches, remaining
+
+
+def _split_i7_events(fields: List[Tuple[str, str]]) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """ Same as :py:func:`_detect_i7_events_debug_tags` but for the fields framing the output of git-glulx.
+
+    Returns:
+        The Inform 7 events, and the fields left once debug tags are removed.
+    """
+    matches = []
+    remaining = []
+    for kind, text in fields:
+        if kind != DEBUG_TAG:
+            remaining.append((kind, text))
+            continue
+
+        event = _i7_event(text)
+        if event is not None:
+            matches.append(event)
+
+    return matches, remaining
+
+
+def _setup(env: textworld.Environment, commands: List[str]) -> bool:
+    """ Have `commands` played each time the game is reset, if the environment supports it.
+
+    Returns:
+        Whether the commands will be played. Otherwise, they need to be sent after each reset.
+    """
+    env = env.unwrapped
+    if not hasattr(env, "setup_commands"):
+        return False
+
+    env.setup_commands += [command for command in commands if command not in env.setup_commands]
+    return True
+
+
 class TWInform7(textworld.core.Wrapper):
     """
     Wrapper to play Inform7 games generated by TextWorld.
@@ -104,6 +186,9 @@ class TWInform7(textworld.core.Wrapper):
     @classmethod
     def compatible(cls, path: str) -> bool:
         """ Check if path point to a TW Inform7 compatible game. """
+        if path.endswith(".json"):
+            return False  # Played without an interpreter, see `TextWorldEnv`.
+
         return os.path.isfile(os.path.splitext(path)[0] + ".json")
 
 
@@ -125,38 +210,58 @@ class Inform7Data(textworld.core.Wrapper):
         self.state["won"] = '*** The End ***' in self.state["feedback"]
         self.state["lost"] = '*** You lost! ***' in self.state["feedback"]
 
+    def _extract_extra_infos(self):
+        if "_fields" in self.state:  # Sections were already delimited by the interpreter.
+            extra_infos, self.state["_fields"] = _split_extra_infos(self.state["_fields"], self._tracked_infos)
+            self.state["feedback"] = "".join(text for _, text in self.state["_fields"])
+        else:
+            extra_infos, self.state["feedback"] = _detect_extra_infos(self.state["feedback"], self._tracked_infos)
+
+        self.state.update(extra_infos)
+
     def step(self, command: str):
         self.prev_state = self.state
         self.state, _, _, = self._wrapped_env.step(command)
-        extra_infos, self.state["feedback"] = _detect_extra_infos(self.state["feedback"], self._tracked_infos)
-        self.state.update(extra_infos)
+        self._extract_extra_infos()
         self._gather_infos()
         self.state["done"] = self.state["won"] or self.state["lost"]
         return self.state, self.state["score"], self.state["done"]
 
+    def save_state(self):
+        return self._wrapped_env.save_state(), (list(self._tracked_infos), self.prev_state)
+
+    def load_state(self, snapshot):
+        snapshot, (tracked_infos, self.prev_state) = snapshot
+        self.state = self._wrapped_env.load_state(snapshot)
+        self._tracked_infos = list(tracked_infos)
+        return self.state
+
     def _send(self, command: str) -> str:
         """ Send a command to the game without affecting the Environment's state. """
         return self.unwrapped._send(command)
 
-    def _track_info(self, info):
-        extra_infos, _ = _detect_extra_infos(self._send('tw-extra-infos {}'.format(info)))
-        self._tracked_infos.append(info)
-        self.state.update(extra_infos)
-
     def reset(self):
         self._tracked_infos = []
-        self.prev_state = None
-        self.state = self._wrapped_env.reset()
-
         if self.infos.inventory:
-            self._track_info("inventory")
+            self._tracked_infos.append("inventory")
 
         if self.infos.description:
-            self._track_info("description")
+            self._tracked_infos.append("description")
 
         # Always track moves and score.
-        self._track_info("moves")
-        self._track_info("score")
+        self._tracked_infos += ["moves", "score"]
+
+        commands = ["tw-extra-infos {}".format(info) for info in self._tracked_infos]
+        setup = _setup(self, commands)
+
+        self.prev_state = None
+        self.state = self._wrapped_env.reset()
+        if setup:
+            self._extract_extra_infos()  # Printed by the setup commands.
+        else:
+            for command in commands:
+                extra_infos, _ = _detect_extra_infos(self._send(command), self._tracked_infos)
+                self.state.update(extra_infos)
 
         self._gather_infos()
         return self.state
@@ -241,11 +346,16 @@ class StateTracking(textworld.core.Wrapper):
         return self.unwrapped._send(command)
 
     def reset(self):
-        self.state = self._wrapped_env.reset()
         if not self.tracking:
+            self.state = self._wrapped_env.reset()
             return self.state  # State tracking not needed.
 
-        self._send('tw-trace-actions')  # Turn on print for Inform7 action events.
+        # Turn on print for Inform7 action events.
+        setup = _setup(self, ["tw-trace-actions"])
+        self.state = self._wrapped_env.reset()
+        if not setup:
+            self._send("tw-trace-actions")
+
         track_quests = (self.infos.intermediate_reward or self.infos.policy_commands)
         self._game_progression = GameProgression(self._game, track_quests=track_quests)
         self._last_action = None
@@ -262,7 +372,11 @@ class StateTracking(textworld.core.Wrapper):
             return self.state, score, done  # State tracking not needed.
 
         # Detect what events just happened in the game.
-        i7_events, self.state["feedback"] = _detect_i7_events_debug_tags(self.state["feedback"])
+        if "_fields" in self.state:  # Debug tags were already delimited by the interpreter.
+            i7_events, self.state["_fields"] = _split_i7_events(self.state["_fields"])
+            self.state["feedback"] = "".join(text for _, text in self.state["_fields"])
+        else:
+            i7_events, self.state["feedback"] = _detect_i7_events_debug_tags(self.state["feedback"])
 
         if str2bool(os.environ.get("TEXTWORLD_DEBUG", False)):
             print("[DEBUG] Detected Inform7 events:\n{}\n".format(i7_events))
@@ -281,6 +395,26 @@ class StateTracking(textworld.core.Wrapper):
         self.state["done"] = self.state["won"] or self.state["lost"]
         return self.state, score, self.state["done"]
 
+    def save_state(self):
+        snapshot = self._wrapped_env.save_state()
+        if not self.tracking:
+            return snapshot, None
+
+        return snapshot, (self._game_progression.copy(), self._last_action, self._previous_winning_policy,
+                          self._current_winning_policy, self._moves)
+
+    def load_state(self, snapshot):
+        snapshot, tracking = snapshot
+        self.state = self._wrapped_env.load_state(snapshot)
+        if tracking is not None:
+            (game_progression, self._last_action, self._previous_winning_policy,
+             self._current_winning_policy, self._moves) = tracking
+            # The snapshot can be loaded again, keep its progression untouched.
+            self._game_progression = game_progression.copy()
+            self.state["_game_progression"] = self._game_progression
+
+        return self.state
+
 
 class GameData(textworld.core.Wrapper):
     """
@@ -318,3 +452,10 @@ class GameData(textworld.core.Wrapper):
         self.state, score, done = self._wrapped_env.step(command)
         self._gather_infos()
         return self.state, score, done
+
+    def save_state(self):
+        return self._wrapped_env.save_state()
+
+    def load_state(self, snapshot):
+        self.state = self._wrapped_env.load_state(snapshot)
+        return self.state
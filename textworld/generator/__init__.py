@@ -5,16 +5,18 @@
 import os
 import json
 import uuid
+import threading
 import numpy as np
 from os.path import join as pjoin
-from typing import Optional, Mapping, Dict, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Mapping, Dict, Tuple, Union
 
 from numpy.random import RandomState
 
 from textworld import g_rng
 from textworld.utils import maybe_mkdir, str2bool
 from textworld.logic import State
-from textworld.generator.chaining import ChainingOptions, QuestGenerationError
+from textworld.generator.chaining import ChainingOptions, ChainingStats, QuestGenerationError
 from textworld.generator.chaining import sample_quest
 from textworld.generator.world import World
 from textworld.generator.game import Game, Quest, Event, GameOptions
@@ -116,7 +118,8 @@ def make_world_with(rooms, rng=None):
     return world
 
 
-def make_quest(world: Union[World, State], options: Optional[GameOptions] = None):
+def make_quest(world: Union[World, State], options: Optional[GameOptions] = None,
+               stats: Optional[ChainingStats] = None):
     state = getattr(world, "state", world)
 
     if options is None:
@@ -129,7 +132,7 @@ def make_quest(world: Union[World, State], options: Optional[GameOptions] = None
 
     chains = []
     for _ in range(options.nb_parallel_quests):
-        chain = sample_quest(state, options.chaining)
+        chain = sample_quest(state, options.chaining, stats)
         chains.append(chain)
         state = chain.initial_state  # State might have changed, i.e. options.create_variable is True.
 
@@ -171,7 +174,7 @@ def make_game_with(world, quests=None, grammar=None):
     return game
 
 
-def make_game(options: GameOptions) -> Game:
+def make_game(options: GameOptions, stats: Optional[ChainingStats] = None) -> Game:
     """
     Make a game (map + objects + quest).
 
@@ -180,6 +183,8 @@ def make_game(options: GameOptions) -> Game:
             For customizing the game generation (see
             :py:class:`textworld.GameOptions <textworld.generator.game.GameOptions>`
             for the list of available options).
+        stats:
+            If provided, the chaining stats of all the quests are added to it.
 
     Returns:
         Generated game.
@@ -197,7 +202,13 @@ def make_game(options: GameOptions) -> Game:
     options.chaining.create_variables = True
     options.chaining.rng = rngs['quest']
     options.chaining.restricted_types = {"r", "d"}
-    quests = make_quest(world, options)
+    game_stats = ChainingStats()
+    quests = make_quest(world, options, game_stats)
+    if stats is not None:
+        stats.update(game_stats)
+
+    if options.chaining.stats_file:
+        game_stats.dump(options.chaining.stats_file, uuid=options.uuid)
 
     # If needed, add distractors objects (i.e. not related to the quest) to reach options.nb_objects.
     nb_objects = sum(1 for e in world.entities if e.type not in {'r', 'd', 'I', 'P'})
@@ -212,22 +223,14 @@ def make_game(options: GameOptions) -> Game:
     return game
 
 
-def compile_game(game: Game, options: Optional[GameOptions] = None):
+def _prepare_compilation(game: Game, options: GameOptions) -> Tuple[str, Optional[str]]:
     """
-    Compile a game.
-
-    Arguments:
-        game: Game object to compile.
-        options:
-            For customizing the game generation (see
-            :py:class:`textworld.GameOptions <textworld.generator.game.GameOptions>`
-            for the list of available options).
+    Save a game alongside its future compiled version and generate its Inform7 source.
 
     Returns:
-        The path to compiled game.
+        The path to the compiled game, and its Inform7 source or `None` if
+        the game is already compiled.
     """
-    options = options or GameOptions()
-
     folder, filename = os.path.split(options.path)
     if not filename:
         filename = game.metadata.get("uuid", str(uuid.uuid4()))
@@ -236,8 +239,6 @@ def compile_game(game: Game, options: Optional[GameOptions] = None):
     if not ext:
         ext = options.file_ext  # Add default extension, if needed.
 
-    source = generate_inform7_source(game)
-
     maybe_mkdir(folder)
     game_json = pjoin(folder, filename + ".json")
     game_file = pjoin(folder, filename + ext)
@@ -250,8 +251,98 @@ def compile_game(game: Game, options: Optional[GameOptions] = None):
                " Please clean already generated games found in '{}'.".format(folder))
         assert already_compiled, msg
 
-    if not already_compiled or options.force_recompile:
-        game.save(game_json)
+    if already_compiled and not options.force_recompile:
+        return game_file, None
+
+    source = generate_inform7_source(game)
+    game.save(game_json)
+    return game_file, source
+
+
+def compile_game(game: Game, options: Optional[GameOptions] = None):
+    """
+    Compile a game.
+
+    Arguments:
+        game: Game object to compile.
+        options:
+            For customizing the game generation (see
+            :py:class:`textworld.GameOptions <textworld.generator.game.GameOptions>`
+            for the list of available options).
+
+    Returns:
+        The path to compiled game.
+    """
+    options = options or GameOptions()
+    game_file, source = _prepare_compilation(game, options)
+    if source is not None:
         compile_inform7_game(source, game_file)
 
     return game_file
+
+
+def _compile_source(source: str, game_file: str) -> str:
+    compile_inform7_game(source, game_file)
+    return game_file
+
+
+class CompilationQueue:
+    """
+    Compile games in the background.
+
+    Submitting a game generates its Inform7 source right away, then `ni` and
+    `inform6` run in a background thread while the caller moves on to the
+    next game. At most `max_workers` compilations run at once, and
+    submitting blocks while as many others are waiting for a worker.
+
+    Example:
+        >>> with CompilationQueue() as queue:
+        ...     futures = [queue.submit(make_game(options), options) for options in all_options]
+        ...     game_files = [future.result() for future in futures]
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        """
+        Args:
+            max_workers: Maximum number of games compiled concurrently.
+                         Default: number of CPUs.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(self.max_workers)
+        self._slots = threading.BoundedSemaphore(2 * self.max_workers)
+
+    def submit(self, game: Game, options: Optional[GameOptions] = None) -> Future:
+        """
+        Compile a game asynchronously.
+
+        Arguments:
+            game: Game object to compile.
+            options:
+                For customizing the game generation (see
+                :py:class:`textworld.GameOptions <textworld.generator.game.GameOptions>`
+                for the list of available options).
+
+        Returns:
+            Future holding the path to the compiled game.
+        """
+        options = options or GameOptions()
+        game_file, source = _prepare_compilation(game, options)
+        if source is None:
+            future = Future()
+            future.set_result(game_file)
+            return future
+
+        self._slots.acquire()
+        future = self._executor.submit(_compile_source, source, game_file)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        """ Stop accepting games and, optionally, wait for the pending ones to be compiled. """
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self) -> "CompilationQueue":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
@@ -3,13 +3,30 @@
 
 
 import copy
+import itertools
+import json
+import multiprocessing as mp
+import pickle
+import queue
+import time
+import traceback
+import warnings
 from collections import Counter
 from functools import total_ordering
-from typing import Iterable, Optional, Sequence
+from typing import Iterable, List, Mapping, Optional, Sequence, Set
+
+import numpy as np
 
 from textworld.generator.data import KnowledgeBase
-from textworld.logic import Action, GameLogic, Proposition, Rule, State, Variable
-from textworld.logic import Placeholder, Signature
+from textworld.logic import Action, GameLogic, Proposition, Rule, RuleNetwork, State, Variable
+from textworld.logic import Placeholder, Predicate, Signature
+
+
+# Seeds drawn for the subtrees explored by the workers fit in a C long on every platform.
+_MAX_SEED = 2**31 - 1
+
+# How often, in seconds, the workers are checked on while waiting for their quests.
+_POLL_INTERVAL = 1
 
 
 class QuestGenerationError(Exception):
@@ -103,6 +120,39 @@ class ChainingOptions:
             A set of types that may not have new variables created.
         allowed_types:
             A set of types that are allowed to have new variables created.
+        stats_file:
+            If provided, `make_game` appends the chaining stats of every game
+            it generates to this file, as one JSON object per line.
+        nb_workers:
+            Number of worker processes used to enumerate the quests.  When
+            higher than 1, the subtrees rooted at each first action are
+            explored in parallel and the quests are streamed back as they are
+            found.  The node and backtrack budgets then apply to each subtree.
+            The options are sent to the workers, so callbacks that can't be
+            pickled (e.g. a lambda as `score`) require the "fork" start method
+            of multiprocessing; otherwise the search falls back to a single
+            process.
+        ordered:
+            When using multiple workers, whether to return the quests in a
+            deterministic order, i.e. subtree by subtree as the sequential
+            search would.  Otherwise, quests are returned as soon as any
+            worker finds them.  In both cases, each subtree gets its own
+            random number generator seeded from options.rng, so seeded runs
+            explore the same quests whatever the number of workers, as long
+            as it is higher than 1.  The sequential search draws from
+            options.rng directly and explores the quests in another order.
+        max_nodes:
+            If provided, the maximum number of nodes expanded by the search.
+        max_backtracks:
+            If provided, the maximum number of dead ends (nodes without any
+            possible action that don't form a valid quest) the search may
+            back out of.
+        max_time:
+            If provided, a wall-clock budget for the search, in seconds.
+        score:
+            If provided, a function scoring a chain (higher is better).
+            `sample_quest` then keeps searching until the space or the budget
+            is exhausted, and returns the best chain found so far.
     """
 
     def __init__(self):
@@ -121,6 +171,13 @@ class ChainingOptions:
         self.rules_per_depth = []
         self.restricted_types = frozenset()
         self.allowed_types = None
+        self.stats_file = None
+        self.nb_workers = 1
+        self.ordered = True
+        self.max_nodes = None
+        self.max_backtracks = None
+        self.max_time = None
+        self.score = None
 
     @property
     def logic(self) -> GameLogic:
@@ -198,6 +255,108 @@ class ChainingOptions:
         return "\n".join(infos)
 
 
+class ChainingStats:
+    """
+    Counters and timers collected while chaining, to understand where the
+    time goes when generating quests.
+
+    Attributes:
+        nodes_expanded: Number of nodes expanded by the search.
+        assignments: Number of rule assignments considered.
+        instantiation_failures: Number of assignments that couldn't be
+            instantiated, e.g. because no new variable could be created.
+        action_rejections: Number of actions rejected by
+            `ChainingOptions.check_action` or by the navigation heuristics.
+        constraint_violations: Number of actions leading to a state violating
+            the constraints.
+        cycles: Number of actions leading back to an earlier state.
+        dead_ends: Number of nodes without any possible action that don't
+            form a valid quest.
+        chains: Number of chains (quests) produced.
+        timings: Time spent in each phase of chaining, in seconds.  The
+            `search` phase covers all the others.
+    """
+
+    COUNTERS = ("nodes_expanded", "assignments", "instantiation_failures", "action_rejections",
+                "constraint_violations", "cycles", "dead_ends", "chains")
+    PHASES = ("search", "assignments", "instantiation", "check_action", "constraints", "cycles", "make_chain")
+
+    def __init__(self):
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+
+        self.timings = {phase: 0. for phase in self.PHASES}
+
+    def update(self, other: "ChainingStats") -> None:
+        """ Add the counters and timers of another stats object to these. """
+        for counter in self.COUNTERS:
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+
+        for phase, seconds in other.timings.items():
+            self.timings[phase] = self.timings.get(phase, 0.) + seconds
+
+    def serialize(self) -> Mapping:
+        data = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        data["timings"] = dict(self.timings)
+        return data
+
+    @classmethod
+    def deserialize(cls, data: Mapping) -> "ChainingStats":
+        stats = cls()
+        for counter in cls.COUNTERS:
+            setattr(stats, counter, data.get(counter, 0))
+
+        stats.timings.update(data.get("timings", {}))
+        return stats
+
+    def dump(self, path: str, **extras) -> None:
+        """
+        Append these stats to a file, as a single line of JSON.
+
+        Args:
+            path: File where to append the stats.
+            extras: Additional fields to record alongside the stats.
+        """
+        data = dict(extras)
+        data.update(self.serialize())
+        with open(path, "a") as f:
+            f.write(json.dumps(data) + "\n")
+
+    def __str__(self) -> str:
+        infos = ["{}: {}".format(counter, getattr(self, counter)) for counter in self.COUNTERS]
+        infos += ["time in {}: {:.3f}s".format(phase, seconds) for phase, seconds in self.timings.items()]
+        return "\n".join(infos)
+
+
+class _Budget:
+    """
+    Keeps track of the resources used by a search.
+    """
+
+    def __init__(self, options: ChainingOptions):
+        self.max_nodes = options.max_nodes
+        self.max_backtracks = options.max_backtracks
+        self.deadline = None
+        if options.max_time is not None:
+            self.deadline = time.time() + options.max_time
+
+        self.nb_nodes = 0
+        self.nb_backtracks = 0
+
+    @property
+    def remaining_time(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+
+        return max(self.deadline - time.time(), 0)
+
+    @property
+    def exhausted(self) -> bool:
+        return ((self.max_nodes is not None and self.nb_nodes >= self.max_nodes)
+                or (self.max_backtracks is not None and self.nb_backtracks > self.max_backtracks)
+                or (self.deadline is not None and time.time() >= self.deadline))
+
+
 @total_ordering
 class _PartialAction:
     """
@@ -247,9 +406,11 @@ class _Chainer:
     Helper class for the chaining implementation.
     """
 
-    def __init__(self, state, options):
+    def __init__(self, state, options, lazy=False, stats=None):
         self.state = state
         self.options = options
+        self.lazy = lazy
+        self.stats = ChainingStats() if stats is None else stats
         self.backward = options.backward
         self.max_depth = options.max_depth
         self.max_length = options.max_length
@@ -258,8 +419,14 @@ class _Chainer:
         self.fixed_mapping = options.fixed_mapping
         self.rng = options.rng
         self.constraints = options.logic.constraints.values()
+        self.budget = _Budget(options)
         self._local_mapping_cache = {}
 
+        # Only the constraints that fail() need to be checked.
+        fail = Predicate("fail", [])
+        self._violations = RuleNetwork(options.logic, [c for c in self.constraints if fail in c.postconditions])
+        self._root_valid = None
+
     def root(self) -> _Node:
         """Create the root node for chaining."""
         return _Node(None, None, self.state, None, [], set(), 1)
@@ -274,20 +441,9 @@ class _Chainer:
 
         rules = self.options.get_rules(node.depth)
 
-        assignments = self.all_assignments(node, rules)
-        if self.rng:
-            self.rng.shuffle(assignments)
-
         used = set()
-        for partial in assignments:
-            action = self.try_instantiate(node.state, partial)
-            if not action:
-                continue
-
-            if not self.check_action(node, node.state, action):
-                continue
-
-            state = self.apply(node, action)
+        for partial in self._timed_assignments(node, rules):
+            action, state = self._expand(node, node, partial)
             if not state:
                 continue
 
@@ -314,28 +470,51 @@ class _Chainer:
         for sibling in parents:
             parent = sibling.dep_parent
             rules = self.options.get_rules(parent.depth)
-            assignments = self.all_assignments(node, rules)
-            if self.rng:
-                self.rng.shuffle(assignments)
-
-            for partial in assignments:
-                action = self.try_instantiate(node.state, partial)
-                if not action:
-                    continue
-
-                if action in sibling.used:
-                    continue
-
-                if not self.check_action(parent, node.state, action):
-                    continue
-
-                state = self.apply(node, action)
+            for partial in self._timed_assignments(node, rules):
+                action, state = self._expand(node, parent, partial, sibling.used)
                 if not state:
                     continue
 
                 used = sibling.used | {action}
                 yield _Node(node, parent, state, action, rules, used, node.breadth + 1)
 
+    def _timed_assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
+        stats = self.stats
+        start = time.perf_counter()
+        for partial in self.assignments(node, rules):
+            stats.timings["assignments"] += time.perf_counter() - start
+            stats.assignments += 1
+            yield partial
+            start = time.perf_counter()
+
+        stats.timings["assignments"] += time.perf_counter() - start
+
+    def _expand(self, node: _Node, parent: _Node, partial: _PartialAction, excluded=()):
+        """
+        Try to instantiate and apply a partial action, keeping track of why it
+        might get rejected.
+        """
+
+        stats = self.stats
+        start = time.perf_counter()
+        action = self.try_instantiate(node.state, partial)
+        stats.timings["instantiation"] += time.perf_counter() - start
+        if not action:
+            stats.instantiation_failures += 1
+            return None, None
+
+        if action in excluded:
+            return action, None
+
+        start = time.perf_counter()
+        allowed = self.check_action(parent, node.state, action)
+        stats.timings["check_action"] += time.perf_counter() - start
+        if not allowed:
+            stats.action_rejections += 1
+            return action, None
+
+        return action, self.apply(node, action)
+
     def get_fixed_mapping(self, rule: Rule, at_p_r: Optional[Proposition]):
         if at_p_r is None:
             return self.fixed_mapping
@@ -355,13 +534,7 @@ class _Chainer:
         fixed_mapping[self._local_mapping_cache[rule]] = at_p_r.arguments[-1]
         return fixed_mapping
 
-    def all_assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
-        """
-        Compute all possible assignments for instantiating the given rules.
-        """
-
-        state = node.state
-
+    def _assignment_context(self, state: State):
         at_p_r = None
         r = Placeholder("r", "r")
         if r not in self.fixed_mapping:
@@ -377,10 +550,18 @@ class _Chainer:
             count = len(state.variables_of_type(ph.type))
             return self.options.check_new_variable(state, ph.type, count)
 
+        return at_p_r, allow_partial
+
+    def all_assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
+        """
+        Compute all possible assignments for instantiating the given rules.
+        """
+
+        state = node.state
+        at_p_r, allow_partial = self._assignment_context(state)
+
         assignments = []
         for rule in rules:
-            fixed_mapping = self.fixed_mapping.copy()
-
             if self.backward:
                 rule = rule.inverse()
 
@@ -391,6 +572,51 @@ class _Chainer:
         # Keep everything in a deterministic order
         return sorted(assignments)
 
+    def sample_assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
+        """
+        Lazily draw random assignments for instantiating the given rules.
+
+        A rule is picked at random first, then a random assignment for it,
+        until every assignment has been drawn.  Unlike `all_assignments`, the
+        cost of drawing an assignment doesn't depend on the total number of
+        possible assignments.
+        """
+
+        state = node.state
+        at_p_r, allow_partial = self._assignment_context(state)
+
+        rules = [rule.inverse() if self.backward else rule for rule in rules]
+        rules = sorted(rules, key=lambda rule: rule.name)
+        assignments = [None] * len(rules)
+        remaining = list(range(len(rules)))
+        while remaining:
+            i = remaining[self.rng.randint(len(remaining))]
+            rule = rules[i]
+            if assignments[i] is None:
+                fixed_mapping = self.get_fixed_mapping(rule, at_p_r)
+                assignments[i] = state.all_assignments(rule, fixed_mapping, self.create_variables, allow_partial,
+                                                       rng=self.rng)
+
+            mapping = next(assignments[i], None)
+            if mapping is None:
+                remaining.remove(i)
+            else:
+                yield _PartialAction(node, rule, mapping)
+
+    def assignments(self, node: _Node, rules: Iterable[Rule]) -> Iterable[_PartialAction]:
+        """
+        The assignments to try, in order, for instantiating the given rules.
+        """
+
+        if self.lazy and self.rng:
+            return self.sample_assignments(node, rules)
+
+        assignments = self.all_assignments(node, rules)
+        if self.rng:
+            self.rng.shuffle(assignments)
+
+        return assignments
+
     def try_instantiate(self, state: State, partial: _PartialAction) -> Optional[Action]:
         """
         Try to instantiate a partial action, by creating new variables if
@@ -464,46 +690,72 @@ class _Chainer:
     def apply(self, node: _Node, action: Action) -> Optional[State]:
         """Attempt to apply an action to the given state."""
 
+        if node.parent is None:
+            # Only the root state hasn't been checked yet.
+            if self._root_valid is None:
+                self._root_valid = self.check_state(node.state)
+            if not self._root_valid:
+                return None
+
+        # Since node.state respects the constraints, any violation has to involve one of the new facts.
         new_state = node.state.copy()
-        for prop in action.preconditions:
-            new_state.add_fact(prop)
+        new_facts = [prop for prop in action.preconditions if not new_state.is_fact(prop)]
+        new_state.add_facts(new_facts)
 
         # Make sure new_state still respects the constraints
-        if not self.check_state(new_state):
+        if not self.check_state(new_state, new_facts):
             return None
 
+        new_facts = [prop for prop in action.added if not new_state.is_fact(prop)]
         new_state.apply(action)
 
-        if not self.check_state(new_state):
+        if not self.check_state(new_state, new_facts):
             return None
 
-        # Detect cycles
-        state = new_state.copy()
-        state.apply(action.inverse())
-        while node.action:
-            state.apply(node.action.inverse())
-            if new_state == state:
-                return None
-            node = node.parent
+        # Detect cycles.  The Zobrist hashes are compared first, so the states
+        # only get compared in full on a hash match.
+        start = time.perf_counter()
+        try:
+            new_hash = new_state.zobrist_hash
+            state = new_state.copy()
+            state.apply(action.inverse())
+            while node.action:
+                state.apply(node.action.inverse())
+                if state.zobrist_hash == new_hash and new_state == state:
+                    self.stats.cycles += 1
+                    return None
+                node = node.parent
+        finally:
+            self.stats.timings["cycles"] += time.perf_counter() - start
 
         return new_state
 
-    def check_state(self, state: State) -> bool:
-        """Check that a state satisfies the constraints."""
+    def check_state(self, state: State, facts: Optional[Iterable[Proposition]] = None) -> bool:
+        """
+        Check that a state satisfies the constraints.
+
+        If some facts are given, only the violations involving them are
+        looked for, assuming the rest of the state is already known to be
+        valid.
+        """
 
-        fail = Proposition("fail", [])
+        if facts is None:
+            facts = state.facts
 
-        constraints = state.all_applicable_actions(self.constraints)
-        for constraint in constraints:
-            copy = state.apply_on_copy(constraint)
-            if copy and copy.is_fact(fail):
+        start = time.perf_counter()
+        try:
+            for _ in self._violations.matches(state, facts):
+                self.stats.constraint_violations += 1
                 return False
 
-        return True
+            return True
+        finally:
+            self.stats.timings["constraints"] += time.perf_counter() - start
 
     def make_chain(self, node):
         """Create an entire Chain object from a node."""
 
+        start = time.perf_counter()
         nodes = []
         parent = node
         while parent.action:
@@ -531,10 +783,240 @@ class _Chainer:
                 state.apply(node.action.inverse())
             chain = chain[::-1]
 
+        self.stats.chains += 1
+        self.stats.timings["make_chain"] += time.perf_counter() - start
         return Chain(state, chain)
 
 
-def get_chains(state: State, options: ChainingOptions) -> Iterable[Chain]:
+def _search(chainer: _Chainer, stack: List[_Node]) -> Iterable[Chain]:
+    """
+    Depth-first search for quests from the given nodes.
+    """
+
+    options = chainer.options
+    budget = chainer.budget
+    stats = chainer.stats
+    start = time.perf_counter()
+    while stack and not budget.exhausted:
+        node = stack.pop()
+        budget.nb_nodes += 1
+        stats.nodes_expanded += 1
+
+        no_children = True
+        for child in chainer.chain(node):
+            stack.append(child)
+            no_children = False
+
+        if no_children or options.subquests:
+            for child in chainer.backtrack(node):
+                stack.append(child)
+
+            if _is_complete(node, options):
+                chain = chainer.make_chain(node)
+                stats.timings["search"] += time.perf_counter() - start
+                yield chain
+                start = time.perf_counter()
+            elif no_children:
+                budget.nb_backtracks += 1
+                stats.dead_ends += 1
+
+    stats.timings["search"] += time.perf_counter() - start
+
+
+def _sample(chainer: _Chainer) -> Iterable[Chain]:
+    """
+    Depth-first search for quests, only drawing the children of a node as needed.
+    """
+
+    options = chainer.options
+    budget = chainer.budget
+    stats = chainer.stats
+    start = time.perf_counter()
+    stack = [iter([chainer.root()])]
+    while stack and not budget.exhausted:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+
+        budget.nb_nodes += 1
+        stats.nodes_expanded += 1
+        children = chainer.chain(node)
+        child = next(children, None)
+        if child is not None:
+            stack.append(itertools.chain([child], children))
+
+        if child is None or options.subquests:
+            stack.append(chainer.backtrack(node))
+
+            if _is_complete(node, options):
+                chain = chainer.make_chain(node)
+                stats.timings["search"] += time.perf_counter() - start
+                yield chain
+                start = time.perf_counter()
+            elif child is None:
+                budget.nb_backtracks += 1
+                stats.dead_ends += 1
+
+    stats.timings["search"] += time.perf_counter() - start
+
+
+def _is_complete(node: _Node, options: ChainingOptions) -> bool:
+    return (node.length >= options.min_length
+            and node.depth >= options.min_depth
+            and node.breadth >= options.min_breadth)
+
+
+def _serialize_chain(chain: Chain, root_facts: Set[Proposition]) -> Mapping:
+    # The initial state is sent as a difference with the root state, which is usually much smaller.
+    facts = set(chain.initial_state.facts)
+    parents = {id(node): i for i, node in enumerate(chain.nodes)}
+    return {
+        "added": [prop.serialize() for prop in facts - root_facts],
+        "removed": [prop.serialize() for prop in root_facts - facts],
+        "nodes": [(node.action.serialize(), node.depth, node.breadth, parents.get(id(node.parent)))
+                  for node in chain.nodes],
+    }
+
+
+def _deserialize_chain(data: Mapping, root_state: State) -> Chain:
+    state = root_state.copy()
+    for prop in data["removed"]:
+        state.remove_fact(Proposition.deserialize(prop))
+    state.add_facts(Proposition.deserialize(prop) for prop in data["added"])
+
+    nodes = [ChainNode(Action.deserialize(action), depth, breadth, None)
+             for action, depth, breadth, _ in data["nodes"]]
+    for node, (_, _, _, parent) in zip(nodes, data["nodes"]):
+        if parent is not None:
+            node.parent = nodes[parent]
+
+    return Chain(state, nodes)
+
+
+def _chaining_worker(facts, options, tasks, results):
+    """
+    Explore the subtrees rooted at the first actions received through `tasks`,
+    sending back the quests found through `results`.
+    """
+
+    chainer = _Chainer(State(options.logic, [Proposition.deserialize(prop) for prop in facts]), options)
+    root = chainer.root()
+    root_facts = set(root.state.facts)
+    rules = options.get_rules(root.depth)
+
+    deadline = chainer.budget.deadline
+    for index, action, used, seed in iter(tasks.get, None):
+        try:
+            # Each subtree gets its own budget, but they share the deadline.
+            chainer.budget = _Budget(options)
+            chainer.budget.deadline = deadline
+            chainer.stats = ChainingStats()
+
+            if seed is not None:
+                chainer.rng = np.random.RandomState(seed)
+
+            action = Action.deserialize(action)
+            used = {Action.deserialize(a) for a in used}
+            node = _Node(root, root, chainer.apply(root, action), action, rules, used, root.breadth)
+            for chain in _search(chainer, [node]):
+                results.put((index, "chain", _serialize_chain(chain, root_facts)))
+
+            results.put((index, "done", chainer.stats.serialize()))
+        except Exception:
+            results.put((index, "error", traceback.format_exc()))
+
+
+def _get_chains_parallel(chainer: _Chainer) -> Iterable[Chain]:
+    """
+    Explore the subtrees rooted at each first action in worker processes.
+    """
+
+    options = chainer.options
+    root = chainer.root()
+
+    # Enumerate the first actions like the sequential search would, which then
+    # explores them from last to first.
+    children = list(chainer.chain(root))[::-1]
+    if not children and _is_complete(root, options):
+        yield chainer.make_chain(root)
+        return
+
+    tasks = mp.Queue()
+    results = mp.Queue()
+    for index, child in enumerate(children):
+        seed = options.rng.randint(_MAX_SEED) if options.rng else None
+        used = [action.serialize() for action in child.used]
+        tasks.put((index, child.action.serialize(), used, seed))
+
+    nb_workers = min(options.nb_workers, len(children))
+    facts = [prop.serialize() for prop in chainer.state.facts]
+    workers = []
+    for _ in range(nb_workers):
+        tasks.put(None)
+        worker = mp.Process(target=_chaining_worker, args=(facts, options, tasks, results))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    try:
+        if _is_complete(root, options):
+            yield chainer.make_chain(root)
+
+        # In ordered mode, the quests found in subtrees after the current one are held back.
+        pending = [[] for _ in children]
+        done = [False] * len(children)
+        current = 0
+        while not all(done):
+            timeout = _POLL_INTERVAL
+            if chainer.budget.remaining_time is not None:
+                timeout = min(timeout, chainer.budget.remaining_time)
+
+            try:
+                index, kind, data = results.get(timeout=timeout)
+            except queue.Empty:
+                if chainer.budget.remaining_time == 0:
+                    break  # Out of time.
+
+                # A worker killed without reporting back would leave its subtrees unfinished forever.
+                died = any(worker.exitcode not in (None, 0) for worker in workers)
+                if died or not any(worker.is_alive() for worker in workers):
+                    codes = [worker.exitcode for worker in workers]
+                    raise RuntimeError("Chaining worker died unexpectedly (exit codes: {}).".format(codes))
+
+                continue
+
+            if kind == "error":
+                raise RuntimeError("Chaining worker failed:\n" + data)
+            elif kind == "chain":
+                chain = _deserialize_chain(data, chainer.state)
+                if options.ordered and index != current:
+                    pending[index].append(chain)
+                else:
+                    yield chain
+            else:
+                done[index] = True
+                chainer.stats.update(ChainingStats.deserialize(data))
+                # Move on to the next unfinished subtree, releasing the quests it already found.
+                while current < len(children) and done[current]:
+                    current += 1
+                    if current < len(children):
+                        yield from pending[current]
+                        pending[current] = []
+    finally:
+        # The quests may not all have been consumed: don't wait at exit for the
+        # tasks and results still buffered in the queues to be flushed.
+        for q in (tasks, results):
+            q.cancel_join_thread()
+            q.close()
+
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+def get_chains(state: State, options: ChainingOptions,
+               stats: Optional[ChainingStats] = None) -> Iterable[Chain]:
     """
     Generates chains of actions (quests) starting from or ending at the given
     state.
@@ -543,34 +1025,45 @@ def get_chains(state: State, options: ChainingOptions) -> Iterable[Chain]:
         state:
             The initial state for chaining.
         options:
-            Options to configure chaining behaviour.
+            Options to configure chaining behaviour.  Set options.nb_workers
+            to explore the quests in parallel.
+        stats:
+            If provided, the counters and timers of the search are added to it.
 
     Returns:
         All possible quests according to the constraints.
     """
 
-    chainer = _Chainer(state, options)
+    yield from _get_chains(_Chainer(state, options, stats=stats))
 
-    stack = [chainer.root()]
-    while stack:
-        node = stack.pop()
 
-        no_children = True
-        for child in chainer.chain(node):
-            stack.append(child)
-            no_children = False
+def _use_workers(options: ChainingOptions) -> bool:
+    """ Whether the search can be spread over several worker processes. """
+    if options.nb_workers <= 1:
+        return False
+
+    if mp.get_start_method() == "fork":
+        return True  # The workers inherit the options.
+
+    try:
+        pickle.dumps(options)
+    except Exception as e:
+        msg = "Cannot send the chaining options to the workers, searching in a single process: {}"
+        warnings.warn(msg.format(e))
+        return False
+
+    return True
 
-        if no_children or options.subquests:
-            for child in chainer.backtrack(node):
-                stack.append(child)
 
-            if ((node.length >= options.min_length
-                 and node.depth >= options.min_depth
-                 and node.breadth >= options.min_breadth)):
-                yield chainer.make_chain(node)
+def _get_chains(chainer: _Chainer) -> Iterable[Chain]:
+    if _use_workers(chainer.options):
+        yield from _get_chains_parallel(chainer)
+    else:
+        yield from _search(chainer, [chainer.root()])
 
 
-def sample_quest(state: State, options: ChainingOptions) -> Optional[Chain]:
+def sample_quest(state: State, options: ChainingOptions,
+                 stats: Optional[ChainingStats] = None) -> Optional[Chain]:
     """
     Samples a single chain of actions (a quest) starting from or ending at the
     given state.
@@ -580,17 +1073,43 @@ def sample_quest(state: State, options: ChainingOptions) -> Optional[Chain]:
             The initial state for chaining.
         options:
             Options to configure chaining behaviour.  Set options.rng to sample
-            a random quest.
+            a random quest, in which case the actions are drawn lazily at
+            random instead of enumerating every possible action at each step,
+            unless options.nb_workers asks for the subtrees to be explored in
+            parallel.
+        stats:
+            If provided, the counters and timers of the search are added to it.
 
     Returns:
-        A single possible quest.
+        A single possible quest, or the best one found within the search
+        budget if options.score is set.
 
     Raises:
         QuestGenerationError: No quest could be generated given the provided chaining options.
     """
 
-    for chain in get_chains(state, options):
-        return chain
+    if options.rng and not _use_workers(options):
+        chainer = _Chainer(state, options, lazy=True, stats=stats)
+        chains = _sample(chainer)
+    else:
+        chainer = _Chainer(state, options, stats=stats)
+        chains = _get_chains(chainer)
+
+    best, best_score = None, None
+    for chain in chains:
+        if options.score is None:
+            return chain
+
+        score = options.score(chain)
+        if best is None or score > best_score:
+            best, best_score = chain, score
+
+    if best is not None:
+        return best
+
+    if chainer.budget.exhausted:
+        msg = "No quest was found within the search budget:\n\n{}\n".format(options)
+    else:
+        msg = "No quest can be generated with the provided options:\n\n{}\n".format(options)
 
-    msg = ("No quest can be generated with the provided options:\n\n{}\n".format(options))
     raise QuestGenerationError(msg)
@@ -0,0 +1,262 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import tempfile
+from os.path import join as pjoin
+from typing import TYPE_CHECKING, Mapping, Optional, Tuple
+
+from textworld.generator.data import KnowledgeBase
+
+if TYPE_CHECKING:
+    from textworld.generator.game import Game  # Imported lazily, `game` imports this module.
+
+
+#: Default folder of the local knowledge base registry. Set `TEXTWORLD_KB_REGISTRY` to change it.
+DEFAULT_REGISTRY_PATH = pjoin(os.path.expanduser("~"), ".cache", "textworld", "kb")
+
+#: Magic bytes identifying games saved in the compact format.
+COMPACT_MAGIC = b"TWGC"
+
+#: Version of the compact format, stored right after the magic bytes.
+COMPACT_VERSION = 1
+
+
+class UnknownKnowledgeBaseError(LookupError):
+    def __init__(self, key, path):
+        msg = ("Cannot find knowledge base '{}' in the registry '{}'. Compact games only reference their knowledge base:"
+               " convert the game back to JSON (see `tw-convert`) on a machine where it is registered.")
+        super().__init__(msg.format(key, path))
+
+
+class KnowledgeBaseRegistry:
+    """
+    Local registry of knowledge bases, addressed by the hash of their content.
+
+    Compact games only store the key of their knowledge base. Knowledge bases
+    are parsed at most once per process, then shared by all games using them.
+    """
+
+    _loaded = {}
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path: Folder where to store the knowledge bases.
+        """
+        self.path = path
+
+    @staticmethod
+    def key(kb: KnowledgeBase) -> str:
+        """ Identify a knowledge base by its content. """
+        data = json.dumps(kb.serialize(), sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def register(self, kb: KnowledgeBase) -> str:
+        """ Add a knowledge base to the registry, if needed.
+
+        Returns:
+            The key referencing that knowledge base.
+        """
+        key = self.key(kb)
+        self._loaded.setdefault(key, kb)
+
+        entry = pjoin(self.path, key + ".json")
+        if not os.path.isfile(entry):
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.path)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(kb.serialize(), f)
+
+                os.replace(tmp, entry)  # Atomic, readers never see partial entries.
+            except BaseException:
+                os.remove(tmp)
+                raise
+
+        return key
+
+    def get(self, key: str) -> KnowledgeBase:
+        """ Get the knowledge base referenced by `key`. """
+        kb = self._loaded.get(key)
+        if kb is None:
+            default = KnowledgeBase.default()
+            if key == self.key(default):
+                kb = default
+            else:
+                try:
+                    with open(pjoin(self.path, key + ".json")) as f:
+                        kb = KnowledgeBase.deserialize(json.load(f))
+                except FileNotFoundError:
+                    raise UnknownKnowledgeBaseError(key, self.path)
+
+            self._loaded[key] = kb
+
+        return kb
+
+
+def get_kb_registry() -> KnowledgeBaseRegistry:
+    """ Get the knowledge base registry, as configured by the environment. """
+    return KnowledgeBaseRegistry(os.environ.get("TEXTWORLD_KB_REGISTRY", DEFAULT_REGISTRY_PATH))
+
+
+class _Table:
+    """ Interns hashable items to their index in a table. """
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self._indices = {item: i for i, item in enumerate(self.items)}
+
+    def __call__(self, item) -> int:
+        index = self._indices.get(item)
+        if index is None:
+            index = self._indices[item] = len(self.items)
+            self.items.append(item)
+
+        return index
+
+
+def _encode(data: Mapping, kb_key: str) -> Mapping:
+    """ Convert a serialized game to its compact form. """
+    variables, predicates = _Table(), _Table()
+
+    def _prop(prop):
+        return [predicates(prop["name"])] + [variables((var["name"], var["type"])) for var in prop["arguments"]]
+
+    def _action(action):
+        return [action["name"],
+                [_prop(prop) for prop in action["preconditions"]],
+                [_prop(prop) for prop in action["postconditions"]],
+                action.get("command_template"),
+                action.get("reverse_name"),
+                action.get("reverse_command_template")]
+
+    def _event(event):
+        return [event["commands"], [_action(action) for action in event["actions"]], _action(event["condition"])]
+
+    def _quest(quest):
+        return [quest["desc"], quest["reward"], quest["commands"],
+                [_event(event) for event in quest["win_events"]],
+                [_event(event) for event in quest["fail_events"]]]
+
+    slots = sorted({slot for _, info in data["infos"] for slot in info})
+    compact = {
+        "kb": kb_key,
+        "world": [_prop(prop) for prop in data["world"]],
+        "quests": [_quest(quest) for quest in data["quests"]],
+        "info_slots": slots,
+        "infos": [[k] + [info.get(slot) for slot in slots] for k, info in data["infos"]],
+        "grammar": data["grammar"],
+        "metadata": data["metadata"],
+        "objective": data["objective"],
+        "version": data["version"],
+    }
+    compact["variables"] = [list(var) for var in variables.items]
+    compact["predicates"] = predicates.items
+    return compact
+
+
+def _decode(compact: Mapping) -> Tuple[Mapping, str]:
+    """ Convert a compact game back to its serialized form, also returning the key of its knowledge base. """
+    variables = [{"name": name, "type": type} for name, type in compact["variables"]]
+    predicates = compact["predicates"]
+
+    def _prop(prop):
+        return {"name": predicates[prop[0]], "arguments": [variables[i] for i in prop[1:]]}
+
+    def _action(action):
+        name, pre, post, template, reverse_name, reverse_template = action
+        return {"name": name,
+                "preconditions": [_prop(prop) for prop in pre],
+                "postconditions": [_prop(prop) for prop in post],
+                "command_template": template,
+                "reverse_name": reverse_name,
+                "reverse_command_template": reverse_template}
+
+    def _event(event):
+        commands, actions, condition = event
+        return {"commands": commands, "actions": [_action(action) for action in actions],
+                "condition": _action(condition)}
+
+    def _quest(quest):
+        desc, reward, commands, win_events, fail_events = quest
+        return {"desc": desc, "reward": reward, "commands": commands,
+                "win_events": [_event(event) for event in win_events],
+                "fail_events": [_event(event) for event in fail_events]}
+
+    slots = compact["info_slots"]
+    data = {
+        "version": compact["version"],
+        "world": [_prop(prop) for prop in compact["world"]],
+        "grammar": compact["grammar"],
+        "quests": [_quest(quest) for quest in compact["quests"]],
+        "infos": [(info[0], dict(zip(slots, info[1:]))) for info in compact["infos"]],
+        "metadata": compact["metadata"],
+        "objective": compact["objective"],
+    }
+    return data, compact["kb"]
+
+
+def is_compact(filename: str) -> bool:
+    """ Check whether a file contains a game saved in the compact format. """
+    with open(filename, "rb") as f:
+        return f.read(len(COMPACT_MAGIC)) == COMPACT_MAGIC
+
+
+def dumps_compact(game: "Game", registry: Optional[KnowledgeBaseRegistry] = None) -> bytes:
+    """ Serialize a game to the compact format.
+
+    The knowledge base of the game is added to the registry and only its key
+    is stored. Facts refer to tables of interned variables and predicates,
+    and the whole payload is compressed.
+
+    Args:
+        game: The game to serialize.
+        registry: Registry where to add the game's knowledge base.
+                  Default: the one given by :py:func:`get_kb_registry`.
+    """
+    registry = registry or get_kb_registry()
+    compact = _encode(game.serialize(), registry.register(game.kb))
+    payload = zlib.compress(json.dumps(compact, separators=(",", ":")).encode())
+    return COMPACT_MAGIC + struct.pack(">B", COMPACT_VERSION) + payload
+
+
+def loads_compact(data: bytes, registry: Optional[KnowledgeBaseRegistry] = None) -> "Game":
+    """ Deserialize a game saved in the compact format.
+
+    Args:
+        data: Content of a compact game file.
+        registry: Registry where to find the game's knowledge base.
+                  Default: the one given by :py:func:`get_kb_registry`.
+    """
+    from textworld.generator.game import Game
+
+    if not data.startswith(COMPACT_MAGIC):
+        raise ValueError("Not a compact TextWorld game.")
+
+    version, = struct.unpack_from(">B", data, len(COMPACT_MAGIC))
+    if version != COMPACT_VERSION:
+        msg = "Cannot load a compact TextWorld game of version {}, expected version {}"
+        raise ValueError(msg.format(version, COMPACT_VERSION))
+
+    registry = registry or get_kb_registry()
+    payload = zlib.decompress(data[len(COMPACT_MAGIC) + 1:])
+    data, kb_key = _decode(json.loads(payload.decode()))
+    return Game.deserialize(data, kb=registry.get(kb_key))
+
+
+def save_compact(game: "Game", filename: str, registry: Optional[KnowledgeBaseRegistry] = None) -> None:
+    """ Save a game to a file, in the compact format (see :py:func:`dumps_compact`). """
+    with open(filename, "wb") as f:
+        f.write(dumps_compact(game, registry))
+
+
+def load_compact(filename: str, registry: Optional[KnowledgeBaseRegistry] = None) -> "Game":
+    """ Load a game saved in the compact format (see :py:func:`loads_compact`). """
+    with open(filename, "rb") as f:
+        return loads_compact(f.read(), registry)
@@ -16,7 +16,7 @@ from textworld.utils import encode_seeds
 from textworld.generator.data import KnowledgeBase
 from textworld.generator.text_grammar import Grammar, GrammarOptions
 from textworld.generator.world import World
-from textworld.logic import Action, Proposition, State
+from textworld.logic import Action, Proposition, RuleNetwork, State
 from textworld.generator.graph_networks import DIRECTIONS
 
 from textworld.generator.chaining import ChainingOptions
@@ -441,24 +441,40 @@ class Game:
                 self.metadata["walkthrough"] = commands
                 self.objective = describe_event(Event(policy), self, self.grammar)
 
-    def save(self, filename: str) -> None:
-        """ Saves the serialized data of this game to a file. """
+    def save(self, filename: str, compact: bool = False) -> None:
+        """ Saves the serialized data of this game to a file.
+
+        Args:
+            filename: Where to save the game.
+            compact: Use the compact format instead of JSON (see
+                     :py:mod:`textworld.generator.compact`).
+        """
+        if compact:
+            from textworld.generator.compact import save_compact
+            save_compact(self, filename)
+            return
+
         with open(filename, 'w') as f:
             json.dump(self.serialize(), f)
 
     @classmethod
     def load(cls, filename: str) -> "Game":
-        """ Creates `Game` from serialized data saved in a file. """
+        """ Creates `Game` from serialized data saved in a file (JSON or compact format). """
+        from textworld.generator.compact import is_compact, load_compact
+        if is_compact(filename):
+            return load_compact(filename)
+
         with open(filename, 'r') as f:
             return cls.deserialize(json.load(f))
 
     @classmethod
-    def deserialize(cls, data: Mapping) -> "Game":
+    def deserialize(cls, data: Mapping, kb: Optional[KnowledgeBase] = None) -> "Game":
         """ Creates a `Game` from serialized data.
 
         Args:
             data: Serialized data with the needed information to build a
                   `Game` object.
+            kb: Knowledge base of the game. Default: the one found in `data`.
         """
 
         version = data.get("version", cls._SERIAL_VERSION)
@@ -466,7 +482,9 @@ class Game:
             msg = "Cannot deserialize a TextWorld version {} game, expected version {}"
             raise ValueError(msg.format(version, cls._SERIAL_VERSION))
 
-        kb = KnowledgeBase.deserialize(data["KB"])
+        if kb is None:
+            kb = KnowledgeBase.deserialize(data["KB"])
+
         world = World.deserialize(data["world"], kb=kb)
         game = cls(world)
         game.grammar_options = GrammarOptions(data["grammar"])
@@ -737,6 +755,17 @@ class EventProgression:
 
             self._policy = event.actions + (event.condition,)
 
+    def copy(self) -> "EventProgression":
+        """ Return a copy of this event progression. """
+        ep = EventProgression.__new__(EventProgression)
+        ep._kb = self._kb
+        ep.event = self.event
+        ep._triggered = self._triggered
+        ep._untriggerable = self._untriggerable
+        ep._policy = self._policy
+        ep._tree = self._tree.copy()
+        return ep
+
     @property
     def triggering_policy(self) -> List[Action]:
         """ Actions to be performed in order to trigger the event. """
@@ -839,6 +868,14 @@ class QuestProgression:
         self.win_events = [EventProgression(event, kb) for event in quest.win_events]
         self.fail_events = [EventProgression(event, kb) for event in quest.fail_events]
 
+    def copy(self) -> "QuestProgression":
+        """ Return a copy of this quest progression. """
+        qp = QuestProgression.__new__(QuestProgression)
+        qp.quest = self.quest
+        qp.win_events = [event.copy() for event in self.win_events]
+        qp.fail_events = [event.copy() for event in self.fail_events]
+        return qp
+
     @property
     def _tree(self) -> Optional[List[ActionDependencyTree]]:
         events = [event for event in self.win_events if len(event.triggering_policy) > 0]
@@ -914,8 +951,10 @@ class GameProgression:
         """
         self.game = game
         self.state = game.world.state.copy()
-        self._valid_actions = list(self.state.all_applicable_actions(self.game.kb.rules.values(),
-                                                                     self.game.kb.types.constants_mapping))
+        self._rule_network = RuleNetwork(self.game.kb.logic, self.game.kb.rules.values(),
+                                         self.game.kb.types.constants_mapping)
+        self._rule_network.reset(self.state)
+        self._valid_actions = self._rule_network.actions
 
         self.quest_progressions = []
         if track_quests:
@@ -923,6 +962,16 @@ class GameProgression:
             for quest_progression in self.quest_progressions:
                 quest_progression.update(action=None, state=self.state)
 
+    def copy(self) -> "GameProgression":
+        """ Return a copy of this game progression, which can be updated independently. The game itself is shared. """
+        gp = GameProgression.__new__(GameProgression)
+        gp.game = self.game
+        gp.state = self.state.copy()
+        gp._rule_network = self._rule_network.copy()
+        gp._valid_actions = self._valid_actions
+        gp.quest_progressions = [quest_progression.copy() for quest_progression in self.quest_progressions]
+        return gp
+
     @property
     def done(self) -> bool:
         """ Whether all quests are completed or at least one has failed or is unfinishable. """
@@ -995,9 +1044,9 @@ class GameProgression:
         # Update world facts.
         self.state.apply(action)
 
-        # Get valid actions.
-        self._valid_actions = list(self.state.all_applicable_actions(self.game.kb.rules.values(),
-                                                                     self.game.kb.types.constants_mapping))
+        # Get valid actions, only looking at the facts that changed.
+        self._rule_network.update(self.state)
+        self._valid_actions = self._rule_network.actions
 
         # Update all quest progressions given the last action and new state.
         for quest_progression in self.quest_progressions:
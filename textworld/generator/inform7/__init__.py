@@ -6,3 +6,4 @@ from textworld.generator.inform7.world2inform7 import Inform7Game
 from textworld.generator.inform7.world2inform7 import generate_inform7_source
 from textworld.generator.inform7.world2inform7 import compile_inform7_game
 from textworld.generator.inform7.world2inform7 import CouldNotCompileGameError
+from textworld.generator.inform7.cache import CompilationCache
@@ -0,0 +1,143 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from os.path import join as pjoin
+from typing import Optional
+
+
+#: Default folder where compiled games are cached. Set `TEXTWORLD_INFORM7_CACHE` to change it (empty to disable).
+DEFAULT_CACHE_PATH = pjoin(os.path.expanduser("~"), ".cache", "textworld", "inform7")
+
+#: Default maximum size of the cache (in MB). Set `TEXTWORLD_INFORM7_CACHE_SIZE` to change it.
+DEFAULT_CACHE_SIZE = 1024
+
+# Temporary files older than this (in seconds) were left behind by an interrupted `put`.
+_STALE_TMP_AGE = 3600
+
+_caches = {}
+
+
+class CompilationCache:
+    """
+    Content-addressed cache of compiled games.
+
+    Artifacts are stored under the hash of everything that determines them
+    (see :py:meth:`key`). Entries are written atomically so several processes
+    can share the same folder, and the least recently used ones are evicted
+    once the cache grows past its maximum size.
+
+    The size of the cache is only tracked for the entries added by this
+    instance between two scans of the folder, so processes sharing it may
+    each let it grow past its maximum size before evicting entries.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_CACHE_SIZE * 1024**2) -> None:
+        """
+        Args:
+            path: Folder where to store the artifacts.
+            max_size: Maximum size of the cache (in bytes).
+        """
+        self.path = path
+        self.max_size = max_size
+        self._size = None  # Unknown until the folder is scanned.
+
+    @staticmethod
+    def key(source: str, ext: str, compiler: str) -> str:
+        """ Identify an artifact by its Inform7 source, its format and the compiler used to build it. """
+        hasher = hashlib.sha256()
+        for part in (compiler, ext, source):
+            hasher.update(part.encode())
+            hasher.update(b"\0")
+
+        return hasher.hexdigest() + ext
+
+    def get(self, key: str, output: str) -> bool:
+        """ Copy a cached artifact to `output`.
+
+        Returns:
+            Whether the artifact was found in the cache.
+        """
+        entry = pjoin(self.path, key)
+        try:
+            shutil.copyfile(entry, output)
+            os.utime(entry)  # Mark as recently used.
+        except FileNotFoundError:
+            return False  # Not cached, or evicted by another process.
+
+        return True
+
+    def put(self, key: str, artifact: str) -> None:
+        """ Add a compiled game to the cache, evicting old entries if needed. """
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.path)
+        try:
+            with os.fdopen(fd, "wb") as f, open(artifact, "rb") as src:
+                shutil.copyfileobj(src, f)
+
+            os.replace(tmp, pjoin(self.path, key))  # Atomic, readers never see partial entries.
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        if self._size is not None:
+            self._size += os.path.getsize(artifact)
+
+        if self._size is None or self._size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """ Remove the least recently used entries until the cache fits in its maximum size.
+
+        Temporary files left behind by interrupted writes are removed as well.
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process.
+
+            if entry.name.startswith(".tmp-"):
+                if time.time() - stat.st_mtime > _STALE_TMP_AGE:
+                    self._remove(entry.path)
+
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+
+            self._remove(path)
+            size -= entry_size
+
+        self._size = size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Evicted by another process.
+
+
+def get_compilation_cache() -> Optional[CompilationCache]:
+    """ Get the cache used when compiling games, as configured by the environment. """
+    path = os.environ.get("TEXTWORLD_INFORM7_CACHE", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+
+    max_size = int(float(os.environ.get("TEXTWORLD_INFORM7_CACHE_SIZE", DEFAULT_CACHE_SIZE)) * 1024**2)
+    # Reuse the same cache to keep track of its size between compilations.
+    if (path, max_size) not in _caches:
+        _caches[path, max_size] = CompilationCache(path, max_size=max_size)
+
+    return _caches[path, max_size]
@@ -0,0 +1,117 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import os
+import stat
+import time
+import textwrap
+from os.path import join as pjoin
+from unittest import mock
+
+from textworld.utils import make_temp_directory
+
+from textworld.generator.inform7 import CompilationCache, compile_inform7_game
+
+
+def _make_fake_compilers(inform_home):
+    """ Fake `ni` and `inform6` that log their calls and output the game's source. """
+    compilers = pjoin(inform_home, "share", "inform7", "Compilers")
+    os.makedirs(compilers)
+    scripts = {
+        "ni": """\
+            #!/bin/sh
+            echo ni >> {log}
+            mkdir -p "$5/Build" && cp "$5/Source/story.ni" "$5/Build/auto.inf"
+            """,
+        "inform6": """\
+            #!/bin/sh
+            echo inform6 >> {log}
+            cp "$2" "$3"
+            """,
+    }
+    for name, script in scripts.items():
+        path = pjoin(compilers, name)
+        with open(path, "w") as f:
+            f.write(textwrap.dedent(script).format(log=pjoin(inform_home, "calls.log")))
+
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+    return pjoin(inform_home, "calls.log")
+
+
+def test_compile_inform7_game_uses_cache():
+    with make_temp_directory() as tmpdir:
+        log = _make_fake_compilers(pjoin(tmpdir, "inform7"))
+        env = {"INFORM_HOME": pjoin(tmpdir, "inform7"), "TEXTWORLD_INFORM7_CACHE": pjoin(tmpdir, "cache")}
+        with mock.patch.dict(os.environ, env):
+            compile_inform7_game("Game A", pjoin(tmpdir, "game1.ulx"))
+            compile_inform7_game("Game A", pjoin(tmpdir, "game2.ulx"))  # Cached.
+            compile_inform7_game("Game A", pjoin(tmpdir, "game3.z8"))  # Different format.
+            compile_inform7_game("Game B", pjoin(tmpdir, "game4.ulx"))  # Different source.
+
+            # Patching the templates invalidates the games compiled with them.
+            templates = pjoin(tmpdir, "inform7", "share", "inform7", "Internal", "I6T")
+            os.makedirs(templates)
+            with open(pjoin(templates, "Actions.i6t"), "w") as f:
+                f.write("Patched")
+
+            compile_inform7_game("Game A", pjoin(tmpdir, "game5.ulx"))
+
+        with open(log) as f:
+            assert f.read().split() == ["ni", "inform6"] * 4
+
+        for name, content in [("game1.ulx", "Game A"), ("game2.ulx", "Game A"), ("game4.ulx", "Game B")]:
+            with open(pjoin(tmpdir, name)) as f:
+                assert f.read() == content
+
+            assert os.path.isfile(pjoin(tmpdir, name.replace(".ulx", ".ni")))
+
+
+def test_cache_eviction():
+    with make_temp_directory() as tmpdir:
+        cache = CompilationCache(pjoin(tmpdir, "cache"), max_size=20)
+        artifact = pjoin(tmpdir, "artifact")
+        with open(artifact, "w") as f:
+            f.write("0123456789")
+
+        keys = [CompilationCache.key(source, ".ulx", "compiler") for source in "ABC"]
+        assert len(set(keys)) == 3
+
+        cache.put(keys[0], artifact)
+        os.utime(pjoin(cache.path, keys[0]), (0, 0))
+        cache.put(keys[1], artifact)
+        os.utime(pjoin(cache.path, keys[1]), (1, 1))
+
+        # Using the first entry makes the second one the least recently used.
+        assert cache.get(keys[0], pjoin(tmpdir, "output"))
+        cache.put(keys[2], artifact)
+
+        assert cache.get(keys[0], pjoin(tmpdir, "output"))
+        assert not cache.get(keys[1], pjoin(tmpdir, "output"))
+        assert cache.get(keys[2], pjoin(tmpdir, "output"))
+        assert sorted(os.listdir(cache.path)) == sorted([keys[0], keys[2]])
+
+
+def test_cache_eviction_only_scans_when_full():
+    with make_temp_directory() as tmpdir:
+        cache = CompilationCache(pjoin(tmpdir, "cache"), max_size=20)
+        artifact = pjoin(tmpdir, "artifact")
+        with open(artifact, "w") as f:
+            f.write("0123456789")
+
+        # Temporary files left by an interrupted `put` are removed once stale.
+        os.makedirs(cache.path)
+        for name, age in [(".tmp-stale", 2 * 3600), (".tmp-writing", 0)]:
+            open(pjoin(cache.path, name), "w").close()
+            os.utime(pjoin(cache.path, name), (time.time() - age,) * 2)
+
+        with mock.patch.object(cache, "evict", wraps=cache.evict) as evict:
+            for source in "ABC":
+                cache.put(CompilationCache.key(source, ".ulx", "compiler"), artifact)
+
+        # The folder is scanned on the first insertion, then once the cache is full.
+        assert evict.call_count == 2
+        assert ".tmp-stale" not in os.listdir(cache.path)
+        assert ".tmp-writing" in os.listdir(cache.path)
+        assert len(os.listdir(cache.path)) == 3
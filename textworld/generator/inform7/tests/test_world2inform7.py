@@ -14,6 +14,8 @@ from textworld.generator import World, Quest, Event
 from textworld.generator import compile_game
 from textworld.generator import make_small_map, make_grammar, make_game_with
 from textworld.generator.chaining import ChainingOptions, sample_quest
+from textworld.generator.game import GameProgression
+from textworld.generator.inform7 import Inform7Game
 
 
 def _compile_game(game, path):
@@ -479,3 +481,34 @@ def test_take_all_and_variants():
         assert "blue ball:" in game_state.feedback
         assert "red ball" in game_state.inventory
         assert "blue ball" in game_state.inventory
+
+
+def test_detect_action_ignores_actions_order():
+    M = textworld.GameMaker()
+    room = M.new_room("room")
+    M.set_player(room)
+
+    chest = M.new(type="c", name="chest")
+    chest.add_property("open")
+    table = M.new(type="s", name="table")
+    room.add(chest, table)
+    chest.add(M.new(type="o", name="apple"))
+    table.add(M.new(type="o", name="banana"))
+    M.inventory.add(M.new(type="o", name="pear"))
+
+    game = M.build()
+    inform7 = Inform7Game(game)
+    progression = GameProgression(game)
+    for _ in range(3):
+        # The valid actions are maintained incrementally, possibly in another order than the assignments'.
+        actions = list(progression.state.all_applicable_actions(game.kb.rules.values(),
+                                                                game.kb.types.constants_mapping))
+        assert set(progression.valid_actions) == set(actions)
+
+        for action in actions:
+            i7_event = game.kb.inform7_events[action.name].format(**inform7._get_name_mapping(action))
+            detected = inform7.detect_action(i7_event, actions)
+            assert detected == inform7.detect_action(i7_event, actions[::-1])
+            assert detected == inform7.detect_action(i7_event, progression.valid_actions)
+
+        progression.update(actions[-1])
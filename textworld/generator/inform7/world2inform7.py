@@ -4,6 +4,7 @@
 
 import re
 import os
+import hashlib
 import shutil
 import warnings
 import subprocess
@@ -17,6 +18,7 @@ from textworld.utils import make_temp_directory, str2bool, chunk
 
 from textworld.generator.game import Game
 from textworld.generator.world import WorldRoom, WorldEntity
+from textworld.generator.inform7.cache import get_compilation_cache
 from textworld.logic import Signature, Proposition, Action, Variable
 
 
@@ -59,6 +61,7 @@ class Inform7Game:
         self.entity_infos = self.game.infos
         self.kb = self.game.kb
         self.use_i7_description = False  # XXX: should it be removed?
+        self._rule_order = {name: i for i, name in enumerate(self.kb.rules)}
 
     def gen_source_for_map(self, src_room: WorldRoom) -> str:
         source = ""
@@ -236,8 +239,10 @@ class Inform7Game:
         Returns:
             Action corresponding to the provided Inform7 event.
         """
-        # Prioritze actions with many precondition terms.
-        actions = sorted(actions, key=lambda a: len(a.preconditions), reverse=True)
+        # Prioritze actions with many precondition terms, then follow the order of the rules, whatever the order
+        # of `actions`. Actions of a same rule matching the event can't be told apart, the first one is returned.
+        rule_order = self._rule_order
+        actions = sorted(actions, key=lambda a: (-len(a.preconditions), rule_order.get(a.name, len(rule_order))))
         for action in actions:
             event = self.kb.inform7_events[action.name]
             if event.format(**self._get_name_mapping(action)) == i7_event:
@@ -963,15 +968,63 @@ def generate_inform7_source(game: Game, seed: int = 1234, use_i7_description: bo
     return inform7.gen_source(seed=seed)
 
 
+def _compiler_signature(binaries: Iterable[str], internal: str, options: str) -> str:
+    """ Identify the compilers, their templates and extensions (and the options) used to build a game. """
+    parts = [options]
+    for binary in binaries:
+        stat = os.stat(binary)
+        parts.append("{}:{}:{}".format(binary, stat.st_size, stat.st_mtime_ns))
+
+    # The templates are part of the compiler, e.g. TextWorld patches I6T/Actions.i6t.
+    hasher = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(internal):
+        dirnames.sort()  # Walk in a deterministic order.
+        for filename in sorted(filenames):
+            path = pjoin(dirpath, filename)
+            stat = os.stat(path)
+            hasher.update("{}:{}:{}\0".format(os.path.relpath(path, internal), stat.st_size, stat.st_mtime_ns).encode())
+
+    parts.append("{}:{}".format(internal, hasher.hexdigest()))
+    return "|".join(parts)
+
+
 def compile_inform7_game(source: str, output: str, verbose: bool = False) -> None:
-    with make_temp_directory(prefix="tmp_inform") as project_folder:
-        filename, ext = os.path.splitext(output)
-        story_filename = filename + ".ni"
+    filename, ext = os.path.splitext(output)
+    story_filename = filename + ".ni"
+
+    # Save story file.
+    with open(story_filename, 'w') as f:
+        f.write(source)
+
+    INFORM_HOME = os.environ.get("INFORM_HOME", I7_DEFAULT_PATH)
+    ni = pjoin(INFORM_HOME, "share", "inform7", "Compilers", "ni")
+    i6 = pjoin(INFORM_HOME, "share", "inform7", "Compilers", "inform6")
+    i7_internal = pjoin(INFORM_HOME, "share", "inform7", "Internal")
+
+    i6_options = "-"
+    # i6_options += "k"  # Debug file, maybe useful to extract vocab?
+    if str2bool(os.environ.get("TEXTWORLD_I6_DEBUG", False)):
+        i6_options += "D"  # Debug mode, enables Inform7 testing commands.
+
+    i6_options += "E2wS"
+    i6_options += "G" if ext == ".ulx" else "v8"
+    i6_options += "F0"  # Use extra memory rather than temporary files.
+
+    # Identical sources compile to identical games.
+    cache = get_compilation_cache()
+    if cache is not None:
+        try:
+            key = cache.key(source, ext, _compiler_signature([ni, i6], i7_internal, i6_options))
+        except OSError:
+            cache = None  # Compilers not found, let them fail below.
 
-        # Save story file.
-        with open(story_filename, 'w') as f:
-            f.write(source)
+    if cache is not None and cache.get(key, output):
+        if verbose:
+            print("Found {} in the compilation cache {}.".format(output, cache.path))
 
+        return
+
+    with make_temp_directory(prefix="tmp_inform") as project_folder:
         # Create the file structure needed by Inform7.
         source_folder = pjoin(project_folder, "Source")
         build_folder = pjoin(project_folder, "Build")
@@ -984,11 +1037,6 @@ def compile_inform7_game(source: str, output: str, verbose: bool = False) -> Non
         open(pjoin(project_folder, "uuid.txt"), 'w').close()
 
         # Build Inform7 -> Inform6 -> game
-        INFORM_HOME = os.environ.get("INFORM_HOME", I7_DEFAULT_PATH)
-        ni = pjoin(INFORM_HOME, "share", "inform7", "Compilers", "ni")
-        i6 = pjoin(INFORM_HOME, "share", "inform7", "Compilers", "inform6")
-        i7_internal = pjoin(INFORM_HOME, "share", "inform7", "Internal")
-
         # Compile story file.
         cmd = [ni, "--internal", i7_internal, "--format={}".format(ext),
                "--project", project_folder]
@@ -1012,15 +1060,6 @@ def compile_inform7_game(source: str, output: str, verbose: bool = False) -> Non
 
         # Compile inform6 code.
         i6_input_filename = pjoin(build_folder, "auto.inf")
-
-        i6_options = "-"
-        # i6_options += "k"  # Debug file, maybe useful to extract vocab?
-        if str2bool(os.environ.get("TEXTWORLD_I6_DEBUG", False)):
-            i6_options += "D"  # Debug mode, enables Inform7 testing commands.
-
-        i6_options += "E2wS"
-        i6_options += "G" if ext == ".ulx" else "v8"
-        i6_options += "F0"  # Use extra memory rather than temporary files.
         cmd = [i6, i6_options, i6_input_filename, output]
 
         if verbose:
@@ -1039,3 +1078,6 @@ def compile_inform7_game(source: str, output: str, verbose: bool = False) -> Non
         else:
             if verbose:
                 print("-= i6 =-\n{}========\n".format(stdout.decode()))
+
+    if cache is not None:
+        cache.put(key, output)
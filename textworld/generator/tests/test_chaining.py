@@ -2,11 +2,19 @@
 # Licensed under the MIT license.
 
 
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import textwrap
+from unittest import mock
+
 from textworld.generator.data import KnowledgeBase
-from textworld.generator.chaining import ChainingOptions, QuestGenerationError
+from textworld.generator.chaining import ChainingOptions, ChainingStats, QuestGenerationError
 from textworld.generator.chaining import get_chains, sample_quest
 from textworld.logic import GameLogic, Proposition, State, Variable
 
+import numpy as np
 import numpy.testing as npt
 
 
@@ -104,6 +112,174 @@ def test_applying_actions():
         assert expected_state == state
 
 
+def test_chaining_with_workers():
+    state = build_state(locked_door=False)
+    options = ChainingOptions()
+    options.backward = True
+    options.max_depth = 2
+    options.max_breadth = 1
+    options.max_length = 2
+    options.subquests = True
+    options.create_variables = True
+    expected = list(get_chains(state, options))
+
+    # The quests are returned in the same order as the sequential search.
+    options.nb_workers = 2
+    chains = list(get_chains(state, options))
+    assert len(chains) == len(expected)
+    for chain, expected_chain in zip(chains, expected):
+        assert chain.actions == expected_chain.actions
+        assert chain.initial_state == expected_chain.initial_state
+        parents = [chain.nodes.index(node.parent) if node.parent else None for node in chain.nodes]
+        expected_parents = [expected_chain.nodes.index(node.parent) if node.parent else None for node in expected_chain.nodes]
+        assert parents == expected_parents
+
+    options.ordered = False
+    chains = list(get_chains(state, options))
+    assert sorted(str(chain) for chain in chains) == sorted(str(chain) for chain in expected)
+
+    # Seeded runs are reproducible whatever the number of workers, as long as there are several.
+    options.ordered = True
+    options.rng = np.random.RandomState(1234)
+    chains = [chain.actions for chain in get_chains(state, options)]
+    for nb_workers in [3, 4]:
+        options.nb_workers = nb_workers
+        options.rng = np.random.RandomState(1234)
+        assert [chain.actions for chain in get_chains(state, options)] == chains
+
+    # Options that can't be sent to the workers are searched in a single process.
+    options.score = lambda chain: len(chain.actions)
+    with mock.patch("textworld.generator.chaining.mp.get_start_method", return_value="spawn"):
+        with mock.patch("textworld.generator.chaining.mp.Process") as process:
+            npt.assert_warns(UserWarning, list, get_chains(state, options))
+            assert not process.called
+
+    options.score = None
+    # A worker dying without reporting back is an error rather than a hang.
+    options.rng = None
+    with mock.patch("textworld.generator.chaining._chaining_worker", side_effect=lambda *args: os._exit(1)):
+        npt.assert_raises(RuntimeError, list, get_chains(state, options))
+
+
+def test_chaining_with_workers_stopped_early():
+    # Leaving the quests of the workers unconsumed must not keep the process from exiting.
+    code = textwrap.dedent("""\
+        from numpy.random import RandomState
+        from textworld.generator import make_world
+        from textworld.generator.chaining import ChainingOptions, get_chains, sample_quest
+
+        state = make_world(4, nb_objects=10, rngs={"map": RandomState(1), "objects": RandomState(2)}).state
+        options = ChainingOptions()
+        options.max_depth = 2
+        options.max_length = 2
+        options.nb_workers = 2
+        chains = get_chains(state, options)
+        next(chains)
+        chains.close()
+
+        # Sampling stops at the first quest.
+        options.rng = RandomState(3)
+        assert sample_quest(state, options) is not None
+        """)
+    subprocess.run([sys.executable, "-c", code], check=True, timeout=60)
+
+
+def test_sample_quest():
+    state = build_state(locked_door=False)
+    options = ChainingOptions()
+    options.backward = True
+    options.max_depth = 3
+    options.max_length = 3
+    options.create_variables = True
+    chains = {str(chain) for chain in get_chains(state, options)}
+
+    # Sampled quests are drawn lazily from the same search space.
+    for seed in range(5):
+        options.rng = np.random.RandomState(seed)
+        chain = sample_quest(state, options)
+        assert str(chain) in chains
+
+        options.rng = np.random.RandomState(seed)
+        assert sample_quest(state, options).actions == chain.actions
+
+    # Seeded sampling still explores the subtrees with several workers.
+    options.nb_workers = 2
+    for seed in range(5):
+        options.rng = np.random.RandomState(seed)
+        with mock.patch("textworld.generator.chaining.mp.Process", wraps=mp.Process) as process:
+            chain = sample_quest(state, options)
+
+        assert process.call_count == 2
+        assert str(chain) in chains
+
+        options.rng = np.random.RandomState(seed)
+        assert sample_quest(state, options).actions == chain.actions
+
+
+def test_sample_quest_with_budget():
+    state = build_state(locked_door=False)
+    options = ChainingOptions()
+    options.backward = True
+    options.max_depth = 3
+    options.max_length = 3
+    options.create_variables = True
+    lengths = [len(chain.actions) for chain in get_chains(state, options)]
+
+    # The best chain is returned when a scoring function is provided.
+    options.score = lambda chain: len(chain.actions)
+    chain = sample_quest(state, options)
+    assert len(chain.actions) == max(lengths)
+
+    options.rng = np.random.RandomState(1234)
+    chain = sample_quest(state, options)
+    assert len(chain.actions) == max(lengths)
+
+    # Running out of budget before finding any quest.
+    options.score = None
+    options.min_length = 3
+    options.max_nodes = 1
+    npt.assert_raises(QuestGenerationError, sample_quest, state, options)
+
+    options.max_nodes = None
+    options.max_time = 0
+    npt.assert_raises(QuestGenerationError, sample_quest, state, options)
+
+    options.max_time = None
+    options.max_backtracks = 100
+    chain = sample_quest(state, options)
+    assert len(chain.actions) == 3
+
+
+def test_chaining_stats():
+    state = build_state(locked_door=False)
+    options = ChainingOptions()
+    options.backward = True
+    options.max_depth = 2
+    options.max_length = 2
+    options.create_variables = True
+
+    stats = ChainingStats()
+    chains = list(get_chains(state, options, stats))
+    assert stats.chains == len(chains)
+    assert stats.nodes_expanded > len(chains)
+    assert stats.assignments >= stats.nodes_expanded - 1
+    assert stats.timings["search"] > 0
+
+    data = stats.serialize()
+    assert ChainingStats.deserialize(data).serialize() == data
+
+    # Stats from the workers are aggregated.
+    options.nb_workers = 2
+    parallel_stats = ChainingStats()
+    chains = list(get_chains(state, options, parallel_stats))
+    assert parallel_stats.chains == len(chains)
+
+    total = ChainingStats()
+    total.update(stats)
+    total.update(parallel_stats)
+    assert total.chains == 2 * len(chains)
+
+
 def test_going_through_door():
     P = Variable("P", "P")
     room = Variable("room", "r")
@@ -0,0 +1,76 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT license.
+
+
+import os
+import json
+from os.path import join as pjoin
+from unittest import mock
+
+import pytest
+
+from textworld.utils import make_temp_directory
+from textworld.logic import GameLogic, Proposition, Variable
+from textworld.generator import World
+from textworld.generator.data import KnowledgeBase
+from textworld.generator.game import Game, GameProgression, Quest, Event
+from textworld.generator.compact import (KnowledgeBaseRegistry, UnknownKnowledgeBaseError,
+                                         dumps_compact, loads_compact, is_compact)
+
+
+def _make_game(kb=None):
+    P, I = Variable("P", "P"), Variable("I", "I")
+    room, chest, carrot = Variable("r_0", "r"), Variable("c_0", "c"), Variable("f_0", "f")
+    facts = [Proposition("at", [P, room]), Proposition("at", [chest, room]), Proposition("open", [chest]),
+             Proposition("in", [carrot, I])]
+    world = World.from_facts(facts, kb=kb)
+    actions = [action for action in GameProgression(Game(world)).valid_actions if action.name == "insert"]
+    game = Game(world, quests=[Quest(win_events=[Event(actions)], reward=2, desc="Put the carrot in the chest.")])
+    game.metadata["seeds"] = {"map": 1}
+    return game
+
+
+def test_compact_roundtrip():
+    game = _make_game()
+    with make_temp_directory() as tmpdir:
+        registry = KnowledgeBaseRegistry(pjoin(tmpdir, "kb"))
+        data = dumps_compact(game, registry)
+        assert len(data) < len(json.dumps(game.serialize())) / 10
+
+        game2 = loads_compact(data, registry)
+        assert game2 == game
+        assert game2.kb is game.kb
+        assert game2.quests[0].commands == game.quests[0].commands
+        assert game2.infos == game.infos
+
+        # Game.save/Game.load support both formats.
+        with mock.patch.dict(os.environ, {"TEXTWORLD_KB_REGISTRY": registry.path}):
+            game.save(pjoin(tmpdir, "game.json"), compact=True)
+            assert is_compact(pjoin(tmpdir, "game.json"))
+            assert Game.load(pjoin(tmpdir, "game.json")) == game
+
+            game.save(pjoin(tmpdir, "game.json"))
+            assert not is_compact(pjoin(tmpdir, "game.json"))
+            assert Game.load(pjoin(tmpdir, "game.json")) == game
+
+
+def test_knowledge_base_registry():
+    twl = KnowledgeBase.default().logic._document + "\n type customobj : o {}"
+    kb = KnowledgeBase(GameLogic.parse(twl), "")
+    game = _make_game(kb)
+    with make_temp_directory() as tmpdir:
+        data = dumps_compact(game, KnowledgeBaseRegistry(pjoin(tmpdir, "kb")))
+        assert len(os.listdir(pjoin(tmpdir, "kb"))) == 1
+
+        # Knowledge bases are loaded from the registry's folder once per process.
+        with mock.patch.object(KnowledgeBaseRegistry, "_loaded", {}):
+            registry = KnowledgeBaseRegistry(pjoin(tmpdir, "kb"))
+            game2 = loads_compact(data, registry)
+            assert game2 == game
+            assert "customobj" in game2.kb.types.types
+            assert loads_compact(data, registry).kb is game2.kb
+
+        with mock.patch.object(KnowledgeBaseRegistry, "_loaded", {}):
+            pytest.raises(UnknownKnowledgeBaseError, loads_compact, data, KnowledgeBaseRegistry(pjoin(tmpdir, "none")))
+
+    pytest.raises(ValueError, loads_compact, json.dumps(game.serialize()).encode())
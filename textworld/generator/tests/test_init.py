@@ -2,9 +2,16 @@
 # Licensed under the MIT license.
 
 
+import time
+from os.path import join as pjoin
+from unittest import mock
+
 import numpy.testing as npt
+from numpy.random import RandomState
 
+from textworld.utils import make_temp_directory
 from textworld.generator import make_world, make_small_map, make_world_with
+from textworld.generator import CompilationQueue, Game, GameOptions
 
 from textworld.logic import Variable, Proposition
 
@@ -29,3 +36,38 @@ def test_make_world_with():
     P = Variable('P')
     world = make_world_with(rooms=[r1])
     assert Proposition('at', [P, r1]) in world.facts
+
+
+def test_compilation_queue():
+    running = []
+    max_running = []
+
+    def _fake_compile(source, game_file):
+        running.append(game_file)
+        max_running.append(len(running))
+        time.sleep(0.05)
+        with open(game_file, "w") as f:
+            f.write(source)
+
+        running.remove(game_file)
+
+    world = make_world(1, rngs={'map': RandomState(1), 'objects': RandomState(2)})
+    with make_temp_directory() as tmpdir:
+        with mock.patch("textworld.generator.generate_inform7_source", lambda game: game.metadata["uuid"]), \
+             mock.patch("textworld.generator.compile_inform7_game", _fake_compile):
+            with CompilationQueue(max_workers=2) as queue:
+                futures = []
+                for i in range(6):
+                    game = Game(world)
+                    game.metadata["uuid"] = "game_{}".format(i)
+                    options = GameOptions()
+                    options.path = pjoin(tmpdir, "")
+                    futures.append(queue.submit(game, options))
+
+                game_files = [future.result() for future in futures]
+
+        assert max(max_running) == 2
+        for i, game_file in enumerate(game_files):
+            assert game_file == pjoin(tmpdir, "game_{}.ulx".format(i))
+            with open(game_file) as f:
+                assert f.read() == "game_{}".format(i)
@@ -2,11 +2,19 @@
 # Licensed under the MIT license.
 
 
+import os
 import json
 import unittest
+from numpy.random import RandomState
+from os.path import join as pjoin
+from unittest import mock
 
+from textworld.utils import make_temp_directory
+from textworld.generator.data import KnowledgeBase
 from textworld.generator.text_grammar import Grammar
 from textworld.generator.text_grammar import GrammarOptions
+from textworld.logic import State, Proposition, Variable
+from textworld.textgen import TextGrammar, ProductionRule, TerminalSymbol, CSGUnknownSymbolError
 
 
 class ContainsEveryObjectContainer:
@@ -23,6 +31,119 @@ class TestGrammarOptions(unittest.TestCase):
         assert options == options2
 
 
+class GrammarCacheTest(unittest.TestCase):
+    def test_parsed_grammars_are_shared(self):
+        with make_temp_directory() as tmpdir:
+            path = pjoin(tmpdir, "dummy.twg")
+            with open(path, "w") as f:
+                json.dump({"start": [{"rhs": "hello #name#"}], "name": [{"rhs": "world"}]}, f)
+
+            with mock.patch.object(KnowledgeBase.default(), "text_grammars_path", tmpdir), \
+                 mock.patch.object(TextGrammar, "parse", wraps=TextGrammar.parse) as parse:
+                grammar = Grammar(options={'theme': 'dummy'})
+                grammar2 = Grammar(options={'theme': 'dummy'})
+                assert parse.call_count == 1
+                assert grammar == grammar2
+                assert grammar.grammar == grammar2.grammar
+                self.assertRaises(TypeError, hash, grammar.grammar)
+
+                # Each grammar can be modified without affecting the others.
+                grammar.grammar.add_rule(ProductionRule("name", [TerminalSymbol("you")]))
+                assert grammar != grammar2
+                assert grammar != Grammar(options={'theme': 'dummy'})
+                assert grammar2 == Grammar(options={'theme': 'dummy'})
+                assert parse.call_count == 1
+
+                # Modified files are parsed again.
+                os.utime(path, (0, 0))
+                Grammar(options={'theme': 'dummy'})
+                assert parse.call_count == 2
+
+
+class TextGrammarTest(unittest.TestCase):
+    def test_derive(self):
+        class Info:
+            def __init__(self, name):
+                self.name = name
+
+        P, r, c1, c2 = Variable("P", "P"), Variable("r_0", "r"), Variable("c_0", "c"), Variable("c_1", "c")
+        facts = [Proposition("at", [P, r]), Proposition("at", [c1, r]), Proposition("at", [c2, r]),
+                 Proposition("open", [c1])]
+        context = {
+            "state": State(KnowledgeBase.default().logic, facts),
+            "facts": facts,
+            "variables": {},
+            "mapping": {},
+            "entity_infos": {v.name: Info(v.name.replace("_", " ")) for v in [P, r, c1, c2]},
+        }
+        grammar = TextGrammar.parse(json.dumps({
+            "look": [{"rhs": "In the {r.name | at(P, r)}: [{#item(c)# | at(c, r) & at(P, r)}]."}],
+            "item(c)": [{"rhs": "the {c.name}#state(c)#"}],
+            "state(c)": [{"condition": "open(c)", "rhs": " (open)"}, {"rhs": ""}],
+            "list_empty": [{"rhs": "nothing"}],
+            "list_separator": [{"rhs": ", "}],
+            "list_last_separator": [{"rhs": " and "}],
+        }))
+
+        # The order in which the state enumerates facts isn't specified.
+        expected = {"In the r 0: the c 0 (open) and the c 1.", "In the r 0: the c 1 and the c 0 (open)."}
+        assert grammar.derive("#look#", context) in expected
+        assert grammar.derive("#look#", context) in expected  # Compiled start string.
+        assert grammar.derive("[{#item(c)# | at(c, P)}]", context) == "nothing"
+        assert context["variables"] == {} and context["mapping"] == {}
+
+        # Start strings, conditions and queries are only parsed once.
+        with mock.patch("textworld.logic._parse_and_convert") as parse_logic, \
+             mock.patch("textworld.textgen._parse_and_convert") as parse_text:
+            assert grammar.derive("#look#", context) in expected
+            assert not parse_logic.called and not parse_text.called
+
+        # Compiled programs follow changes made to the grammar.
+        grammar.add_rule(ProductionRule("list_separator", [TerminalSymbol("")]))
+        grammar.add_rule(ProductionRule("state(c)", [TerminalSymbol(" (closed)")], condition="closed(c)"))
+        assert grammar.derive("#look#", context) in expected
+        self.assertRaises(CSGUnknownSymbolError, grammar.derive, "#name#", context)
+        grammar.add_rule(ProductionRule("name", [TerminalSymbol("new")]))
+        assert grammar.derive("#name#", context) == "new"
+
+
+class GrammarExpandTest(unittest.TestCase):
+    ALTERNATIVES = {
+        "#room#": ["#adj# #noun#", "#noun# with a #noun#"],
+        "#adj#": ["dusty", "#adj# and #adj#", "bright"],
+        "#noun#": ["attic", "kitchen", "#adj# cellar"],
+    }
+
+    def _expand(self, text, seed, legacy=False):
+        def _get_random_expansion(tag, rng, game=None):
+            return rng.choice(self.ALTERNATIVES[tag])
+
+        with make_temp_directory() as tmpdir:
+            with open(pjoin(tmpdir, "dummy.twg"), "w") as f:
+                json.dump({}, f)
+
+            with mock.patch.object(KnowledgeBase.default(), "text_grammars_path", tmpdir):
+                grammar = Grammar(options={'theme': 'dummy'}, rng=RandomState(seed))
+
+        grammar.legacy_expansion = legacy
+        with mock.patch.object(grammar, "get_random_expansion", side_effect=_get_random_expansion):
+            return grammar.expand(text)
+
+    def test_expand(self):
+        for legacy in [False, True]:
+            texts = [self._expand("The #room#, the #room#.", seed, legacy) for seed in range(20)]
+            assert all("#" not in text for text in texts)
+            assert len(set(texts)) > 1
+            assert texts == [self._expand("The #room#, the #room#.", seed, legacy) for seed in range(20)]
+
+            for text in texts:
+                # Occurrences of a tag in the same text share its expansion.
+                first, second = text[len("The "):-len(".")].split(", the ")
+                assert first == second
+
+        assert self._expand("Nothing to expand. #", seed=0) == "Nothing to expand. #"
+
+
 class GrammarTest(unittest.TestCase):
     def test_grammar_eq(self):
         grammar = Grammar()
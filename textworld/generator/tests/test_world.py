@@ -145,3 +145,41 @@ def test_populate_with():
 
     assert obj in world.objects
     assert (Proposition('at', [obj, room]) in world.facts or Proposition('in', [obj, I]) in world.facts)
+
+
+def test_incremental_updates():
+    P = Variable("P")
+    room = Variable("room", "r")
+    chest = Variable("chest", "c")
+    key = Variable("key", "k")
+    obj = Variable("obj", "o")
+    facts = [Proposition("at", [P, room]),
+             Proposition("at", [chest, room]),
+             Proposition("in", [obj, chest]),
+             Proposition("match", [key, chest]),
+             Proposition("in", [key, Variable("I")]),
+             Proposition("closed", [chest])]
+
+    # Entities don't depend on the order in which facts were added.
+    world = World.from_facts(facts)
+    other = World()
+    for fact in reversed(facts):
+        other.add_fact(fact)
+
+    assert [e.id for e in world.entities] == [e.id for e in other.entities]
+    for entity in world.entities:
+        other_entity = other.find_object_by_id(entity.id)
+        assert entity.related_facts == other_entity.related_facts
+        assert entity.properties == other_entity.properties
+        assert entity.content == other_entity.content
+        assert entity.matching_entity_id == other_entity.matching_entity_id
+
+    world.remove_facts([Proposition("match", [key, chest]), Proposition("in", [key, Variable("I")])])
+    assert key not in world.objects
+    assert world.find_object_by_id(chest.name).matching_entity_id is None
+    assert world.get_objects_in_inventory() == []
+
+    # Changes made directly to the state are picked up.
+    world.state.remove_fact(Proposition("in", [obj, chest]))
+    assert obj not in world.objects
+    assert world.get_all_objects_in(world.find_object_by_id(chest.name)) == []
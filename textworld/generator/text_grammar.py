@@ -2,24 +2,34 @@
 # Licensed under the MIT license.
 
 
+import os
 import glob
 import re
 import warnings
 from os.path import join as pjoin
 from collections import OrderedDict, defaultdict
+from functools import lru_cache
 from typing import Any, Optional, Mapping, List, Tuple, Container, Union
 
 from numpy.random import RandomState
 
 import textworld
 from textworld import g_rng
-from textworld.utils import uniquify
+from textworld.utils import uniquify, check_flag
 from textworld.generator.data import KnowledgeBase
 from textworld.textgen import TextGrammar
 
 
 NB_EXPANSION_RETRIES = 20
 
+_TAG_PATTERN = re.compile(r'([#][^#]*[#])')
+
+
+@lru_cache(maxsize=4096)
+def _split_tags(text: str) -> Tuple[str, ...]:
+    """ Split text into segments alternating between literals (even positions) and tags (odd positions). """
+    return tuple(_TAG_PATTERN.split(text))
+
 
 def fix_determinant(var):
     var = var.replace("  ", " ")
@@ -152,6 +162,9 @@ class Grammar:
         self.allowed_variables_numbering = self.options.allowed_variables_numbering
         self.unique_expansion = self.options.unique_expansion
         self.all_expansions = defaultdict(list)
+        #: bool: Expand tags like older versions did, to reproduce text generated with their seeds.
+        #:       Set `TEXTWORLD_LEGACY_EXPANSION=1` to change the default.
+        self.legacy_expansion = check_flag("TEXTWORLD_LEGACY_EXPANSION")
 
         # The current used symbols
         self.overflow_dict = OrderedDict()
@@ -180,16 +193,22 @@ class Grammar:
     def _parse(self, path: str):
         """
         Parse lines and add them to the grammar.
+
+        Parsed grammar files are cached for the whole process, as long as they
+        are not modified. Each grammar gets its own copy-on-write view of them.
         """
-        with open(path) as f:
-            self.grammar = TextGrammar.parse(f.read(), filename=path)
+        key = (path, os.path.getmtime(path))
+        if key not in self._cache:
+            with open(path) as f:
+                grammar = TextGrammar.parse(f.read(), filename=path)
+
+            # Forget previous versions of the file.
+            for stale in [k for k in self._cache if k[0] == path]:
+                del self._cache[stale]
 
-        # if path not in self._cache:
-        #     with open(path) as f:
-        #         self._cache[path] = TextGrammar.parse(f.read(), filename=path)
+            self._cache[key] = grammar
 
-        # for name, rule in self._cache[path].rules.items():
-        #     self.grammar["#" + name + "#"] = rule
+        self.grammar = self._cache[key].copy()
 
     def has_tag(self, tag: str) -> bool:
         """
@@ -244,8 +263,40 @@ class Grammar:
         -------
         expanded_text :
             Resulting text in which there is no grammar tag left to be expanded.
+
+        Notes
+        -----
+        Tags are expanded depth-first, from left to right, and every occurrence
+        of a tag within the same piece of text gets the same expansion.
+        Since this doesn't draw random numbers in the same order as older
+        versions did, set `legacy_expansion` to reproduce their output.
         """
         rng = self.rng if rng is None else rng
+        if self.legacy_expansion:
+            return self._expand_legacy(text, rng, game)
+
+        parts = []
+        # Frames of (segments, their tags' expansions, tag being expanded, its start in parts).
+        stack = [(enumerate(_split_tags(text)), {}, None, 0)]
+        while stack:
+            segments, expansions, tag, start = stack[-1]
+            for i, segment in segments:
+                if i % 2 == 0:
+                    parts.append(segment)
+                elif segment in expansions:
+                    parts.append(expansions[segment])
+                else:
+                    expansion = self.get_random_expansion(segment, rng, game)
+                    stack.append((enumerate(_split_tags(expansion)), {}, segment, len(parts)))
+                    break
+            else:
+                stack.pop()
+                if tag is not None:
+                    stack[-1][1][tag] = "".join(parts[start:])
+
+        return "".join(parts)
+
+    def _expand_legacy(self, text: str, rng: RandomState, game=None) -> str:
         while "#" in text:
             to_replace = re.findall(r'[#][^#]*[#]', text)
             tag = self.rng.choice(to_replace)
@@ -2,8 +2,9 @@
 # Licensed under the MIT license.
 
 
+import bisect
 from collections import OrderedDict, defaultdict
-from typing import Union, List, ValuesView, Optional, Dict, Any
+from typing import Union, List, ValuesView, Optional, Dict, Any, Tuple
 
 import networkx
 import numpy as np
@@ -87,6 +88,20 @@ def graph2state(G: networkx.Graph, rooms: Dict[str, Variable]) -> List[Propositi
     return state
 
 
+def _insort(keys: List, items: List, key: Any, item: Any) -> None:
+    """ Insert `item` in `items` so that the parallel list `keys` stays sorted. """
+    idx = bisect.bisect_right(keys, key)
+    keys.insert(idx, key)
+    items.insert(idx, item)
+
+
+def _remove_sorted(keys: List, items: List, key: Any) -> None:
+    """ Remove the item associated with `key` from `items` and from the parallel list `keys`. """
+    idx = bisect.bisect_left(keys, key)
+    del keys[idx]
+    del items[idx]
+
+
 class WorldEntity(Variable):
     """
     A WorldEntity is an abstract concept representing anything with a name and a type.
@@ -99,6 +114,11 @@ class WorldEntity(Variable):
         self.properties = []
         self.matching_entity_id = None
 
+        # Sort keys parallel to the lists above, used by `World` to keep them in fact order.
+        self._content_keys = []
+        self._fact_keys = []
+        self._property_keys = []
+
     @classmethod
     def create(cls, var: Variable) -> Union["WorldRoom", "WorldObject"]:
         # TODO: make a small factory instead of classmethod.
@@ -121,6 +141,18 @@ class WorldEntity(Variable):
     def get_attributes(self) -> List[Proposition]:
         return self.related_facts
 
+    def _insert_related_fact(self, fact: Proposition, key: Tuple) -> None:
+        if len(fact.arguments) == 1:
+            _insort(self._property_keys, self.properties, key, fact.name)
+
+        _insort(self._fact_keys, self.related_facts, key, fact)
+
+    def _remove_related_fact(self, fact: Proposition, key: Tuple) -> None:
+        if len(fact.arguments) == 1:
+            _remove_sorted(self._property_keys, self.properties, key)
+
+        _remove_sorted(self._fact_keys, self.related_facts, key)
+
 
 class WorldObject(WorldEntity):
     """
@@ -144,11 +176,8 @@ class World:
     def __init__(self, kb: Optional[KnowledgeBase] = None) -> None:
         self.kb = kb or KnowledgeBase.default()
         self._state = State(self.kb.logic)
-        self._entities = OrderedDict()
-        self._rooms = []
-        self._objects = []
-        self._update()
-        self._player_room = None
+        self._room_types = {}
+        self._reset()
 
     @classmethod
     def from_facts(cls, facts: List[Proposition], kb: Optional[KnowledgeBase] = None) -> "World":
@@ -178,19 +207,26 @@ class World:
 
     @property
     def player_room(self) -> WorldRoom:
-        return self._player_room
+        self._refresh()
+        if len(self._player_facts) == 0:
+            return None
+
+        return self._entities[self._player_facts[-1].arguments[1].name]
 
     @property
     def rooms(self) -> List[WorldRoom]:
+        self._sort_entities()
         return self._rooms
 
     @property
     def objects(self) -> List[WorldObject]:
+        self._sort_entities()
         return self._objects
 
     @property
     def entities(self) -> ValuesView[WorldEntity]:
-        return self._entities.values()
+        self._sort_entities()
+        return self._sorted_entities.values()
 
     @property
     def state(self) -> State:
@@ -199,81 +235,252 @@ class World:
     @state.setter
     def state(self, state: State) -> None:
         self._state = State(self.kb.logic)
+        self._reset()
         self.add_facts(state.facts)
 
     @property
     def facts(self) -> List[Proposition]:
-        # Sort the facts for deterministic world generation
-        return sorted(self._state.facts)
+        # Sorted for deterministic world generation.
+        self._refresh()
+        return list(self._facts)
 
     def add_fact(self, fact: Proposition) -> None:
         self.add_facts([fact])
 
     def add_facts(self, facts: List[Proposition]) -> None:
+        """ Add facts to the world, updating the entities they affect.
+
+        Adding many facts at once is cheaper than adding them one by one since
+        the rooms' exits are rebuilt at most once.
+        """
+        self._refresh()
+        facts = [fact for fact in uniquify(facts) if not self._state.is_fact(fact)]
         self._state.add_facts(facts)
-        self._update()  # Update the internal representation of the world.
 
-    def _get_entity(self, var: Variable) -> WorldEntity:
+        relinked = False
+        for fact in facts:
+            relinked |= self._index_fact(fact)
+
+        self._index_updated(relinked)
+
+    def remove_fact(self, fact: Proposition) -> None:
+        self.remove_facts([fact])
+
+    def remove_facts(self, facts: List[Proposition]) -> None:
+        """ Remove facts from the world, updating the entities they affect. """
+        self._refresh()
+        facts = [fact for fact in uniquify(facts) if self._state.is_fact(fact)]
+        self._state.remove_facts(facts)
+
+        relinked = False
+        for fact in facts:
+            relinked |= self._unindex_fact(fact)
+
+        self._index_updated(relinked)
+
+    def _reset(self) -> None:
+        """ Clear the internal representation of the world, i.e. its entities. """
+        self._facts = []  # Sorted facts.
+        self._entities = {}
+        self._entity_keys = {}  # Sorted keys of the facts from which each entity is created.
+        self._mentions = defaultdict(set)  # Facts referring to each variable name.
+        self._exit_facts = []
+        self._link_facts = []
+        self._player_facts = []
+        self._sorted_entities = None
+        self.player = self._add_entity(Variable("P"), (-1, None, 0))
+        self.inventory = self._add_entity(Variable("I"), (-1, None, 1))
+        self._indexed_hash = self._state.zobrist_hash
+
+    def _refresh(self) -> None:
+        """ Rebuild the entities if the state was modified without going through the world. """
+        if self._state.zobrist_hash == self._indexed_hash:
+            return
+
+        self._reset()
+        relinked = False
+        for fact in self._state.facts:
+            relinked |= self._index_fact(fact)
+
+        self._index_updated(relinked)
+
+    def _index_updated(self, relinked: bool) -> None:
+        if relinked:
+            self._link_rooms()
+
+        self._sorted_entities = None
+        self._indexed_hash = self._state.zobrist_hash
+
+    def _is_room_type(self, type: str) -> bool:
+        if type not in self._room_types:
+            self._room_types[type] = self.kb.types.is_descendant_of(type, 'r')
+
+        return self._room_types[type]
+
+    def _add_entity(self, var: Variable, key: Tuple, cls: type = WorldEntity) -> WorldEntity:
+        """ Get the entity for `var`, recording that the fact behind `key` refers to it. """
         if var.name not in self._entities:
             self._entities[var.name] = WorldEntity.create(var)
+            self._entity_keys[var.name] = []
 
-        return self._entities[var.name]
-
-    def _get_room(self, var: Variable) -> WorldRoom:
-        entity = self._get_entity(var)
-        assert isinstance(entity, WorldRoom)
+        entity = self._entities[var.name]
+        assert isinstance(entity, cls)
+        bisect.insort(self._entity_keys[var.name], key)
         return entity
 
-    def _get_object(self, var: Variable) -> WorldObject:
-        entity = self._get_entity(var)
-        assert isinstance(entity, WorldObject)
+    def _remove_entity(self, var: Variable, key: Tuple) -> WorldEntity:
+        """ Get the entity for `var`, forgetting the fact behind `key`. Unreferenced entities are dropped. """
+        entity = self._entities[var.name]
+        keys = self._entity_keys[var.name]
+        del keys[bisect.bisect_left(keys, key)]
+        if len(keys) == 0:
+            del self._entities[var.name]
+            del self._entity_keys[var.name]
+
         return entity
 
-    def _update(self) -> None:
-        """ Update the internal representation of the world.
+    def _index_fact(self, fact: Proposition) -> bool:
+        """ Update the entities affected by a new fact.
+
+        Entities and their attributes are kept sorted by the fact that introduced
+        them: facts about rooms first, then door links and then facts about objects.
 
-        This method will create new entities based on facts. It should be called whenever
-        backing facts are changed.
+        Returns:
+            Whether the rooms' exits need to be rebuilt.
         """
-        self._entities = OrderedDict()  # Clear entities.
-        self.player = self._get_entity(Variable("P"))
-        self.inventory = self._get_entity(Variable("I"))
-        self._player_room = None
-        self._process_rooms()
-        self._process_objects()
-        self._rooms = [entity for entity in self._entities.values() if isinstance(entity, WorldRoom)]
-        self._objects = [entity for entity in self._entities.values() if isinstance(entity, WorldObject)]
+        bisect.insort(self._facts, fact)
+        for name in fact.names:
+            self._mentions[name].add(fact)
 
-        self._entities_per_type = defaultdict(list)
-        for entity in self._entities.values():
-            self._entities_per_type[entity.type].append(entity)
+        relinked = False
+        if self._is_room_type(fact.arguments[0].type):
+            key = (0, fact)
+            room = self._add_entity(fact.arguments[0], key + (0,), WorldRoom)
+            room._insert_related_fact(fact, key)
+
+            if fact.name.endswith("_of"):
+                # Handle room positioning facts.
+                dest = self._add_entity(fact.arguments[1], key + (1,), WorldRoom)
+                dest._insert_related_fact(fact, key)
+                bisect.insort(self._exit_facts, fact)
+                relinked = True
 
-    def _process_rooms(self) -> None:
-        for fact in self.facts:
-            if not self.kb.types.is_descendant_of(fact.arguments[0].type, 'r'):
-                continue  # Skip non room facts.
+        else:
+            key = (2, fact)
+            obj = self._add_entity(fact.arguments[0], key + (0,))
+            obj._insert_related_fact(fact, key)
+
+            if fact.name == "match":
+                self._add_entity(fact.arguments[1], key + (1,))
+                self._update_matching_entities(fact)
 
-            room = self._get_room(fact.arguments[0])
-            room.add_related_fact(fact)
+            if fact.name in ["in", "on", "at"]:
+                holder = self._add_entity(fact.arguments[1], key + (1,))
+                _insort(holder._content_keys, holder.content, key, obj)
+
+                if fact.arguments[0].type == "P":
+                    bisect.insort(self._player_facts, fact)
+
+        if fact.name == "link":
+            # Handle door link facts.
+            key = (1, fact)
+            src = self._add_entity(fact.arguments[0], key + (0,), WorldRoom)
+            door = self._add_entity(fact.arguments[1], key + (1,), WorldObject)
+            self._add_entity(fact.arguments[2], key + (2,), WorldRoom)
+            door._insert_related_fact(fact, key)
+            _insort(src._content_keys, src.content, key, door)
+            bisect.insort(self._link_facts, fact)
+            relinked = True
+
+        return relinked
+
+    def _unindex_fact(self, fact: Proposition) -> bool:
+        """ Undo `_index_fact`.
+
+        Returns:
+            Whether the rooms' exits need to be rebuilt.
+        """
+        del self._facts[bisect.bisect_left(self._facts, fact)]
+        for name in fact.names:
+            self._mentions[name].discard(fact)
+
+        relinked = False
+        if fact.name == "link":
+            key = (1, fact)
+            src = self._remove_entity(fact.arguments[0], key + (0,))
+            door = self._remove_entity(fact.arguments[1], key + (1,))
+            self._remove_entity(fact.arguments[2], key + (2,))
+            door._remove_related_fact(fact, key)
+            _remove_sorted(src._content_keys, src.content, key)
+            self._link_facts.remove(fact)
+            relinked = True
+
+        if self._is_room_type(fact.arguments[0].type):
+            key = (0, fact)
+            room = self._remove_entity(fact.arguments[0], key + (0,))
+            room._remove_related_fact(fact, key)
 
             if fact.name.endswith("_of"):
-                # Handle room positioning facts.
-                exit = reverse_direction(fact.name.split("_of")[0])
-                dest = self._get_room(fact.arguments[1])
-                dest.add_related_fact(fact)
-                assert exit not in room.exits
-                room.exits[exit] = dest
-
-        # Handle door link facts.
-        for fact in self.facts:
-            if fact.name != "link":
+                dest = self._remove_entity(fact.arguments[1], key + (1,))
+                dest._remove_related_fact(fact, key)
+                self._exit_facts.remove(fact)
+                relinked = True
+
+        else:
+            key = (2, fact)
+            obj = self._remove_entity(fact.arguments[0], key + (0,))
+            obj._remove_related_fact(fact, key)
+
+            if fact.name == "match":
+                self._remove_entity(fact.arguments[1], key + (1,))
+                self._update_matching_entities(fact)
+
+            if fact.name in ["in", "on", "at"]:
+                holder = self._remove_entity(fact.arguments[1], key + (1,))
+                _remove_sorted(holder._content_keys, holder.content, key)
+
+                if fact.arguments[0].type == "P":
+                    self._player_facts.remove(fact)
+
+        return relinked
+
+    def _update_matching_entities(self, fact: Proposition) -> None:
+        """ Point the entities of a `match` fact to their counterpart in the last `match` fact naming them. """
+        for var in fact.arguments:
+            entity = self._entities.get(var.name)
+            if entity is None:
                 continue
 
-            src = self._get_room(fact.arguments[0])
-            door = self._get_object(fact.arguments[1])
-            dest = self._get_room(fact.arguments[2])
-            door.add_related_fact(fact)
-            src.content.append(door)
+            matches = [f for f in self._mentions[var.name]
+                       if f.name == "match" and not self._is_room_type(f.arguments[0].type)]
+            if len(matches) == 0:
+                entity.matching_entity_id = None
+                continue
+
+            match = max(matches)
+            if match.arguments[0].name == var.name:
+                entity.matching_entity_id = match.arguments[1].name
+            else:
+                entity.matching_entity_id = match.arguments[0].name
+
+    def _link_rooms(self) -> None:
+        """ Rebuild the rooms' exits and doors from the positioning and link facts. """
+        for entity in self._entities.values():
+            if isinstance(entity, WorldRoom):
+                entity.exits = OrderedDict()
+                entity.doors = OrderedDict()
+
+        for fact in self._exit_facts:
+            room = self._entities[fact.arguments[0].name]
+            exit = reverse_direction(fact.name.split("_of")[0])
+            dest = self._entities[fact.arguments[1].name]
+            assert exit not in room.exits
+            room.exits[exit] = dest
+
+        for fact in self._link_facts:
+            src = self._entities[fact.arguments[0].name]
+            door = self._entities[fact.arguments[1].name]
+            dest = self._entities[fact.arguments[2].name]
 
             exit_found = False
             for exit, room in src.exits.items():
@@ -310,25 +517,49 @@ class World:
             if not exit_found:  # If there is still no exit found.
                 raise NoFreeExitError("Cannot connect {} and {}.".format(src, dest))
 
-    def _process_objects(self) -> None:
-        for fact in self.facts:
-            if self.kb.types.is_descendant_of(fact.arguments[0].type, 'r'):
-                continue  # Skip room facts.
+    def _sort_entities(self) -> None:
+        """ Order the entities by the first fact referring to them. """
+        self._refresh()
+        if self._sorted_entities is not None:
+            return
 
-            obj = self._get_entity(fact.arguments[0])
-            obj.add_related_fact(fact)
+        names = sorted(self._entities, key=lambda name: self._entity_keys[name][0])
+        self._sorted_entities = OrderedDict((name, self._entities[name]) for name in names)
+        self._rooms = [entity for entity in self._sorted_entities.values() if isinstance(entity, WorldRoom)]
+        self._objects = [entity for entity in self._sorted_entities.values() if isinstance(entity, WorldObject)]
 
-            if fact.name == "match":
-                other_obj = self._get_entity(fact.arguments[1])
-                obj.matching_entity_id = fact.arguments[1].name
-                other_obj.matching_entity_id = fact.arguments[0].name
+        self._entities_per_type = defaultdict(list)
+        for entity in self._sorted_entities.values():
+            self._entities_per_type[entity.type].append(entity)
 
-            if fact.name in ["in", "on", "at"]:
-                holder = self._get_entity(fact.arguments[1])
-                holder.content.append(obj)
+    def _find_holders_and_lockables(self, room: Variable) -> Tuple[List[Variable], List[Variable], List[Variable]]:
+        """ Look for the supporters and containers in a room, and the lockable things without a key.
 
-                if fact.arguments[0].type == "P":
-                    self._player_room = holder
+        Returns:
+            The containers and supporters, the containers and doors without a
+            matching key and, among those, the ones that are locked or closed.
+        """
+        holders = []
+        lockable_objects = []
+        locked_or_closed_objects = []
+
+        entity = self.find_room_by_id(room.name)
+        facts = [] if entity is None else [key[1] for key in entity._content_keys]
+        for s in facts:
+            # Look for containers and supporters to put stuff in/on them.
+            if s.name == "at" and s.arguments[0].type in ["c", "s"]:
+                holders.append(s.arguments[0])
+
+            # Look for containers and doors without a matching key.
+            if s.name == "at" and s.arguments[0].type in ["c", "d"]:
+                obj_propositions = [p.name for p in self._mentions[s.arguments[0].name]]
+                if "match" not in obj_propositions and s.arguments[0] not in lockable_objects:
+                    lockable_objects.append(s.arguments[0])
+
+                    if "locked" in obj_propositions or "closed" in obj_propositions:
+                        locked_or_closed_objects.append(s.arguments[0])
+
+        return holders, lockable_objects, locked_or_closed_objects
 
     def get_facts_in_scope(self) -> List[Proposition]:
         facts = []
@@ -361,15 +592,19 @@ class World:
 
     def get_entities_per_type(self, type: str) -> List[WorldEntity]:
         """ Get all entities of a certain type. """
+        self._sort_entities()
         return self._entities_per_type.get(type, [])
 
     def find_object_by_id(self, id: str) -> Optional[WorldObject]:
+        self._refresh()
         return self._entities.get(id)
 
     def find_room_by_id(self, id: str) -> Optional[WorldRoom]:
+        self._refresh()
         return self._entities.get(id)
 
     def set_player_room(self, start_room: Union[None, WorldRoom, str] = None) -> Proposition:
+        self._refresh()
         if start_room is None:
             if len(self.rooms) == 0:
                 start_room = WorldRoom("r_0", "r")
@@ -397,21 +632,8 @@ class World:
         inventory = Variable("I", "I")
         objects_holder = [inventory, room]
 
-        locked_or_closed_objects = []
-        lockable_objects = []
-        for s in self.facts:
-            # Look for containers and supporters to put stuff in/on them.
-            if s.name == "at" and s.arguments[0].type in ["c", "s"] and s.arguments[1].name == room.name:
-                objects_holder.append(s.arguments[0])
-
-            # Look for containers and doors without a matching key.
-            if s.name == "at" and s.arguments[0].type in ["c", "d"] and s.arguments[1].name == room.name:
-                obj_propositions = [p.name for p in self.facts if s.arguments[0].name in p.names]
-                if "match" not in obj_propositions and s.arguments[0] not in lockable_objects:
-                    lockable_objects.append(s.arguments[0])
-
-                    if "locked" in obj_propositions or "closed" in obj_propositions:
-                        locked_or_closed_objects.append(s.arguments[0])
+        holders, lockable_objects, locked_or_closed_objects = self._find_holders_and_lockables(room)
+        objects_holder += holders
 
         object_id = 0
         while object_id < nb_objects:
@@ -515,21 +737,8 @@ class World:
 
         objects_holder = [room]
 
-        locked_or_closed_objects = []
-        lockable_objects = []
-        for s in self.facts:
-            # Look for containers and supporters to put stuff in/on them.
-            if s.name == "at" and s.arguments[0].type in ["c", "s"] and s.arguments[1].name == room.name:
-                objects_holder.append(s.arguments[0])
-
-            # Look for containers and doors without a matching key.
-            if s.name == "at" and s.arguments[0].type in ["c", "d"] and s.arguments[1].name == room.name:
-                obj_propositions = [p.name for p in self.facts if s.arguments[0].name in p.names]
-                if "match" not in obj_propositions and s.arguments[0] not in lockable_objects:
-                    lockable_objects.append(s.arguments[0])
-
-                    if "locked" in obj_propositions or "closed" in obj_propositions:
-                        locked_or_closed_objects.append(s.arguments[0])
+        holders, lockable_objects, locked_or_closed_objects = self._find_holders_and_lockables(room)
+        objects_holder += holders
 
         remaining_objects_id = list(range(len(objects)))
         rng.shuffle(remaining_objects_id)
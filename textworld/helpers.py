@@ -21,7 +21,10 @@ def start(path: str, infos: Optional[EnvInfos] = None,
     """ Starts a TextWorld environment to play a game.
 
     Arguments:
-        path: Path to the game file.
+        path: Path to the game file. For games generated by TextWorld,
+              passing their .json file simulates the game without an
+              interpreter (see
+              :py:class:`TextWorldEnv <textworld.envs.tw.TextWorldEnv>`).
         infos:
             For customizing the information returned by this environment
             (see
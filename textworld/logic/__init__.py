@@ -3,11 +3,12 @@
 
 
 import itertools
-from collections import Counter, defaultdict, deque
+import random
+from collections import defaultdict, deque
 from functools import total_ordering, lru_cache
 from tatsu.model import NodeWalker
 import textwrap
-from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Sequence
+from typing import Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Sequence, Tuple
 
 try:
     from typing import Collection
@@ -21,6 +22,8 @@ from textworld.utils import uniquify, unique_product
 
 from mementos import memento_factory, with_metaclass
 
+from numpy.random import RandomState
+
 
 # We use first-order logic to represent the state of the world, and the actions
 # that can be applied to it.  The relevant classes are:
@@ -1047,6 +1050,13 @@ class Action:
 
         self._pre_set = frozenset(self.preconditions)
         self._post_set = frozenset(self.postconditions)
+        self._masks = None
+
+    def __getstate__(self):
+        # The cached bitsets refer to a fact table, which shouldn't travel with the action.
+        state = self.__dict__.copy()
+        state["_masks"] = None
+        return state
 
     @property
     def variables(self):
@@ -1182,6 +1192,7 @@ class Rule:
         self.command_template = None
         self.reverse_rule = None
         self._cache = {}
+        self._inverses = {}
         self.preconditions = tuple(preconditions)
         self.postconditions = tuple(postconditions)
 
@@ -1359,16 +1370,19 @@ class Rule:
         A rule that does the exact opposite of this one.
         """
 
+        if self.reverse_rule:
+            return self.reverse_rule
+
         if name is None:
             name = self.name
-            if self.reverse_rule:
-                name = self.reverse_rule.name
 
-        if self.reverse_rule:
-            return self.reverse_rule
+        # Cache the inverse so its instantiations are cached too.
+        rule = self._inverses.get(name)
+        if rule is None:
+            rule = Rule(name, self.postconditions, self.preconditions)
+            rule.reverse_rule = self
+            self._inverses[name] = rule
 
-        rule = Rule(name, self.postconditions, self.preconditions)
-        rule.reverse_rule = self
         return rule
 
 
@@ -1483,6 +1497,8 @@ class GameLogic:
         self.reverse_rules = {}
         self.constraints = {}
         self.inform7 = Inform7Logic()
+        self._fact_table = _FactTable()
+        self._query_plans = {}
 
     def _add_predicate(self, signature: Signature):
         if signature in self.predicates:
@@ -1598,9 +1614,270 @@ class GameLogic:
         return self._document
 
 
+class _FactTable:
+    """
+    Interns grounded propositions and variables to integer IDs, so sets of facts and variables can be stored as
+    bitsets.
+
+    Each GameLogic owns one table which is shared by all the states using that logic.  The table also assigns a
+    random 64-bit key to each proposition, used for the Zobrist hashes of the states.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._facts = []
+        self._keys = []
+        self._rng = random.Random(1234)
+        self._signature_masks = defaultdict(int)
+        # Bitsets of the propositions indexed by (signature, argument position, variable ID).
+        self._argument_masks = defaultdict(int)
+
+        self._var_ids = {}
+        self._vars = []
+        self._vars_by_name = defaultdict(list)
+        self._type_masks = defaultdict(int)
+        # For each variable, the bitset of the propositions mentioning it.
+        self._var_fact_masks = []
+        # For each proposition, the IDs and the bitset of the variables it mentions.
+        self._fact_var_ids = []
+        self._fact_var_masks = []
+
+    def __len__(self):
+        return len(self._facts)
+
+    def id(self, prop: Proposition) -> int:
+        """
+        Returns the ID of a proposition, interning it if needed.
+        """
+        id = self._ids.get(prop)
+        if id is None:
+            id = len(self._facts)
+            self._ids[prop] = id
+            self._facts.append(prop)
+            self._keys.append(self._rng.getrandbits(64))
+            self._signature_masks[prop.signature] |= 1 << id
+
+            for i, var in enumerate(prop.arguments):
+                self._argument_masks[prop.signature, i, self.var_id(var)] |= 1 << id
+
+            var_ids = tuple(uniquify(self.var_id(var) for var in prop.arguments))
+            var_mask = 0
+            for var_id in var_ids:
+                self._var_fact_masks[var_id] |= 1 << id
+                var_mask |= 1 << var_id
+
+            self._fact_var_ids.append(var_ids)
+            self._fact_var_masks.append(var_mask)
+
+        return id
+
+    def var_id(self, var: Variable) -> int:
+        """
+        Returns the ID of a variable, interning it if needed.
+        """
+        id = self._var_ids.get(var)
+        if id is None:
+            id = len(self._vars)
+            self._var_ids[var] = id
+            self._vars.append(var)
+            self._vars_by_name[var.name].append(var)
+            self._type_masks[var.type] |= 1 << id
+            self._var_fact_masks.append(0)
+
+        return id
+
+    def get_var(self, var: Variable) -> Optional[int]:
+        """
+        Returns the ID of a variable, or `None` if it was never interned.
+        """
+        return self._var_ids.get(var)
+
+    def vars_named(self, name: str) -> Sequence[Variable]:
+        """
+        Returns all the interned variables with the given name.
+        """
+        return self._vars_by_name.get(name, ())
+
+    def type_mask(self, type: str) -> int:
+        """
+        Returns the bitset of all interned variables of the given type.
+        """
+        return self._type_masks.get(type, 0)
+
+    def decode_vars(self, bits: int) -> List[Variable]:
+        """
+        Returns the variables contained in a bitset.
+        """
+        vars = self._vars
+        return [vars[id] for id in self.decode_ids(bits)]
+
+    def get(self, prop: Proposition) -> Optional[int]:
+        """
+        Returns the ID of a proposition, or `None` if it was never interned.
+        """
+        return self._ids.get(prop)
+
+    def mask(self, props: Iterable[Proposition]) -> int:
+        """
+        Returns the bitset containing the given propositions.
+        """
+        mask = 0
+        for prop in props:
+            mask |= 1 << self.id(prop)
+
+        return mask
+
+    def lookup(self, props: Iterable[Proposition]) -> Tuple[int, FrozenSet[Proposition]]:
+        """
+        Returns the bitset containing the given propositions, and the propositions which were never interned.
+
+        Unlike `mask()`, this never grows the table, so it is the one to use when only answering queries.
+        """
+        mask = 0
+        missing = []
+        for prop in props:
+            id = self._ids.get(prop)
+            if id is None:
+                missing.append(prop)
+            else:
+                mask |= 1 << id
+
+        return mask, frozenset(missing)
+
+    def signature_mask(self, sig: Signature) -> int:
+        """
+        Returns the bitset of all interned propositions with the given signature.
+        """
+        return self._signature_masks.get(sig, 0)
+
+    def argument_mask(self, sig: Signature, position: int, var: Variable) -> int:
+        """
+        Returns the bitset of all interned propositions with the given signature and argument at the given position.
+        """
+        id = self._var_ids.get(var)
+        if id is None:
+            return 0
+
+        return self._argument_masks.get((sig, position, id), 0)
+
+    def action_masks(self, action: Action):
+        """
+        Returns the table and the bitsets of the preconditions, postconditions, added and removed propositions of an
+        action.
+        """
+        masks = action._masks
+        if masks is None or masks[0] is not self:
+            pre = self.mask(action.preconditions)
+            post = self.mask(action.postconditions)
+            masks = (self, pre, post, post & ~pre, pre & ~post)
+            action._masks = masks
+
+        return masks
+
+    def decode(self, bits: int) -> List[Proposition]:
+        """
+        Returns the propositions contained in a bitset.
+        """
+        facts = self._facts
+        return [facts[id] for id in self.decode_ids(bits)]
+
+    @staticmethod
+    def decode_ids(bits: int) -> List[int]:
+        """
+        Returns the IDs contained in a bitset.
+        """
+        ids = []
+        while bits:
+            low = bits & -bits
+            ids.append(low.bit_length() - 1)
+            bits ^= low
+
+        return ids
+
+
+def _shuffled(items: Iterable, rng: RandomState, key: Callable = None) -> List:
+    """
+    Shuffle some items reproducibly, whatever order they were given in.
+    """
+    items = sorted(items, key=key)
+    rng.shuffle(items)
+    return items
+
+
+class _QueryStep:
+    """
+    A precondition to match during a query, along with the signatures of the facts it can match.
+    """
+
+    __slots__ = ("predicate", "signatures", "new_placeholders", "bound_positions")
+
+    def __init__(self, predicate: Predicate, signatures: Iterable[Signature], new_placeholders: Iterable[Placeholder]):
+        self.predicate = predicate
+        self.signatures = tuple(signatures)
+        self.new_placeholders = tuple(new_placeholders)
+        # The arguments already bound when this step is reached, used to look up the matching facts directly.
+        self.bound_positions = tuple((i, ph) for i, ph in enumerate(predicate.parameters)
+                                     if ph not in self.new_placeholders)
+
+
+class _QueryPlan:
+    """
+    A compiled plan for finding the assignments that satisfy a rule's preconditions.
+
+    The preconditions are reordered so the most selective ones are matched first: those whose placeholders are all
+    bound become simple membership tests, followed by the ones with the fewest unbound placeholders.  Ties are broken
+    by the number of signatures to scan, then by declaration order.
+    """
+
+    def __init__(self, types: TypeHierarchy, rule: Rule, bound: Collection[Placeholder]):
+        bound = set(bound)
+
+        candidates = []
+        for pred in rule.preconditions:
+            types_ = [types.get(t) for t in pred.signature.types]
+            signatures = [Signature(pred.signature.name, [t.name for t in subtypes])
+                          for subtypes in types.multi_subtypes(types_)]
+            candidates.append((pred, signatures))
+
+        self.steps = []
+        while candidates:
+            def _selectivity(candidate):
+                pred, signatures = candidate
+                nb_unbound = len(set(ph for ph in pred.parameters if ph not in bound))
+                return (nb_unbound, len(signatures))
+
+            # min() returns the first best candidate, preserving declaration order on ties.
+            pred, signatures = min(candidates, key=_selectivity)
+            candidates.remove((pred, signatures))
+
+            new_phs = uniquify(ph for ph in pred.parameters if ph not in bound)
+            bound.update(new_phs)
+            self.steps.append(_QueryStep(pred, signatures, new_phs))
+
+        # Placeholders uniquely found in postconditions are considered as free variables.
+        self.free_placeholders = [ph for ph in rule.placeholders if ph not in bound]
+
+    @classmethod
+    def get(cls, plans: Dict, types: TypeHierarchy, rule: Rule,
+            mapping: Mapping[Placeholder, Optional[Variable]]) -> "_QueryPlan":
+        """
+        Returns the plan for a rule given the placeholders already bound in the mapping, compiling it if needed.
+        """
+        bound = frozenset(ph for ph in rule.placeholders if mapping.get(ph) is not None)
+        key = (rule, bound)
+        plan = plans.get(key)
+        if plan is None:
+            plan = cls(types, rule, bound)
+            plans[key] = plan
+
+        return plan
+
+
 class State:
     """
     The current state of a world.
+
+    Facts are interned by the state's GameLogic and stored as a bitset, which makes copying and comparing states cheap.
     """
 
     def __init__(self, logic: GameLogic, facts: Iterable[Proposition] = None):
@@ -1617,11 +1894,20 @@ class State:
         # if not isinstance(logic, GameLogic):
         #     raise ValueError("Expected a GameLogic, found {}".format(type(logic)))
         self._logic = logic
+        table = getattr(logic, "_fact_table", None)
+        self._table = table if table is not None else _FactTable()
+        plans = getattr(logic, "_query_plans", None)
+        self._plans = plans if plans is not None else {}
 
-        self._facts = defaultdict(set)
-        self._vars_by_name = {}
-        self._vars_by_type = defaultdict(set)
-        self._var_counts = Counter()
+        # Both the facts and the variables are immutable bitsets, so copies share them for free.
+        self._bits = 0
+        self._var_bits = 0
+        self._zobrist = 0
+
+        # Decoded views of the bitsets, shared with copies until one of them gets modified.
+        self._facts_by_signature = {}
+        self._vars_by_type = {}
+        self._shared_views = False
 
         if facts:
             self.add_facts(facts)
@@ -1631,24 +1917,66 @@ class State:
         """
         All the facts in the current state.
         """
-        for fact_set in self._facts.values():
-            yield from fact_set
+        yield from self._table.decode(self._bits)
 
     def facts_with_signature(self, sig: Signature) -> Set[Proposition]:
         """
         Returns all the known facts with the given signature.
         """
-        return self._facts.get(sig, frozenset())
+        facts = self._facts_by_signature.get(sig)
+        if facts is None:
+            facts = frozenset(self._table.decode(self._bits & self._table.signature_mask(sig)))
+            self._own_views()
+            self._facts_by_signature[sig] = facts
+
+        return facts
+
+    def facts_matching(self, sig: Signature, arguments: Sequence[Optional[Variable]]) -> List[Proposition]:
+        """
+        Returns the known facts with the given signature that match a partial binding of their arguments.
+
+        Parameters
+        ----------
+        sig :
+            The signature of the facts to look for.
+        arguments :
+            The variable expected at each argument position, or `None` for the positions that can match anything.
+
+        Returns
+        -------
+        The matching facts.  Only those facts are visited, not every fact with that signature.
+        """
+        if len(arguments) != len(sig.types):
+            raise ValueError("Expected {} arguments for {}, got {}".format(len(sig.types), sig, len(arguments)))
+
+        return self._facts_matching(sig, [(i, var) for i, var in enumerate(arguments) if var is not None])
+
+    def _facts_matching(self, sig: Signature, bound: Iterable[Tuple[int, Variable]]) -> List[Proposition]:
+        table = self._table
+        bits = self._bits & table.signature_mask(sig)
+        for i, var in bound:
+            if not bits:
+                break
+            bits &= table.argument_mask(sig, i, var)
+
+        return table.decode(bits)
+
+    @property
+    def zobrist_hash(self) -> int:
+        """
+        A 64-bit Zobrist hash of the facts in this state, maintained incrementally as facts are added and removed.
+
+        Equal states using the same logic have equal hashes.
+        """
+        return self._zobrist
 
     def add_fact(self, prop: Proposition):
         """
         Add a fact to the state.
         """
 
-        self._facts[prop.signature].add(prop)
-
-        for var in prop.arguments:
-            self._add_variable(var)
+        self._check_variables(prop)
+        self._update(self._table.mask([prop]), 0)
 
     def add_facts(self, props: Iterable[Proposition]):
         """
@@ -1663,10 +1991,9 @@ class State:
         Remove a fact from the state.
         """
 
-        self._facts[prop.signature].discard(prop)
-
-        for var in prop.arguments:
-            self._remove_variable(var)
+        id = self._table.get(prop)
+        if id is not None:
+            self._update(0, 1 << id)
 
     def remove_facts(self, props: Iterable[Proposition]):
         """
@@ -1676,69 +2003,121 @@ class State:
         for prop in props:
             self.remove_fact(prop)
 
+    def _update(self, added: int, removed: int):
+        """
+        Add and remove the facts contained in the given bitsets, keeping track of the variables.
+        """
+
+        table = self._table
+        old_bits = self._bits
+        bits = (old_bits | added) & ~removed
+        if bits == old_bits:
+            return
+
+        var_bits = self._var_bits
+        zobrist = self._zobrist
+        for id in table.decode_ids(added & ~old_bits):
+            var_bits |= table._fact_var_masks[id]
+            zobrist ^= table._keys[id]
+
+        for id in table.decode_ids(removed & old_bits):
+            zobrist ^= table._keys[id]
+            for var_id in table._fact_var_ids[id]:
+                if bits & table._var_fact_masks[var_id] == 0:
+                    var_bits &= ~(1 << var_id)
+
+        self._own_views()
+        changed = (bits ^ old_bits)
+        for sig in list(self._facts_by_signature):
+            if changed & table.signature_mask(sig):
+                del self._facts_by_signature[sig]
+
+        if var_bits != self._var_bits:
+            self._vars_by_type.clear()
+
+        self._bits = bits
+        self._var_bits = var_bits
+        self._zobrist = zobrist
+
+    def _own_views(self):
+        if self._shared_views:
+            self._facts_by_signature = self._facts_by_signature.copy()
+            self._vars_by_type = self._vars_by_type.copy()
+            self._shared_views = False
+
+    def _check_variables(self, prop: Proposition):
+        """
+        Make sure a new fact doesn't refer to a known variable with a different type.
+        """
+
+        for var in prop.arguments:
+            for other in self._table.vars_named(var.name):
+                if other != var and self.has_variable(other):
+                    _check_type_conflict(var.name, other.type, var.type)
+
     def is_fact(self, prop: Proposition) -> bool:
         """
         Returns whether a proposition is true in this state.
         """
-        return prop in self._facts[prop.signature]
+        id = self._table.get(prop)
+        return id is not None and (self._bits >> id) & 1 == 1
 
     def are_facts(self, props: Iterable[Proposition]) -> bool:
         """
         Returns whether the propositions are all true in this state.
         """
-
-        for prop in props:
-            if not self.is_fact(prop):
-                return False
-
-        return True
+        mask, missing = self._table.lookup(props)
+        return not missing and self._bits & mask == mask
 
     @property
     def variables(self) -> Iterable[Variable]:
         """
         All the variables tracked by the current state.
         """
-        return self._vars_by_name.values()
+        return self._table.decode_vars(self._var_bits)
 
     def has_variable(self, var: Variable) -> bool:
         """
         Returns whether this state is aware of the given variable.
         """
-        return self._vars_by_name.get(var.name) == var
+        id = self._table.get_var(var)
+        return id is not None and (self._var_bits >> id) & 1 == 1
 
     def variable_named(self, name: str) -> Variable:
         """
         Returns the variable with the given name, if known.
         """
-        return self._vars_by_name[name]
+        for var in self._table.vars_named(name):
+            if self.has_variable(var):
+                return var
+
+        raise KeyError(name)
 
     def variables_of_type(self, type: str) -> Set[Variable]:
         """
         Returns all the known variables of the given type.
         """
-        return self._vars_by_type.get(type, frozenset())
-
-    def _add_variable(self, var: Variable):
-        name = var.name
-        existing = self._vars_by_name.setdefault(name, var)
-        _check_type_conflict(name, existing.type, var.type)
-
-        self._vars_by_type[var.type].add(var)
-        self._var_counts[name] += 1
+        vars = self._vars_by_type.get(type)
+        if vars is None:
+            vars = frozenset(self._table.decode_vars(self._var_bits & self._table.type_mask(type)))
+            self._own_views()
+            self._vars_by_type[type] = vars
 
-    def _remove_variable(self, var: Variable):
-        name = var.name
-        self._var_counts[name] -= 1
-        if self._var_counts[name] == 0:
-            del self._var_counts[name]
-            del self._vars_by_name[name]
-            self._vars_by_type[var.type].remove(var)
+        return vars
 
     def is_applicable(self, action: Action) -> bool:
         """
         Check if an action is applicable in this state (i.e. its preconditions are met).
         """
-        return self.are_facts(action.preconditions)
+        masks = action._masks
+        if masks is not None and masks[0] is self._table:
+            pre = masks[1]
+        else:
+            pre, missing = self._table.lookup(action.preconditions)
+            if missing:
+                return False
+
+        return self._bits & pre == pre
 
     def is_sequence_applicable(self, actions: Iterable[Action]) -> bool:
         """
@@ -1748,14 +2127,25 @@ class State:
         # The simplest implementation would copy the state and apply all the actions, but that would waste time both in
         # the copy and the variable tracking etc.
 
-        facts = set(self.facts)
+        # Propositions which were never interned can only hold if an earlier action of the sequence added them, so they
+        # are tracked in a separate set rather than growing the table.
+        table = self._table
+        bits = self._bits
+        extra = frozenset()
         for action in actions:
-            old_len = len(facts)
-            facts.difference_update(action.preconditions)
-            if len(facts) != old_len - len(action.preconditions):
+            masks = action._masks
+            if masks is not None and masks[0] is table:
+                _, pre, post, _, _ = masks
+                pre_missing = post_missing = frozenset()
+            else:
+                pre, pre_missing = table.lookup(action.preconditions)
+                post, post_missing = table.lookup(action.postconditions)
+
+            if bits & pre != pre or not pre_missing <= extra:
                 return False
 
-            facts.update(action.postconditions)
+            bits = (bits & ~pre) | post
+            extra = (extra - pre_missing) | post_missing
 
         return True
 
@@ -1773,9 +2163,12 @@ class State:
         Whether the action could be applied (i.e. whether the preconditions were met).
         """
 
-        if self.is_applicable(action):
-            self.add_facts(action.added)
-            self.remove_facts(action.removed)
+        _, pre, _, added, removed = self._table.action_masks(action)
+        if self._bits & pre == pre:
+            for prop in action.added:
+                self._check_variables(prop)
+
+            self._update(added, removed)
             return True
         else:
             return False
@@ -1848,6 +2241,7 @@ class State:
                         mapping: Mapping[Placeholder, Optional[Variable]] = None,
                         partial: bool = False,
                         allow_partial: Callable[[Placeholder], bool] = None,
+                        rng: Optional[RandomState] = None,
                         ) -> Iterable[Mapping[Placeholder, Optional[Variable]]]:
         """
         Find all possible placeholder assignments that would allow a rule to be instantiated in this state.
@@ -1862,6 +2256,9 @@ class State:
             Whether incomplete mappings, that would require new variables or propositions, are allowed.
         allow_partial : optional
             A callback function that returns whether a partial match may involve the given placeholder.
+        rng : optional
+            If provided, the candidates for each placeholder are shuffled with this random number generator, so the
+            mappings are lazily enumerated in a random (but reproducible) order.
 
         Returns
         -------
@@ -1879,50 +2276,54 @@ class State:
 
         if partial:
             new_phs = [ph for ph in rule.placeholders if ph not in mapping]
-            return self._all_assignments(new_phs, mapping, used_vars, True, allow_partial)
+            return self._all_assignments(new_phs, mapping, used_vars, True, allow_partial, rng)
         else:
-            # Precompute the new placeholders at every depth to avoid wasted work
-            seen_phs = set(mapping.keys())
-            new_phs_by_depth = []
-            for pred in rule.preconditions:
-                new_phs = []
-                for ph in pred.parameters:
-                    if ph not in seen_phs:
-                        new_phs.append(ph)
-                        seen_phs.add(ph)
-                new_phs_by_depth.append(new_phs)
-
-            # Placeholders uniquely found in postcondition are considered as free variables.
-            free_vars = [ph for ph in rule.placeholders if ph not in seen_phs]
-            new_phs_by_depth.append(free_vars)
-
-            return self._all_applicable_assignments(rule, mapping, used_vars, new_phs_by_depth, 0)
+            # The plan orders the preconditions and precomputes the new placeholders at every depth.
+            plan = _QueryPlan.get(self._plans, self._logic.types, rule, mapping)
+            return self._all_applicable_assignments(plan, mapping, used_vars, 0, rng)
 
     def _all_applicable_assignments(self,
-                                    rule: Rule,
+                                    plan: _QueryPlan,
                                     mapping: Dict[Placeholder, Optional[Variable]],
                                     used_vars: Set[Variable],
-                                    new_phs_by_depth: List[List[Placeholder]],
                                     depth: int,
+                                    rng: Optional[RandomState] = None,
                                     ) -> Iterable[Mapping[Placeholder, Optional[Variable]]]:
         """
-        Find all assignments that would be applicable in this state.  We recurse through the rule's preconditions, at
+        Find all assignments that would be applicable in this state.  We recurse through the plan's preconditions, at
         each level determining possible variable assignments from the current facts.
         """
 
-        new_phs = new_phs_by_depth[depth]
-
-        if depth >= len(rule.preconditions):
+        if depth >= len(plan.steps):
             # There are no applicability constraints on the free variables, so solve them unconstrained
-            yield from self._all_assignments(new_phs, mapping, used_vars, False)
+            yield from self._all_assignments(plan.free_placeholders, mapping, used_vars, False, rng=rng)
             return
 
-        pred = rule.preconditions[depth]
+        step = plan.steps[depth]
+        pred = step.predicate
+        new_phs = step.new_placeholders
+
+        if not new_phs:
+            # Every placeholder is already bound, so there is a single fact to look for.
+            prop = Proposition(pred.name, [mapping[ph] for ph in pred.parameters])
+            if prop.signature in step.signatures and self.is_fact(prop):
+                yield from self._all_applicable_assignments(plan, mapping, used_vars, depth + 1, rng)
+
+            return
+
+        bound = [(i, mapping[ph]) for i, ph in step.bound_positions]
+        props_by_signature = []
+        for signature in step.signatures:
+            if bound:
+                props_by_signature.append(self._facts_matching(signature, bound))
+            else:
+                props_by_signature.append(self.facts_with_signature(signature))
 
-        types = [self._logic.types.get(t) for t in pred.signature.types]
-        for subtypes in self._logic.types.multi_subtypes(types):
-            signature = Signature(pred.signature.name, [t.name for t in subtypes])
-            for prop in self.facts_with_signature(signature):
+        if rng is not None:
+            props_by_signature = [_shuffled(itertools.chain.from_iterable(props_by_signature), rng)]
+
+        for props in props_by_signature:
+            for prop in props:
                 for ph, var in zip(pred.parameters, prop.arguments):
                     existing = mapping.get(ph)
                     if existing is None:
@@ -1933,7 +2334,7 @@ class State:
                     elif existing != var:
                         break
                 else:
-                    yield from self._all_applicable_assignments(rule, mapping, used_vars, new_phs_by_depth, depth + 1)
+                    yield from self._all_applicable_assignments(plan, mapping, used_vars, depth + 1, rng)
 
                 # Reset the mapping to what it was before the recursive call
                 for ph in new_phs:
@@ -1946,6 +2347,7 @@ class State:
                          used_vars: Set[Variable],
                          partial: bool,
                          allow_partial: Callable[[Placeholder], bool] = None,
+                         rng: Optional[RandomState] = None,
                          ) -> Iterable[Mapping[Placeholder, Optional[Variable]]]:
         """
         Find all possible assignments of the given placeholders, without regard to whether any predicates match.
@@ -1963,7 +2365,11 @@ class State:
             if partial and allow_partial(ph):
                 # Allow new variables to be created
                 matched_vars.add(ph)
-            candidates.append(list(matched_vars))
+
+            if rng is None:
+                candidates.append(list(matched_vars))
+            else:
+                candidates.append(_shuffled(matched_vars, rng, key=lambda v: (isinstance(v, Placeholder), v.name, v.type)))
 
         for assignment in unique_product(*candidates):
             for ph, var in zip(placeholders, assignment):
@@ -1990,14 +2396,15 @@ class State:
         """
 
         copy = State(self._logic)
+        copy._table = self._table
+        copy._plans = self._plans
+        copy._bits = self._bits
+        copy._var_bits = self._var_bits
+        copy._zobrist = self._zobrist
 
-        for k, v in self._facts.items():
-            copy._facts[k] = v.copy()
-
-        copy._vars_by_name = self._vars_by_name.copy()
-        for k, v in self._vars_by_type.items():
-            copy._vars_by_type[k] = v.copy()
-        copy._var_counts = self._var_counts.copy()
+        copy._facts_by_signature = self._facts_by_signature
+        copy._vars_by_type = self._vars_by_type
+        copy._shared_views = self._shared_views = True
 
         return copy
 
@@ -2016,6 +2423,9 @@ class State:
 
     def __eq__(self, other):
         if isinstance(other, State):
+            if self._table is other._table:
+                return self._zobrist == other._zobrist and self._bits == other._bits
+
             return set(self.facts) == set(other.facts)
         else:
             return NotImplemented
@@ -2023,11 +2433,12 @@ class State:
     def __str__(self):
         lines = ["State({"]
 
-        for sig in sorted(self._facts.keys()):
-            facts = self._facts[sig]
-            if len(facts) == 0:
-                continue
+        facts_by_signature = defaultdict(list)
+        for fact in self.facts:
+            facts_by_signature[fact.signature].append(fact)
 
+        for sig in sorted(facts_by_signature.keys()):
+            facts = facts_by_signature[sig]
             lines.append("    {}: {{".format(sig))
             for fact in sorted(facts):
                 lines.append("        {},".format(fact))
@@ -2036,3 +2447,198 @@ class State:
         lines.append("})")
 
         return "\n".join(lines)
+
+
+class RuleNetwork:
+    """
+    A compiled match network over a set of rules, which incrementally maintains the actions applicable in a state.
+
+    Every precondition of every rule is indexed by the signatures of the facts it can match.  When the state changes,
+    the actions relying on a removed fact are dropped and only the rules having a precondition matching an added fact
+    are re-evaluated, starting from that fact.  The cost of an update is thus proportional to the number of changed
+    facts rather than to the number of rules and facts.
+    """
+
+    def __init__(self, logic: GameLogic, rules: Iterable[Rule], mapping: Mapping[Placeholder, Variable] = None):
+        """
+        Compile a RuleNetwork.
+
+        Parameters
+        ----------
+        logic :
+            The logic the rules come from.
+        rules :
+            The rules to instantiate.
+        mapping : optional
+            An initial mapping to start from, constraining the possible instantiations.
+        """
+
+        self._logic = logic
+        self._rules = tuple(rules)
+        self._rule_names = tuple(uniquify(rule.name for rule in self._rules))
+        self._mapping = dict(mapping or {})
+
+        # For each signature, the rule preconditions that facts with that signature can match.
+        self._preconditions = defaultdict(list)
+        # Rules with placeholders that aren't constrained by any precondition depend on the known variables.
+        self._unconstrained_rules = []
+
+        for rule in self._rules:
+            constrained = set(self._mapping)
+            for pred in rule.preconditions:
+                constrained.update(pred.parameters)
+                types = [logic.types.get(t) for t in pred.signature.types]
+                for subtypes in logic.types.multi_subtypes(types):
+                    signature = Signature(pred.signature.name, [t.name for t in subtypes])
+                    self._preconditions[signature].append((rule, pred))
+
+            if any(ph not in constrained for ph in rule.placeholders):
+                self._unconstrained_rules.append(rule)
+
+        self._state = None
+        self._bits = 0
+        self._var_bits = 0
+        self._actions = {name: {} for name in self._rule_names}
+        self._actions_by_fact = defaultdict(set)
+
+    @property
+    def actions(self) -> List[Action]:
+        """
+        The actions applicable in the last seen state, grouped by rule in the order the rules were given, like
+        `State.all_applicable_actions`.  Within a rule, actions are listed in the order they were found, which
+        depends on the previous states rather than on the order of the assignments.
+        """
+        return [action for name in self._rule_names for action in self._actions[name]]
+
+    def reset(self, state: State):
+        """
+        Find all the applicable actions of a state from scratch.
+        """
+
+        self._state = state
+        self._bits = state._bits
+        self._var_bits = state._var_bits
+        self._actions = {name: {} for name in self._rule_names}
+        self._actions_by_fact = defaultdict(set)
+
+        for rule in self._rules:
+            for assignment in state.all_assignments(rule, self._mapping):
+                self._add_action(rule.instantiate(assignment))
+
+    def update(self, state: State):
+        """
+        Update the applicable actions to reflect the changes made to the state since the last call.
+        """
+
+        if self._state is None or state._table is not self._state._table:
+            self.reset(state)
+            return
+
+        table = state._table
+        changed = self._bits ^ state._bits
+        removed = table.decode(changed & self._bits)
+        added = table.decode(changed & state._bits)
+        vars_changed = self._var_bits != state._var_bits
+
+        self._state = state
+        self._bits = state._bits
+        self._var_bits = state._var_bits
+
+        for fact in removed:
+            for action in list(self._actions_by_fact.get(fact, ())):
+                self._remove_action(action)
+
+        for rule, assignment in self.matches(state, added):
+            self._add_action(rule.instantiate(assignment))
+
+        if vars_changed:
+            for rule in self._unconstrained_rules:
+                for action in list(self._actions[rule.name]):
+                    self._remove_action(action)
+
+                for assignment in state.all_assignments(rule, self._mapping):
+                    self._add_action(rule.instantiate(assignment))
+
+    def matches(self, state: State, facts: Iterable[Proposition]) -> Iterable[Tuple[Rule, Mapping[Placeholder, Variable]]]:
+        """
+        Find the assignments applicable in a state that use at least one of the given facts, without updating the
+        network.
+
+        Parameters
+        ----------
+        state :
+            The state to match the rules against.
+        facts :
+            The facts the assignments should use, typically the ones that just changed.
+
+        Returns
+        -------
+        The matching rules along with their assignments.  An assignment using more than one of the facts may be
+        returned more than once.
+        """
+
+        for fact in facts:
+            for rule, pred in self._preconditions.get(fact.signature, ()):
+                mapping = self._seed(pred, fact)
+                if mapping is None:
+                    continue
+
+                for assignment in state.all_assignments(rule, mapping):
+                    yield rule, assignment
+
+    def copy(self) -> "RuleNetwork":
+        """
+        Create a copy of this network, sharing the compiled rules.
+        """
+
+        copy = RuleNetwork.__new__(RuleNetwork)
+        copy._logic = self._logic
+        copy._rules = self._rules
+        copy._rule_names = self._rule_names
+        copy._mapping = self._mapping
+        copy._preconditions = self._preconditions
+        copy._unconstrained_rules = self._unconstrained_rules
+
+        copy._state = self._state
+        copy._bits = self._bits
+        copy._var_bits = self._var_bits
+        copy._actions = {name: actions.copy() for name, actions in self._actions.items()}
+        copy._actions_by_fact = defaultdict(set, {fact: actions.copy() for fact, actions in self._actions_by_fact.items()})
+        return copy
+
+    def _seed(self, pred: Predicate, fact: Proposition) -> Optional[Dict[Placeholder, Variable]]:
+        """
+        Start a mapping by matching a precondition against a fact.
+        """
+
+        mapping = dict(self._mapping)
+        used_vars = set(mapping.values())
+        for ph, var in zip(pred.parameters, fact.arguments):
+            existing = mapping.get(ph)
+            if existing is None:
+                if var in used_vars:
+                    return None
+                mapping[ph] = var
+                used_vars.add(var)
+            elif existing != var:
+                return None
+
+        return mapping
+
+    def _add_action(self, action: Action):
+        actions = self._actions[action.name]
+        if action in actions:
+            return
+
+        actions[action] = None
+        for fact in action.preconditions:
+            self._actions_by_fact[fact].add(action)
+
+    def _remove_action(self, action: Action):
+        self._actions[action.name].pop(action, None)
+        for fact in action.preconditions:
+            actions = self._actions_by_fact.get(fact)
+            if actions is not None:
+                actions.discard(action)
+                if not actions:
+                    del self._actions_by_fact[fact]
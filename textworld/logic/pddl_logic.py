@@ -5,7 +5,7 @@ import textwrap
 from os.path import join as pjoin
 from pprint import pprint
 
-from collections import Counter, defaultdict, deque
+from collections import deque
 from functools import total_ordering, lru_cache
 from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Sequence
 
@@ -177,12 +177,7 @@ class State(textworld.logic.State):
             downward_lib:
             pddl: game described in the PDDL format (aka PDDL problem).
         """
-        self._facts = defaultdict(set)
-        self._vars_by_name = {}
-        self._vars_by_type = defaultdict(set)
-        self._var_counts = Counter()
-
-        self._logic = logic
+        super().__init__(logic)
         self.downward_lib = downward_lib
 
         # problem
@@ -2,15 +2,19 @@
 # Licensed under the MIT license.
 
 
+import pickle
+
 from nose.tools import assert_raises
 
+from numpy.random import RandomState
+
 from tatsu.exceptions import ParseError
 
 from textworld.logic import Action, Rule
 from textworld.logic import Variable, Placeholder
 from textworld.logic import Proposition, Predicate, Signature
-from textworld.logic import State, GameLogic
-from textworld.generator import KnowledgeBase
+from textworld.logic import State, GameLogic, RuleNetwork
+from textworld.generator import KnowledgeBase, make_world
 
 
 def test_logic_parsing():
@@ -88,6 +92,12 @@ def test_state():
     assert state.variables_of_type("r") == {kitchen}
     assert state.variables_of_type("o") == {stove}
 
+    in_sig = in_kitchen.signature
+    assert state.facts_matching(in_sig, [None, kitchen]) == [in_kitchen]
+    assert state.facts_matching(in_sig, [stove, None]) == [in_kitchen]
+    assert state.facts_matching(in_sig, [None, study]) == []
+    assert_raises(ValueError, state.facts_matching, in_sig, [stove])
+
     state.remove_fact(at_kitchen)
     assert not state.is_fact(at_kitchen)
     assert state.is_fact(in_kitchen)
@@ -105,6 +115,7 @@ def test_state():
     assert len(state.variables_of_type("P")) == 0
     assert len(state.variables_of_type("r")) == 0
     assert len(state.variables_of_type("o")) == 0
+    assert state.facts_matching(in_sig, [None, kitchen]) == []
 
     state.add_fact(at_study)
     assert not state.is_fact(at_kitchen)
@@ -116,6 +127,53 @@ def test_state():
     assert len(state.variables_of_type("o")) == 0
 
 
+def test_state_copy():
+    state = State(KnowledgeBase.default().logic, [
+        Proposition.parse("at(P, kitchen: r)"),
+        Proposition.parse("in(egg: o, kitchen: r)"),
+    ])
+    P = Variable.parse("P")
+    kitchen = Variable.parse("kitchen: r")
+    study = Variable.parse("study: r")
+    in_kitchen = Proposition.parse("in(egg: o, kitchen: r)")
+    at_study = Proposition.parse("at(P, study: r)")
+
+    copy = state.copy()
+    assert copy == state
+    assert copy.zobrist_hash == state.zobrist_hash
+
+    copy.add_fact(at_study)
+    assert copy != state
+    assert copy.is_fact(at_study)
+    assert not state.is_fact(at_study)
+    assert copy.variables_of_type("r") == {kitchen, study}
+    assert state.variables_of_type("r") == {kitchen}
+
+    state.remove_fact(in_kitchen)
+    assert copy.is_fact(in_kitchen)
+    assert copy.facts_with_signature(in_kitchen.signature) == {in_kitchen}
+    assert len(state.facts_with_signature(in_kitchen.signature)) == 0
+    assert copy.are_facts([in_kitchen, at_study])
+    assert not state.are_facts([in_kitchen, at_study])
+
+    go = Action.parse("go :: at(P, kitchen: r) -> at(P, study: r)")
+    moved = state.apply_on_copy(go)
+    assert moved.is_fact(at_study)
+    assert set(moved.variables) == {P, study}
+    assert moved.variable_named("study") == study
+    assert state == State(KnowledgeBase.default().logic, [Proposition.parse("at(P, kitchen: r)")])
+
+    # Variables can't change type.
+    assert_raises(ValueError, moved.add_fact, Proposition.parse("in(study: o, I)"))
+    assert not moved.is_fact(Proposition.parse("in(study: o, I)"))
+
+    # The hash only depends on the facts, not on the order of the updates.
+    moved.apply(go.inverse())
+    assert moved == state
+    assert moved.zobrist_hash == state.zobrist_hash
+    assert moved.zobrist_hash != copy.zobrist_hash
+
+
 def test_all_instantiations():
     state = State(KnowledgeBase.default().logic, [
         Proposition.parse("at(P, kitchen: r)"),
@@ -133,7 +191,18 @@ def test_all_instantiations():
         Action.parse("take :: $at(P, kitchen: r) & in(egg: o, kitchen: r) -> in(egg: o, I)"),
     }
 
+    # Preconditions whose placeholders are bound are matched first.
+    r = Placeholder("r", "r")
+    kitchen = Variable("kitchen", "r")
+    actions = set(state.all_instantiations(take, {r: kitchen}))
+    assert actions == {
+        Action.parse("take :: $at(P, kitchen: r) & in(key: o, kitchen: r) -> in(key: o, I)"),
+        Action.parse("take :: $at(P, kitchen: r) & in(egg: o, kitchen: r) -> in(egg: o, I)"),
+    }
+    assert len(list(state.all_assignments(take, {r: Variable("study", "r")}))) == 0
+
     drop = take.inverse(name="drop")
+    assert take.inverse(name="drop") is drop
     actions = set(state.all_instantiations(drop))
     assert actions == {
         Action.parse("drop :: $at(P, kitchen: r) & in(map: o, I) -> in(map: o, kitchen: r)"),
@@ -148,6 +217,33 @@ def test_all_instantiations():
     assert len(actions) == 0
 
 
+def test_rule_network():
+    kb = KnowledgeBase.default()
+    rngs = {"map": RandomState(1), "objects": RandomState(2)}
+    state = make_world(4, nb_objects=10, rngs=rngs).state
+    rules = list(kb.rules.values())
+
+    network = RuleNetwork(kb.logic, rules, kb.types.constants_mapping)
+    network.reset(state)
+    initial = network.copy()
+
+    rng = RandomState(3)
+    for _ in range(50):
+        expected = set(state.all_applicable_actions(rules, kb.types.constants_mapping))
+        assert set(network.actions) == expected
+        assert len(network.actions) == len(expected)
+        # Actions follow the order of the rules.
+        names = [action.name for action in network.actions]
+        assert names == sorted(names, key=[rule.name for rule in rules].index)
+
+        action = network.actions[rng.randint(len(network.actions))]
+        state.apply(action)
+        network.update(state)
+
+    # Copies are independent.
+    assert set(initial.actions) != set(network.actions)
+
+
 def test_is_sequence_applicable():
     state = State(KnowledgeBase.default().logic, [
         Proposition.parse("at(P, r_1: r)"),
@@ -171,6 +267,34 @@ def test_is_sequence_applicable():
     ])
 
 
+def test_queries_dont_grow_fact_table():
+    state = State(KnowledgeBase.default().logic, [
+        Proposition.parse("at(P, r_1: r)"),
+        Proposition.parse("empty(r_2: r)"),
+    ])
+    table = state._table
+    size = len(table)
+
+    at_attic = Proposition.parse("at(P, attic: r)")
+    to_attic = Action.parse("go :: at(P, r_1: r) & empty(attic: r) -> at(P, attic: r) & empty(r_1: r)")
+    from_attic = Action.parse("go :: at(P, attic: r) & empty(cellar: r) -> at(P, cellar: r) & empty(attic: r)")
+    to_r_2 = Action.parse("go :: at(P, r_1: r) & empty(r_2: r) -> at(P, r_2: r) & empty(r_1: r)")
+    r_2_to_attic = Action.parse("go :: at(P, r_2: r) & empty(r_1: r) -> at(P, attic: r) & empty(r_2: r)")
+
+    assert not state.is_fact(at_attic)
+    assert not state.are_facts([Proposition.parse("at(P, r_1: r)"), at_attic])
+    assert not state.is_applicable(to_attic)
+    assert not state.is_sequence_applicable([to_attic, from_attic])
+    assert state.is_sequence_applicable([to_r_2, r_2_to_attic])
+    assert not state.is_sequence_applicable([to_r_2, r_2_to_attic, to_r_2])
+    assert len(table) == size
+
+    # The cached bitsets belong to the table, so they are not pickled with the action.
+    state.apply(to_r_2)
+    assert to_r_2._masks is not None
+    assert pickle.loads(pickle.dumps(to_r_2))._masks is None
+
+
 def test_match():
     rule = Rule.parse("go :: at(P, r) & $link(r, d, r') & $free(r, r') & $free(r', r) -> at(P, r')")
 
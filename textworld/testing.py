@@ -3,6 +3,7 @@
 
 
 import io
+import os
 import sys
 import contextlib
 
@@ -100,3 +101,58 @@ def build_and_compile_game(options: GameOptions):
     game = M.build()
     game_file = _compile_test_game(game, options)
     return game, game_file
+
+
+def check_backends_parity(gamefile: str, nb_rollouts: int = 5, max_steps: int = 50, seed: int = 1234) -> None:
+    """ Check that simulating a game without an interpreter matches playing its compiled version.
+
+    Both backends replay the game's walkthrough, then random rollouts of
+    admissible commands. After each step, their facts, score, done flag,
+    outcome and admissible commands must be the same.
+
+    Arguments:
+        gamefile: Path to a compiled game generated by TextWorld (.ulx|.z8).
+        nb_rollouts: Number of random rollouts.
+        max_steps: Maximum number of commands per rollout.
+        seed: Seed of the random rollouts.
+
+    Raises:
+        AssertionError: When the backends differ, with the commands leading to it.
+    """
+    infos = textworld.EnvInfos(facts=True, admissible_commands=True, won=True, lost=True)
+    env = textworld.start(gamefile, infos)
+    fast_env = textworld.start(os.path.splitext(gamefile)[0] + ".json", infos)
+
+    def _check(state, fast_state, commands):
+        for key in ("score", "done", "won", "lost", "admissible_commands"):
+            # The Inform7 wrappers only set `done` when stepping.
+            value, fast_value = state.get(key, False), fast_state.get(key, False)
+            msg = "{!r} differs after {}".format(key, commands)
+            assert value == fast_value, msg + ": {!r} != {!r}".format(value, fast_value)
+
+        assert set(state["_facts"]) == set(fast_state["_facts"]), "Facts differ after {}".format(commands)
+
+    def _play(commands):
+        state, fast_state = env.reset(), fast_env.reset()
+        _check(state, fast_state, [])
+        for i, command in enumerate(commands):
+            state, _, _ = env.step(command)
+            fast_state, _, _ = fast_env.step(command)
+            _check(state, fast_state, commands[:i + 1])
+
+    try:
+        game = textworld.Game.load(os.path.splitext(gamefile)[0] + ".json")
+        _play(game.metadata.get("walkthrough", []))
+
+        rng = np.random.RandomState(seed)
+        for _ in range(nb_rollouts):
+            commands = []
+            fast_state = fast_env.reset()
+            while not fast_state["done"] and len(commands) < max_steps:
+                commands.append(str(rng.choice(fast_state["admissible_commands"])))
+                fast_state, _, _ = fast_env.step(commands[-1])
+
+            _play(commands)
+    finally:
+        env.close()
+        fast_env.close()
@@ -1,6 +1,7 @@
 import json
 from copy import deepcopy
 from collections import defaultdict
+from functools import lru_cache
 
 from tatsu.model import NodeWalker
 from typing import Iterable, Optional, Tuple, List, Dict
@@ -69,20 +70,39 @@ def display_list(l, context):
     return list(join(list_separator, l[:-1])) + [list_last_separator] + [l[-1]]
 
 
-def query(expression, context):
+@lru_cache(maxsize=None)
+def _compile_query(expression):
+    """ Compile a conjunction of predicates into the rule used to query the state. """
     from textworld.logic import Predicate, Rule
-    rule = Rule(
+    return Rule(
         name="query",
         preconditions=[Predicate.parse(e.strip()) for e in expression.split("&")],
         postconditions=[],
     )
 
+
+@lru_cache(maxsize=None)
+def _compile_condition(expression):
+    """ Compile a logical expression into the rules (one per conjunction of its DNF) used to evaluate it. """
+    from textworld.logic import Rule, _parse_and_convert, dnf
+
+    expression = _parse_and_convert(expression, rule_name="onlyExpression")
+    return tuple(Rule(name="query", preconditions=list(conjunction), postconditions=[])
+                 for conjunction in dnf(expression))
+
+
+def query(expression, context):
+    return _query(_compile_query(expression), context)
+
+
+def _query(rule, context):
     contexts = []
     for mapping in context["state"].all_assignments(rule, context["mapping"]):
-        context_ = copy_context(context)
-        new_variables = {ph.name: context_["entity_infos"][var.name] for ph, var in mapping.items()}
-        context_["variables"].update(new_variables)
-        context_["mapping"].update(mapping)
+        # Contexts are never modified in place, so the new ones can share everything else.
+        new_variables = {ph.name: context["entity_infos"][var.name] for ph, var in mapping.items()}
+        context_ = dict(context)
+        context_["variables"] = {**context["variables"], **new_variables}
+        context_["mapping"] = {**context["mapping"], **mapping}
         contexts.append(context_)
 
     return contexts
@@ -90,31 +110,13 @@ def query(expression, context):
 
 
 def evaluate(expression, context):
-    from textworld.logic import Predicate, Rule, _parse_and_convert, dnf
-
-    expression = _parse_and_convert(expression, rule_name="onlyExpression")
+    return _evaluate(_compile_condition(expression), context)
 
-    for conjunction in dnf(expression):
-        rule = Rule(
-            name="query",
-            preconditions=list(conjunction),
-            postconditions=[],
-        )
 
-        mappings = list(context["state"].all_assignments(rule, context["mapping"]))
-        if len(mappings) > 0:
-            return True
-
-        # if len(mappings) > 1:
-        #     assert False
-
-        # if len(mappings) == 1:
-        #     mapping = mappings[0]
-        #     context_ =  copy_context(context)
-        #     new_variables = {ph.name: context_["entity_infos"][var.name] for ph, var in mapping.items()}
-        #     context_["variables"].update(new_variables)
-        #     context_["mapping"].update(mapping)
-        #     return context_
+def _evaluate(rules, context):
+    for rule in rules:
+        for _ in context["state"].all_assignments(rule, context["mapping"]):
+            return True  # A single assignment is enough.
 
     return False
 
@@ -123,6 +125,7 @@ class EvalSymbol(Symbol):
     def __init__(self, expression: str, context: Dict = {}):
         super().__init__(expression, context)
         self.expression = expression
+        self.code = compile(expression, "<textgen>", "eval")
 
     def __repr__(self):
         return "EvalSymbol('{{{}}}')".format(str(self.expression))
@@ -130,7 +133,7 @@ class EvalSymbol(Symbol):
     def derive(self, context=None):
         context = context or self.context
         locals().update(context["variables"])
-        res = eval(self.expression)
+        res = eval(self.code)
         if isinstance(res, list):
             assert False
             return res
@@ -230,6 +233,7 @@ class ConditionalSymbol(Symbol):
         super().__init__(str(expression), context)
         self.expression = expression
         self.given = given
+        self.compiled_given = _compile_query(given) if given else None
 
     def __repr__(self):
         return "ConditionalSymbol('{{{}|{}}}')".format(str(self.expression), str(self.given))
@@ -244,7 +248,7 @@ class ConditionalSymbol(Symbol):
 
         contexts = [context]
         if self.given:
-            contexts = query(self.given, context)
+            contexts = _query(self.compiled_given, context)
 
         # res = display_list([self.expression.copy(context) for context in contexts], context)
         res = [self.expression.copy(context) for context in contexts]
@@ -266,6 +270,7 @@ class ProductionRule:
         self.rhs = rhs
         self.weight = weight
         self.condition = condition
+        self.compiled_condition = _compile_condition(condition) if condition else None
 
     def __repr__(self):
         return "ProductionRule(lhs={!r}, rhs={!r}, weight={!r}, condition={!r})".format(self.lhs, self.rhs, self.weight, self.condition)
@@ -327,6 +332,10 @@ def _parse_and_convert(*args, **kwargs):
     return _Converter().walk(model)
 
 
+# Opcodes of the compiled production rules (see `TextGrammar._compile`).
+_TERMINAL, _NONTERMINAL, _EVAL, _CONDITIONAL, _LIST = range(5)
+
+
 class CSGUnknownSymbolError(Exception):
     def __init__(self, symbol: Symbol):
         msg = "Can't find symbol '#{}#' in the set of production rules."
@@ -339,8 +348,30 @@ class TextGrammar:
 
     def __init__(self):
         self._rules = defaultdict(list)
+        self._shared = False
+        self._programs = None
+        self._start_programs = {}
+
+    def copy(self) -> "TextGrammar":
+        """ Copy this grammar. Its production rules are only duplicated if one of the grammars gets modified. """
+        copy = TextGrammar()
+        copy._rules = self._rules
+        copy._shared = self._shared = True
+        copy._programs = self._programs
+        copy._start_programs = self._start_programs
+        return copy
+
+    def _own_rules(self):
+        if self._shared:
+            self._rules = defaultdict(list, {k: list(v) for k, v in self._rules.items()})
+            self._shared = False
+
+        # Compiled programs refer to the current production rules.
+        self._programs = None
+        self._start_programs = {}
 
     def update(self, grammar: "TextGrammar"):
+        self._own_rules()
         for k, v in grammar._rules.items():
             self._rules[k].extend(v)
 
@@ -365,8 +396,15 @@ class TextGrammar:
         return grammar
 
     def add_rule(self, rule: ProductionRule):
+        self._own_rules()
         self._rules[rule.lhs].append(rule)
 
+    def __eq__(self, other):
+        return isinstance(other, TextGrammar) and self._rules == other._rules
+
+    # Grammars are compared by their rules, which `add_rule()` can change, so they can't be hashed.
+    __hash__ = None
+
     def replace(self, start: Symbol) -> List[Symbol]:
         rules = self._rules.get(str(start))
         if not rules:
@@ -376,7 +414,7 @@ class TextGrammar:
             if not rule.condition:
                 return True
 
-            return evaluate(rule.condition, start.context)
+            return _evaluate(rule.compiled_condition, start.context)
 
         rules = list(filter(_applicable, rules))
 
@@ -388,29 +426,119 @@ class TextGrammar:
 
         return symbols
 
-    def derive(self, start: str, context={}) -> str:
-        derivation = _parse_and_convert(start, rule_name="String", trace=check_flag("TW_CSG_TRACE"))
-        derivation = derivation[::-1]  # Reverse to build a derivation stack.
+    def _compile(self, symbols: List[Symbol]) -> Tuple:
+        """ Compile symbols into an immutable program made of (opcode, ...) tuples. """
+        program = []
+        for symbol in symbols:
+            if isinstance(symbol, TerminalSymbol):
+                program.append((_TERMINAL, str(symbol)))
+            elif isinstance(symbol, NonterminalSymbol):
+                program.append(self._compile_nonterminal(symbol.symbol))
+            elif isinstance(symbol, EvalSymbol):
+                program.append((_EVAL, symbol.code))
+            elif isinstance(symbol, ConditionalSymbol):
+                expression, = self._compile([symbol.expression])
+                program.append((_CONDITIONAL, expression, symbol.compiled_given))
+            elif isinstance(symbol, ListSymbol):
+                inner, = self._compile([symbol.symbol])
+                program.append((_LIST, inner,
+                                self._compile_nonterminal("list_separator"),
+                                self._compile_nonterminal("list_last_separator"),
+                                self._compile_nonterminal("list_empty")))
+            else:
+                raise NotImplementedError("Unknown symbol: {}".format(type(symbol)))
+
+        return tuple(program)
+
+    def _compile_nonterminal(self, name: str) -> Tuple:
+        # Alternatives are resolved once: a list of (condition, program), or None for unknown symbols.
+        return (_NONTERMINAL, name, self._programs.get(name))
+
+    def _compile_rules(self) -> None:
+        # Allocate every alternatives list first so recursive rules can refer to each other.
+        self._programs = {lhs: [] for lhs, rules in self._rules.items() if rules}
+        for lhs, alternatives in self._programs.items():
+            for rule in self._rules[lhs]:
+                alternatives.append((rule.compiled_condition, self._compile(rule.rhs)))
+
+    def _compile_start(self, start: str) -> Tuple:
+        if self._programs is None:
+            self._compile_rules()
+
+        trace = check_flag("TW_CSG_TRACE")
+        program = None if trace else self._start_programs.get(start)
+        if program is None:
+            program = self._compile(_parse_and_convert(start, rule_name="String", trace=trace))
+            self._start_programs[start] = program
+
+        return program
+
+    def _expand_list(self, op: Tuple, context: Dict) -> List[Tuple]:
+        """ Expand a list symbol into its elements interleaved with separators. """
+        _, inner, separator, last_separator, empty = op
+        if inner[0] == _CONDITIONAL:
+            contexts = _query(inner[2], context) if inner[2] is not None else [context]
+            elements = [(inner[1], context_) for context_ in contexts]
+        elif inner[0] == _EVAL:
+            elements = [((_TERMINAL, self._eval(inner[1], context)), context)]
+        else:
+            elements = [(inner, context)]
+
+        if len(elements) == 0:
+            return [(empty, context)]
+
+        items = []
+        for element in elements[:-1]:
+            items += [element, (separator, context)]
 
-        for symbol in derivation:
-            symbol.context = copy_context(context)
+        if len(items) > 0:
+            items[-1] = (last_separator, context)
 
+        items.append(elements[-1])
+        return items
+
+    def _eval(self, code, context: Dict) -> str:
+        variables = dict(context["variables"])
+        variables["context"] = context
+        return str(eval(code, globals(), variables))
+
+    def derive(self, start: str, context={}) -> str:
+        program = self._compile_start(start)
+        debug = check_flag("TW_CSG_DEBUG")
+
+        # Derivation stack of (op, context) pairs. Contexts are shared, never copied.
+        derivation = [(op, context) for op in reversed(program)]
         derived = []
-        while len(derivation) > 0:
-            if check_flag("TW_CSG_DEBUG"):
+        while derivation:
+            if debug:
                 print(derivation)
 
-            symbol = derivation.pop()
-            if isinstance(symbol, TerminalSymbol):
-                derived.append(symbol)
+            op, context = derivation.pop()
+            opcode = op[0]
+            if opcode == _TERMINAL:
+                derived.append(op[1])
 
-            elif isinstance(symbol, NonterminalSymbol):
-                derivation += self.replace(symbol)[::-1]  # Reverse to add on top of the derivation stack.
+            elif opcode == _NONTERMINAL:
+                alternatives = op[2]
+                if not alternatives:
+                    raise CSGUnknownSymbolError(op[1])
 
-            elif isinstance(symbol, (ConditionalSymbol, EvalSymbol, ListSymbol)):
-                derivation += symbol.derive()[::-1]  # Reverse to add on top of the derivation stack.
+                for condition, program in alternatives:
+                    if condition is None or _evaluate(condition, context):
+                        break
+                else:
+                    raise ValueError("No applicable production rule for '#{}#'.".format(op[1]))
 
-            else:
-                raise NotImplementedError("Unknown symbol: {}".format(type(symbol)))
+                derivation += [(op_, context) for op_ in reversed(program)]
+
+            elif opcode == _EVAL:
+                derived.append(self._eval(op[1], context))
+
+            elif opcode == _CONDITIONAL:
+                contexts = _query(op[2], context) if op[2] is not None else [context]
+                derivation += [(op[1], context_) for context_ in reversed(contexts)]
+
+            elif opcode == _LIST:
+                derivation += reversed(self._expand_list(op, context))
 
-        return "".join(map(str, derived))
+        return "".join(derived)
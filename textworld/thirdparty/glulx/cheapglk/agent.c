@@ -7,6 +7,8 @@
 /* posix */
 #include <errno.h>
 #include <fcntl.h>
+#include <signal.h>
+#include <unistd.h>
 #include <sys/stat.h>
 
 /* sockets */
@@ -20,11 +22,52 @@
 
 const glui32 INIT_BUF_SIZE = 8192;
 
+/* Control message asking to fork the game, followed by the socket name of the copy. */
+const char FORK_MSG[] = "\x10+++FORK ";
+
+/*
+ * The output is sent framed, as a sequence of fields. Each field is made
+ * of its kind, the size of its text (4 bytes, network order) and the text.
+ * Concatenating the texts gives back the output as printed by the game.
+ */
+#define FIELD_TEXT 't'          /* plain text */
+#define FIELD_DEBUG_TAG 'd'     /* Inform 7 debug tag, e.g. "[looking]\n" */
+#define FIELD_SECTION_START 's' /* opening tag of a section, e.g. "<score>\n" */
+#define FIELD_SECTION_END 'e'   /* closing tag of a section, e.g. "</score>" */
+
 char* cur_buf = 0;
 glui32 str_len = 0;
 glui32 cur_buf_len = 0;
 int sock_fh = -1;
 
+char* frame_buf = 0;
+glui32 frame_len = 0;
+glui32 frame_buf_len = 0;
+
+/* Commands received in one message, one per line, played one at a time. */
+char* cmd_buf = 0;
+glui32 cmd_len = 0;
+glui32 cmd_pos = 0;
+
+static void agent_connect(const char* sock_name)
+{
+    sock_fh = socket(AF_LOCAL, SOCK_STREAM, 0);
+    if(sock_fh == -1) {
+        gli_strict_warning("agent_init: Could not open socket");
+        glk_exit();
+    }
+
+    struct sockaddr_un sock_addr;
+    sock_addr.sun_family = AF_UNIX;
+    snprintf(sock_addr.sun_path, sizeof(sock_addr.sun_path), "%s", sock_name);
+
+    int conn_status = connect(sock_fh, (struct sockaddr*)&sock_addr, sizeof(sock_addr));
+    if(conn_status < 0) {
+        gli_strict_warning("agent_init: Could not connect socket");
+        glk_exit();
+    }
+}
+
 void agent_init(char* sock_name)
 {
     if(sock_name == NULL) {
@@ -41,22 +84,171 @@ void agent_init(char* sock_name)
     cur_buf_len = INIT_BUF_SIZE;
     memset(cur_buf, 0, cur_buf_len);
 
-    /* socket */
-    sock_fh = socket(AF_LOCAL, SOCK_STREAM, 0);
-    if(sock_fh == -1) {
-        gli_strict_warning("agent_init: Could not open socket");
-        glk_exit();
+    agent_connect(sock_name);
+}
+
+/* Send a message, prefixed with its size. */
+static bool agent_send(const char* buf, glui32 len)
+{
+    glui32 net_len = htonl(len);
+    ssize_t sent = send(sock_fh, &net_len, 4, 0);
+    if(sent < 0) {
+        int err = errno;
+        gli_strict_warning("agent.c: send size");
+        gli_strict_warning(strerror(err));
+        return false;
     }
 
-    struct sockaddr_un sock_addr;
-    sock_addr.sun_family = AF_UNIX;
-    snprintf(sock_addr.sun_path, sizeof(sock_addr.sun_path), "%s", sock_name);
+    sent = send(sock_fh, buf, len, 0);
+    if(sent < 0) {
+        int err = errno;
+        gli_strict_warning("agent.c: send message");
+        gli_strict_warning(strerror(err));
+        return false;
+    }
 
-    int conn_status = connect(sock_fh, (struct sockaddr*)&sock_addr, sizeof(sock_addr));
-    if(conn_status < 0) {
-        gli_strict_warning("agent_init: Could not connect socket");
-        glk_exit();
+    return true;
+}
+
+/*
+ * Fork the whole process, VM included. The copy talks through the socket
+ * `sock_name` and announces itself with an empty message, while this
+ * process replies with the pid of the copy. Both then wait for a command.
+ */
+static void agent_fork(const char* sock_name)
+{
+    signal(SIGCHLD, SIG_IGN); /* copies are reaped automatically */
+
+    pid_t pid = fork();
+    if(pid == 0) {
+        close(sock_fh);
+        agent_connect(sock_name);
+        agent_send("", 0);
+        return;
     }
+
+    if(pid < 0) {
+        int err = errno;
+        gli_strict_warning("agent.c: fork");
+        gli_strict_warning(strerror(err));
+    }
+
+    char reply[16];
+    int len = snprintf(reply, sizeof(reply), "%d", pid < 0 ? -1 : (int)pid);
+    agent_send(reply, len);
+}
+
+static bool frame_add(char kind, const char* text, glui32 len)
+{
+    glui32 new_frame_len = frame_len + 5 + len;
+    if(new_frame_len > frame_buf_len) {
+        glui32 new_buf_len = new_frame_len << 1;
+        char* new_buf = realloc(frame_buf, new_buf_len);
+        if(new_buf == 0) {
+            gli_strict_warning("frame_add: CANNOT frame output, buffer too long");
+            return false;
+        }
+
+        frame_buf = new_buf;
+        frame_buf_len = new_buf_len;
+    }
+
+    glui32 net_len = htonl(len);
+    frame_buf[frame_len] = kind;
+    memcpy(frame_buf + frame_len + 1, &net_len, 4);
+    memcpy(frame_buf + frame_len + 5, text, len);
+    frame_len = new_frame_len;
+    return true;
+}
+
+static const char* find(const char* buf, const char* end, const char* needle, glui32 needle_len)
+{
+    while(buf + needle_len <= end) {
+        const char* match = memchr(buf, needle[0], end - buf);
+        if(match == NULL || match + needle_len > end) {
+            return NULL;
+        }
+        if(memcmp(match, needle, needle_len) == 0) {
+            return match;
+        }
+        buf = match + 1;
+    }
+
+    return NULL;
+}
+
+/*
+ * Split the output in fields, in a single pass. Sections look like
+ * "<name>\n...</name>" and debug tags like "[...]\n", where the newlines
+ * are optional. Sections do not nest, but can contain debug tags.
+ */
+static bool frame_output(const char* buf, glui32 len)
+{
+    const char* end = buf + len;
+    const char* text = buf;
+    const char* section_end = NULL; /* closing tag of the current section */
+    glui32 section_end_len = 0;
+    const char* pos = buf;
+
+    frame_len = 0;
+    while(pos < end) {
+        char kind = 0;
+        const char* next = NULL;
+
+        if(pos == section_end) {
+            kind = FIELD_SECTION_END;
+            next = pos + section_end_len;
+            section_end = NULL;
+        }
+        else if(*pos == '[') {
+            const char* close = memchr(pos + 1, ']', end - pos - 1);
+            if(close != NULL && close > pos + 1 && (section_end == NULL || close < section_end)) {
+                kind = FIELD_DEBUG_TAG;
+                next = close + 1;
+            }
+        }
+        else if(*pos == '<' && section_end == NULL) {
+            const char* name = pos + 1;
+            const char* name_end = name;
+            while(name_end < end && *name_end >= 'a' && *name_end <= 'z') {
+                name_end++;
+            }
+
+            glui32 name_len = name_end - name;
+            if(name_len > 0 && name_len < 64 && name_end < end && *name_end == '>') {
+                char closing[68];
+                snprintf(closing, sizeof(closing), "</%.*s>", (int)name_len, name);
+                section_end = find(name_end + 1, end, closing, name_len + 3);
+                if(section_end != NULL) {
+                    kind = FIELD_SECTION_START;
+                    next = name_end + 1;
+                    section_end_len = name_len + 3;
+                }
+            }
+        }
+
+        if(!kind) {
+            pos++;
+            continue;
+        }
+
+        if(kind != FIELD_SECTION_END && next < end && *next == '\n') {
+            next++;
+        }
+        if(pos > text && !frame_add(FIELD_TEXT, text, pos - text)) {
+            return false;
+        }
+        if(!frame_add(kind, pos, next - pos)) {
+            return false;
+        }
+        pos = text = next;
+    }
+
+    if(pos > text) {
+        return frame_add(FIELD_TEXT, text, pos - text);
+    }
+
+    return true;
 }
 
 void agent_put_string(char* buf, glui32 len)
@@ -87,42 +279,44 @@ void agent_put_string(char* buf, glui32 len)
     str_len = new_str_len;
 }
 
+/* Send the output accumulated since the last command, framed. */
+static bool agent_send_output(void)
+{
+    bool sent = frame_output(cur_buf, str_len) && agent_send(frame_buf, frame_len);
+    memset(cur_buf, 0, str_len);
+    str_len = 0;
+    return sent;
+}
+
 glui32 agent_get_output(char* buf, glui32 len)
 {
     char* dest_buf = NULL; /* forward declare for goto; see para 6.8.6.1 */
     glui32 dest_buf_len = 0;
-     /*
-     * write to out as one large packet
-     */
-    ssize_t sent = -1;
 
-    glui32 net_len = htonl(str_len);
-    sent = send(sock_fh, &net_len, 4, 0);
-    if(sent < 0) {
-        int err = errno;
-        gli_strict_warning("agent.c: send size");
-        gli_strict_warning(strerror(err));
-        goto cleanup;
+    if(cmd_buf != NULL) {
+        goto next_command; /* the output is sent once all commands are played */
     }
 
-    sent = send(sock_fh, cur_buf, str_len, 0);
-
-    if(sent < 0) {
-        int err = errno;
-        gli_strict_warning("agent.c: send message");
-        gli_strict_warning(strerror(err));
+     /*
+     * write to out as one large packet
+     */
+    if(!agent_send_output()) {
         goto cleanup;
     }
 
     /*
      * receive size, then message
      */
+    receive: ;
     bool restart = false;
     glui32 net_dest_buf_len;
 
     do { //handle EINTR
         restart = 0;
         ssize_t in_len = recv(sock_fh, &net_dest_buf_len, sizeof(glui32), MSG_WAITALL);
+        if(in_len == 0) {
+            exit(0); /* the other end is gone */
+        }
         if(in_len == -1) {
             int err = errno;
             if(err == EINTR) {
@@ -153,17 +347,40 @@ glui32 agent_get_output(char* buf, glui32 len)
         }
     } while(restart);
 
-    if(dest_buf_len > len) {
-        dest_buf_len = strlen(dest_buf)+1;
+    /* Handle control messages, then wait for the actual command. */
+    if(strncmp(dest_buf, FORK_MSG, strlen(FORK_MSG)) == 0) {
+        agent_fork(dest_buf + strlen(FORK_MSG));
+        free(dest_buf);
+        dest_buf = NULL;
+        goto receive;
     }
-    if(dest_buf_len > len) {
+
+    cmd_buf = dest_buf;
+    cmd_len = dest_buf_len;
+    cmd_pos = 0;
+    dest_buf = NULL;
+
+    /* play the commands one line at a time */
+    next_command: ;
+    char* cmd = cmd_buf + cmd_pos;
+    char* eol = memchr(cmd, '\n', cmd_len - cmd_pos);
+    dest_buf_len = eol != NULL ? (glui32)(eol - cmd) : cmd_len - cmd_pos;
+    cmd_pos += dest_buf_len + 1;
+
+    if(dest_buf_len >= len) {
         char errmsg[100];
-        snprintf(errmsg, 100, "agent_get_output: string too large for buffer (%d versus %d)", dest_buf_len, len);
+        snprintf(errmsg, 100, "agent_get_output: command truncated to fit the buffer (%d versus %d)", dest_buf_len, len);
         gli_strict_warning(errmsg);
-        goto cleanup;
+        dest_buf_len = len - 1; /* play what fits, like a line input would */
     }
 
-    memmove(buf, dest_buf, dest_buf_len);
+    memmove(buf, cmd, dest_buf_len);
+    buf[dest_buf_len] = 0;
+
+    if(cmd_pos >= cmd_len) {
+        free(cmd_buf);
+        cmd_buf = NULL;
+    }
 
     /* "deallocate" buffer */
     cleanup:
@@ -171,36 +388,17 @@ glui32 agent_get_output(char* buf, glui32 len)
         free(dest_buf);
         dest_buf = NULL;
     }
-    memset(cur_buf, 0, str_len);
-    str_len = 0;
 
     return dest_buf_len;
 }
 
 void agent_exit() {
+    if(sock_fh != -1) {
+        agent_send_output(); /* what the game printed last */
+    }
+
     if(cur_buf != NULL) {
         free(cur_buf);
         cur_buf = NULL;
     }
-
-    if(sock_fh == -1) {
-        return; /* never connected */
-    }
-
-    char out_buf[11];
-
-    out_buf[0] = 127; //continuation
-    out_buf[1] = 0x10; //DLE
-    strncpy(out_buf+2, "+++EXIT", 8);
-    out_buf[9] = 0x10; //DLE
-    out_buf[10] = 0;
-
-    int sent = send(sock_fh, out_buf, 11, 0);
-
-    if(sent < 0) {
-        int err = errno;
-        gli_strict_warning("agent.c: agent_exit");
-        gli_strict_warning(strerror(err));
-    }
 }
-